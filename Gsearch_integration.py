@@ -3,6 +3,7 @@ import re
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs, unquote
 from collections import Counter
+from features import profile_vector, score_batch
 
 class GoogleSearchAnalyzer:
     def __init__(self):
@@ -131,11 +132,10 @@ class GoogleSearchAnalyzer:
         }
     
     def generate_content_vector(self, search_intent):
-        """Generate simple content profile from search intent"""
-        keywords = search_intent.get('keywords', '').lower().split()
+        """Generate content profile from search intent: hashed word, bigram and category features"""
         categories = [cat[0] for cat in search_intent.get('top_categories', [])]
         return {
-            'keywords': keywords,
+            'features': profile_vector(search_intent),
             'categories': categories,
             'search_count': search_intent.get('search_frequency', 0)
         }
@@ -173,29 +173,11 @@ class RealTimeRecommendationEngine:
         profile = self.user_profiles[user_id]
         user_vector = profile['content_vector']
         
-        # Score items based on search intent
+        # Score items based on search intent, all in one pass over their hashed features
+        scores = score_batch(user_vector.get('features', {}), base_recs)
         scored_items = []
-        user_keywords = user_vector.get('keywords', [])
-        user_categories = user_vector.get('categories', [])
-        
-        for item in base_recs:
-            item_text = f"{item.get('title', '')} {item.get('description', '')}".lower()
-            item_category = item.get('category', '').lower()
-            
-            # Keyword matching score
-            keyword_score = 0
-            for keyword in user_keywords:
-                if len(keyword) > 2 and keyword in item_text:
-                    keyword_score += 0.2
-            
-            # Category matching score
-            category_score = 0
-            if item_category in [cat.lower() for cat in user_categories]:
-                category_score = 0.5
-            
-            # Combined score
-            final_score = keyword_score + category_score
-            item['search_relevance_score'] = final_score
+        for item, score in zip(base_recs, scores):
+            item['search_relevance_score'] = score
             scored_items.append(item)
         
         # Sort by search relevance
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from deadline import Deadline
+from metrics import registry
+
+ADMISSIONS = registry.counter(
+    'admission_decisions_total',
+    'Requests by admission decision',
+    labels=('decision',)
+)
+
+ADMISSION_WAIT = registry.histogram(
+    'admission_queue_wait_seconds',
+    'Time requests spent waiting for an in-flight slot'
+)
+
+RESPONSE_TIERS = registry.counter(
+    'responses_by_tier_total',
+    'Responses by degradation tier served',
+    labels=('route', 'tier')
+)
+
+# Healthy answers: computed now, or a fresh response-cache hit / stored page
+TIER_FULL = 'full'
+TIER_HIT = 'hit'
+# Degradation tiers, most to least personalized; `cached` is an expired response served as a fallback
+TIER_CACHED = 'cached'
+TIER_POOL = 'pool'
+TIER_STATIC = 'static'
+
+class AdmissionController:
+    """Caps concurrent full-path requests and gives each admitted one a deadline.
+
+    A request waits at most `queue_timeout` seconds for one of
+    `max_in_flight` slots. Its `deadline` budget starts before that wait,
+    so time spent queued is time it no longer has; if less than
+    `min_budget` is left once admitted, it is not worth starting the full
+    path. Callers serve a cheaper tier whenever admit() yields None.
+    """
+    def __init__(self, max_in_flight=32, queue_timeout=0.1, deadline=2.0, min_budget=0.2):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.min_budget = min_budget
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 32)),
+            queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 0.1)),
+            deadline=float(os.getenv('REQUEST_DEADLINE', 2.0)),
+            min_budget=float(os.getenv('REQUEST_MIN_BUDGET', 0.2))
+        )
+
+    @contextmanager
+    def admit(self):
+        """Yield the request's Deadline if it may take the full path, else None"""
+        deadline = Deadline(self.deadline)
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=min(self.queue_timeout, deadline.remaining()))
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+        ADMISSION_WAIT.observe(time.monotonic() - started)
+        if not acquired:
+            ADMISSIONS.labels('rejected').inc()
+            yield None
+            return
+        try:
+            if deadline.remaining() < self.min_budget:
+                ADMISSIONS.labels('low_budget').inc()
+                yield None
+            else:
+                ADMISSIONS.labels('admitted').inc()
+                yield deadline
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {'in_flight': self.in_flight, 'waiting': self.waiting}
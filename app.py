@@ -1,10 +1,320 @@
-from flask import Flask, request, jsonify, render_template
-from enhanced_engine import EnhancedRecommendationEngine
+import startup
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
+startup.mark('import_flask')
+from engine import EnhancedRecommendationEngine
+startup.mark('import_engine')
+from serialization import StaticPayload, encode, encode_items
+from cache import TTLCache
+from broadcast import TrendingBroadcaster
+from retention import RetentionWorker
+from admission import AdmissionController, RESPONSE_TIERS, TIER_FULL, TIER_HIT, TIER_CACHED, TIER_POOL, TIER_STATIC
+from deadline import DeadlineExceeded
+import http_cache
+from pagination import RankedListStore, CursorError, CursorExpired
+from precompute import PRECOMPUTE_DEPTH
+from models import similarity_backend
+from metrics import registry, stage, HTTP_LATENCY, HTTP_REQUESTS, PROMETHEUS_CONTENT_TYPE
+from profiling import is_admin, request_profiler, sampling_profiler
+from applog import get_logger, REQUEST_LOG_SAMPLE_RATE
 from datetime import datetime
 import json
+import os
+import sys
+import threading
+import time
+startup.mark('import_app_modules')
 
 app = Flask(__name__)
+log = get_logger('app')
+request_log = get_logger('request', sample_rate=REQUEST_LOG_SAMPLE_RATE)
 engine = EnhancedRecommendationEngine()
+startup.mark('engine_init')
+
+# Encoded response bodies, so cache hits skip both the engine and JSON encoding
+response_cache = TTLCache.from_env('RESPONSE_CACHE', ttl=30)
+
+# Bounds concurrent full-path requests and gives each one a deadline
+admission = AdmissionController.from_env()
+
+# Deep ranked lists behind pagination cursors
+ranked_lists = RankedListStore.from_env()
+
+RECOMMENDATIONS_ERROR_FALLBACK = StaticPayload([
+    {
+        'item_id': 'error_fallback',
+        'title': 'Recommendation System',
+        'category': 'system',
+        'description': 'Our recommendation system is learning about your preferences',
+        'source': 'fallback'
+    }
+])
+
+TRENDING_NO_QUERY = StaticPayload([
+    {
+        'item_id': 'no_query',
+        'title': 'No Search Query Provided',
+        'category': 'system',
+        'description': 'Please enter a search query to get relevant trending content',
+        'trend_score': 0,
+        'source': 'system'
+    }
+])
+
+TRENDING_ERROR_FALLBACK = StaticPayload([
+    {
+        'item_id': 'trending_error_fallback',
+        'title': 'Query-Based Trending Content',
+        'category': 'system',
+        'description': 'Fetching trending content based on your search query',
+        'trend_score': 100,
+        'source': 'fallback'
+    }
+])
+
+def json_response(body, status=200):
+    """Wrap already-encoded JSON bytes in a response"""
+    return Response(body, status=status, mimetype='application/json')
+
+def tiered_response(body, tier, next_cursor=None, etag=None):
+    """JSON response labelled with the degradation tier that produced it (and the next page's cursor).
+
+    `etag` is the version ETag of a healthy answer; degraded ones keep a content hash,
+    so clients holding them are never told they are current.
+    """
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    RESPONSE_TIERS.labels(route, tier).inc()
+    response = json_response(body)
+    response.headers['X-Response-Tier'] = tier
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
+
+def response_etag(cache_key, tag=None):
+    """Version ETag for an unpaginated read, from the response cache's invalidations.
+
+    None while profiling, and when RESPONSE_CACHE_TTL disables the cache:
+    versions then never roll over, so the body's content hash is used.
+    """
+    if g.get('profiler') is not None or response_cache.ttl <= 0:
+        return None
+    return http_cache.version_etag(cache_key, response_cache.version(tag), response_cache.ttl)
+
+def not_modified(etag):
+    """304 for a client whose copy is current, sent before the engine runs"""
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = http_cache.cache_control(CONDITIONAL_ROUTES[request.url_rule.rule])
+    response.vary.add('Accept-Encoding')
+    return response
+
+def stored_page(scope, cursor, page_size):
+    """A later page of a stored ranked list: a memory read, no engine work"""
+    try:
+        body, next_cursor = ranked_lists.page(scope, cursor, page_size)
+    except CursorExpired as e:
+        return jsonify({"error": f"{e}; request the first page again"}), 410
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return tiered_response(body, TIER_HIT, next_cursor)
+
+def degraded_recommendations(user_id, cache_key, limit):
+    """Cheapest available answer when the full path is not admitted or runs out of time"""
+    body = response_cache.get_stale(cache_key)
+    if body is not None:
+        return body, TIER_CACHED
+    pooled = engine.get_pooled_recommendations(user_id, limit)
+    if pooled:
+        return encode_items(pooled), TIER_POOL
+    return RECOMMENDATIONS_ERROR_FALLBACK.encoded, TIER_STATIC
+
+def degraded_trending(cache_key):
+    body = response_cache.get_stale(cache_key)
+    if body is not None:
+        return body, TIER_CACHED
+    return TRENDING_ERROR_FALLBACK.encoded, TIER_STATIC
+
+def cached_response_body(cache_key):
+    """Cached encoded body, bypassed while the request is being profiled"""
+    if g.get('profiler') is not None:
+        return None
+    return response_cache.get(cache_key)
+
+def compute_trending_body(query, category, hours, limit):
+    """Encoded trending result for one stream channel"""
+    body = encode_items(engine.get_trending_content(hours, limit, category, query or None))
+    if query and not category:
+        # Share the result with polling clients of /trending
+        response_cache.set(('trending', hours, limit, query), body)
+    return body
+
+trending_broadcaster = TrendingBroadcaster.from_env(compute_trending_body)
+
+# Rolls raw interactions past INTERACTION_RETENTION_DAYS into daily aggregates
+retention_worker = RetentionWorker.from_env(engine.base_engine)
+retention_worker.start()
+
+# Keeps per-category cold-start pools current in the background
+engine.candidate_pools.start()
+# Refreshes the most requested trending/search results before they expire
+engine.results.start()
+# Transition counts from stored history; live interactions are counted meanwhile
+engine.sessions.load_async(engine.base_engine)
+# numpy/scikit-learn load on the first similarity re-rank; long-lived workers can load them up front
+if os.getenv('PRELOAD_SIMILARITY', '0') == '1':
+    threading.Thread(target=similarity_backend, daemon=True, name="preload").start()
+startup.mark('background_workers')
+
+registry.gauge('response_cache_entries', 'Encoded responses currently cached', lambda: len(response_cache))
+registry.callback_counter('response_cache_lookups_total', 'Response cache lookups by result',
+                          lambda: {'hit': response_cache.hits, 'miss': response_cache.misses}, labels=('result',))
+registry.gauge('trending_streams', 'Active trending SSE channels and subscribers',
+               lambda: trending_broadcaster.stats(), labels=('kind',))
+registry.callback_counter('singleflight_calls_total', 'Coalesced search computations by caller role',
+                          lambda: {'leader': engine.inflight.leaders, 'follower': engine.inflight.followers,
+                                   'timeout': engine.inflight.timeouts}, labels=('role',))
+registry.gauge('singleflight_in_flight', 'Search computations currently running', engine.inflight.in_flight)
+registry.callback_counter('result_cache_lookups_total', 'Stale-while-revalidate lookups by result',
+                          lambda: {'fresh': engine.results.hits, 'stale': engine.results.stale_hits,
+                                   'miss': engine.results.misses}, labels=('result',))
+registry.callback_counter('result_cache_refreshes_total', 'Background result refreshes by outcome',
+                          lambda: {'ok': engine.results.refreshes, 'error': engine.results.refresh_errors}, labels=('outcome',))
+registry.gauge('admission_requests', 'Full-path requests running and waiting for a slot',
+               lambda: admission.stats(), labels=('state',))
+registry.gauge('session_model_size', 'Items with transitions, transition entries and live sessions',
+               lambda: engine.sessions.stats(), labels=('kind',))
+registry.gauge('suggestion_queries', 'Known queries in the autocomplete index',
+               lambda: len(engine.dynamic_search.suggester))
+registry.gauge('result_cache_state', 'Cached results and refreshes in progress',
+               lambda: engine.results.stats(), labels=('kind',))
+SSE_HEARTBEAT_SECONDS = 15
+BATCH_MAX_USERS = int(os.getenv('BATCH_MAX_USERS', 100000))
+# Per-user limits above this are clamped; precompute stores PRECOMPUTE_DEPTH items per user
+BATCH_MAX_LIMIT = int(os.getenv('BATCH_MAX_LIMIT', PRECOMPUTE_DEPTH))
+
+# Optional capture of API traffic in the JSONL format replayed by benchmarks/loadgen.py
+TRAFFIC_CAPTURE_PATH = os.getenv('TRAFFIC_CAPTURE_PATH')
+CAPTURED_PREFIXES = ('/recommendations', '/trending', '/search-suggestions', '/interactions', '/search-history')
+capture_lock = threading.Lock()
+capture_started = time.monotonic()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        # Label by URL rule, not raw path, to keep label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.labels(route).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+    return response
+
+@app.after_request
+def capture_traffic(response):
+    if TRAFFIC_CAPTURE_PATH and request.path.startswith(CAPTURED_PREFIXES):
+        record = {
+            "t": round(time.monotonic() - capture_started, 6),
+            "method": request.method,
+            "path": request.full_path.rstrip('?')
+        }
+        if request.method == 'POST':
+            record["body"] = request.get_json(silent=True)
+        with capture_lock:
+            with open(TRAFFIC_CAPTURE_PATH, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+    return response
+
+# Polled read endpoints -> whether their responses may be shared between users
+CONDITIONAL_ROUTES = {
+    '/trending': True,
+    '/search-suggestions': True,
+    '/recommendations/<user_id>': False
+}
+
+@app.after_request
+def conditional_response(response):
+    """ETag/304, Cache-Control and compression for polled read endpoints (runs before the metrics hooks)"""
+    route = request.url_rule.rule if request.url_rule else None
+    public = CONDITIONAL_ROUTES.get(route)
+    if public is None or request.method != 'GET' or response.status_code != 200 or response.is_streamed:
+        return response
+    with stage('http_cache'):
+        return http_cache.finalize(response, request, route, public)
+
+if os.getenv('PROFILE_SAMPLING', '').lower() in ('1', 'true'):
+    sampling_profiler.start()
+
+@app.before_request
+def start_request_profile():
+    # Opt-in per request (X-Profile header or ?profile=1), admin token required
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    if flag and is_admin(request.headers.get('X-Admin-Token')):
+        g.profiler = request_profiler.start()
+        g.profile_mode = flag
+        g.profile_started = time.perf_counter()
+        if g.profiler is None:
+            g.profile_busy = True
+
+@app.after_request
+def finish_request_profile(response):
+    if g.get('profile_busy'):
+        response.headers['X-Profile'] = 'busy'
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    result = request_profiler.finish(
+        profiler, request.method, request.full_path.rstrip('?'),
+        response.status_code, time.perf_counter() - g.profile_started
+    )
+    response.headers['X-Profile-Id'] = str(result['id'])
+    if g.profile_mode == 'inline' and response.mimetype == 'application/json' and not response.is_streamed:
+        response.set_data(b'{"result":%s,"profile":%s}' % (response.get_data(), encode(result)))
+    return response
+
+def require_admin():
+    if not is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Recent per-request profiles (ring buffer)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify(request_profiler.list())
+
+@app.route('/admin/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    denied = require_admin()
+    if denied:
+        return denied
+    result = request_profiler.get(profile_id)
+    if result is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return json_response(encode(result))
+
+@app.route('/admin/sampling', methods=['GET', 'POST'])
+def sampling():
+    """Read (GET, ?format=folded) or control (POST) the low-rate sampling profiler"""
+    denied = require_admin()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('reset'):
+            sampling_profiler.reset()
+        if data.get('enabled') is True:
+            sampling_profiler.start(data.get('interval'))
+        elif data.get('enabled') is False:
+            sampling_profiler.stop()
+    if request.args.get('format') == 'folded':
+        return Response(sampling_profiler.folded(), mimetype='text/plain')
+    return json_response(encode(sampling_profiler.report()))
 
 @app.route('/')
 def home():
@@ -15,6 +325,7 @@ def create_user():
     try:
         data = request.json
         engine.add_user(data['user_id'], data.get('preferences'))
+        response_cache.invalidate_tag(data['user_id'])
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -30,6 +341,7 @@ def create_item():
             data['description'],
             data.get('features')
         )
+        response_cache.clear()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -44,6 +356,8 @@ def record_interaction():
             data.get('interaction_type', 'view'),
             data.get('rating')
         )
+        response_cache.invalidate_tag(data['user_id'])
+        trending_broadcaster.notify()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -53,46 +367,86 @@ def get_recommendations(user_id):
     try:
         limit = request.args.get('limit', 10, type=int)
         use_search_history = request.args.get('search_based', 'false').lower() == 'true'
+        use_session = request.args.get('session_based', 'false').lower() == 'true'
         search_query = request.args.get('query', '').strip()
+        page_size = request.args.get('page_size', type=int)
+        cursor = request.args.get('cursor')
         
-        print(f"Getting recommendations for user: {user_id}, search_based: {use_search_history}, query: {search_query}, limit: {limit}")
+        scope = ('recommendations', user_id, use_search_history, use_session, search_query.lower())
+        if cursor:
+            return stored_page(scope, cursor, page_size or limit)
+        if search_query and use_search_history and not use_session:
+            engine.record_search_query(search_query)
         
-        if use_search_history:
-            recommendations = engine.get_search_powered_recommendations(user_id, limit, search_query)
-        else:
-            recommendations = engine.get_standard_recommendations(user_id, limit)
+        compute_limit = limit
+        if page_size is not None:
+            # First page of a listing: rank `depth` items once, later pages are slices
+            limit, compute_limit = ranked_lists.page_size(page_size), ranked_lists.depth
         
-        print(f"Found {len(recommendations)} recommendations")
+        cache_key = scope + (limit,)
+        etag = response_etag(cache_key, user_id) if page_size is None else None
+        if etag is not None and http_cache.matches(request, etag, request.url_rule.rule):
+            return not_modified(etag)
+        body = cached_response_body(cache_key) if page_size is None else None
+        if body is not None:
+            return tiered_response(body, TIER_HIT, etag=etag)
         
-        # Ensure JSON serializable
-        clean_recommendations = []
-        for rec in recommendations:
-            clean_rec = {}
-            for key, value in rec.items():
-                if hasattr(value, 'isoformat'):
-                    clean_rec[key] = value.isoformat()
-                elif isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                    clean_rec[key] = value
-                else:
-                    clean_rec[key] = str(value)
-            clean_recommendations.append(clean_rec)
+        with admission.admit() as deadline:
+            if deadline is None:
+                return tiered_response(*degraded_recommendations(user_id, cache_key, limit))
+            
+            request_log.info("Getting recommendations", user_id=user_id, search_based=use_search_history, query=search_query, limit=limit)
+            
+            try:
+                with deadline.scope():
+                    if use_session:
+                        recommendations = engine.get_session_recommendations(user_id, compute_limit)
+                    elif use_search_history:
+                        recommendations = engine.get_search_powered_recommendations(user_id, compute_limit, search_query)
+                    else:
+                        recommendations = engine.get_standard_recommendations(user_id, compute_limit)
+            except DeadlineExceeded:
+                request_log.info("Recommendations deadline exceeded", user_id=user_id)
+                return tiered_response(*degraded_recommendations(user_id, cache_key, limit))
         
-        return jsonify(clean_recommendations)
-    except Exception as e:
-        print(f"Recommendations error: {e}")
-        import traceback
-        traceback.print_exc()
+        request_log.info("Found recommendations", user_id=user_id, count=len(recommendations))
+        
+        with stage('serialization'):
+            if page_size is not None:
+                body, next_cursor = ranked_lists.first_page(scope, recommendations, limit)
+                return tiered_response(body, TIER_FULL, next_cursor)
+            body = encode_items(recommendations)
+        response_cache.set(cache_key, body, tag=user_id)
+        return tiered_response(body, TIER_FULL, etag=etag)
+    except Exception:
+        log.exception("Recommendations error", user_id=user_id)
         # Return fallback recommendations instead of error
-        fallback = [
-            {
-                'item_id': 'error_fallback',
-                'title': 'Recommendation System',
-                'category': 'system',
-                'description': 'Our recommendation system is learning about your preferences',
-                'source': 'fallback'
-            }
-        ]
-        return jsonify(fallback)
+        return tiered_response(RECOMMENDATIONS_ERROR_FALLBACK.encoded, TIER_STATIC)
+
+@app.route('/recommendations/batch', methods=['POST'])
+def get_recommendations_batch():
+    """Stream recommendations for many users as NDJSON, one line per user"""
+    data = request.json or {}
+    user_ids = data.get('user_ids')
+    limit = data.get('limit', 10)
+    
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"error": "Missing user_ids"}), 400
+    if not isinstance(limit, int) or isinstance(limit, bool):
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = min(max(limit, 1), BATCH_MAX_LIMIT)
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({"error": f"At most {BATCH_MAX_USERS} user_ids per batch"}), 413
+    
+    def lines():
+        try:
+            for user_id, recommendations in engine.iter_recommendations_bulk(user_ids, limit):
+                yield b'{"user_id":%s,"recommendations":%s}\n' % (encode(user_id), encode_items(recommendations))
+        except Exception as e:
+            log.exception("Batch recommendations error", users=len(user_ids))
+            yield encode({"error": str(e)}) + b'\n'
+    
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
 
 @app.route('/trending')
 def get_trending():
@@ -101,52 +455,90 @@ def get_trending():
         limit = request.args.get('limit', 10, type=int)
         search_query = request.args.get('query', '').strip()
         
-        print(f"Getting trending content: hours={hours}, limit={limit}, query={search_query}")
+        page_size = request.args.get('page_size', type=int)
+        cursor = request.args.get('cursor')
         
         if not search_query:
-            return jsonify([{
-                'item_id': 'no_query',
-                'title': 'No Search Query Provided',
-                'category': 'system',
-                'description': 'Please enter a search query to get relevant trending content',
-                'trend_score': 0,
-                'source': 'system'
-            }])
+            return json_response(TRENDING_NO_QUERY.encoded)
         
-        trending = engine.get_trending_content(hours, limit, '', search_query)
+        scope = ('trending', hours, search_query.lower())
+        if cursor:
+            return stored_page(scope, cursor, page_size or limit)
+        engine.record_search_query(search_query)
         
-        print(f"Found {len(trending)} trending items")
+        compute_limit = limit
+        if page_size is not None:
+            limit, compute_limit = ranked_lists.page_size(page_size), ranked_lists.depth
         
-        # Ensure JSON serializable
-        clean_trending = []
-        for item in trending:
-            clean_item = {}
-            for key, value in item.items():
-                if hasattr(value, 'isoformat'):
-                    clean_item[key] = value.isoformat()
-                elif isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                    clean_item[key] = value
-                else:
-                    clean_item[key] = str(value)
-            clean_trending.append(clean_item)
+        cache_key = ('trending', hours, limit, search_query.lower())
+        etag = response_etag(cache_key) if page_size is None else None
+        if etag is not None and http_cache.matches(request, etag, request.url_rule.rule):
+            return not_modified(etag)
+        body = cached_response_body(cache_key) if page_size is None else None
+        if body is not None:
+            return tiered_response(body, TIER_HIT, etag=etag)
         
-        return jsonify(clean_trending)
-    except Exception as e:
-        print(f"Trending error: {e}")
-        import traceback
-        traceback.print_exc()
+        with admission.admit() as deadline:
+            if deadline is None:
+                return tiered_response(*degraded_trending(cache_key))
+            
+            request_log.info("Getting trending content", hours=hours, limit=limit, query=search_query)
+            
+            try:
+                with deadline.scope():
+                    trending = engine.get_trending_content(hours, compute_limit, '', search_query)
+            except DeadlineExceeded:
+                request_log.info("Trending deadline exceeded", query=search_query)
+                return tiered_response(*degraded_trending(cache_key))
+        
+        request_log.info("Found trending items", query=search_query, count=len(trending))
+        
+        with stage('serialization'):
+            if page_size is not None:
+                body, next_cursor = ranked_lists.first_page(scope, trending, limit)
+                return tiered_response(body, TIER_FULL, next_cursor)
+            body = encode_items(trending)
+        response_cache.set(cache_key, body)
+        return tiered_response(body, TIER_FULL, etag=etag)
+    except Exception:
+        log.exception("Trending error")
         # Return fallback trending instead of error
-        fallback = [
-            {
-                'item_id': 'trending_error_fallback',
-                'title': 'Query-Based Trending Content',
-                'category': 'system',
-                'description': 'Fetching trending content based on your search query',
-                'trend_score': 100,
-                'source': 'fallback'
-            }
-        ]
-        return jsonify(fallback)
+        return tiered_response(TRENDING_ERROR_FALLBACK.encoded, TIER_STATIC)
+
+@app.route('/trending/stream')
+def stream_trending():
+    """Server-Sent Events stream of trending results, pushed when the ranking changes"""
+    hours = request.args.get('hours', 24, type=int)
+    limit = request.args.get('limit', 10, type=int)
+    search_query = request.args.get('query', '').strip().lower()
+    category = request.args.get('category', '').strip().lower()
+    
+    if not search_query and not category:
+        return jsonify({"error": "Missing query or category"}), 400
+    
+    try:
+        subscription = trending_broadcaster.subscribe((search_query, category, hours, limit))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    
+    def events():
+        try:
+            yield b'retry: 5000\n\n'
+            while True:
+                update = subscription.next(SSE_HEARTBEAT_SECONDS)
+                if update is None:
+                    yield b': keep-alive\n\n'
+                    continue
+                version, body = update
+                yield b'id: %d\nevent: trending\ndata: %s\n\n' % (version, body)
+        finally:
+            trending_broadcaster.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/search-history', methods=['POST'])
 def update_search_history():
@@ -159,12 +551,13 @@ def update_search_history():
             return jsonify({"error": "Missing user_id or history"}), 400
         
         search_intent = engine.update_search_profile(user_id, browser_history)
+        response_cache.invalidate_tag(user_id)
         return jsonify({
             "status": "Search profile updated",
             "search_intent": search_intent
         })
     except Exception as e:
-        print(f"Search history error: {e}")
+        log.error("Search history error", error=str(e))
         return jsonify({"error": str(e)}), 500
 
 @app.route('/search-suggestions')
@@ -179,9 +572,14 @@ def get_search_suggestions():
         suggestions = engine.get_search_suggestions(query, limit)
         return jsonify(suggestions)
     except Exception as e:
-        print(f"Search suggestions error: {e}")
+        log.error("Search suggestions error", error=str(e))
         return jsonify({"error": str(e)}), 500
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(registry.expose(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/status')
 def get_status():
     try:
@@ -189,6 +587,40 @@ def get_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+precompute_state = {"running": False, "last_report": None}
+precompute_lock = threading.Lock()
+
+@app.route('/precompute', methods=['GET', 'POST'])
+def precompute():
+    """Start the offline top-N job in the background (POST) or read its last report (GET)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    if request.method == 'GET':
+        return jsonify(precompute_state)
+    
+    data = request.get_json(silent=True) or {}
+    limit = int(data.get('limit', PRECOMPUTE_DEPTH))
+    active_days = int(data.get('active_days', 30))
+    
+    def job():
+        try:
+            precompute_state["last_report"] = engine.run_precompute(limit, active_days)
+            response_cache.clear()
+        except Exception as e:
+            log.exception("Precompute error")
+            precompute_state["last_report"] = {"error": str(e)}
+        finally:
+            precompute_state["running"] = False
+    
+    # Check and set together, so concurrent POSTs start at most one job
+    with precompute_lock:
+        if precompute_state["running"]:
+            return jsonify({"status": "already running"}), 409
+        precompute_state["running"] = True
+    threading.Thread(target=job, daemon=True, name="precompute").start()
+    return jsonify({"status": "started"}), 202
+
 @app.route('/sample-data', methods=['POST'])
 def load_sample_data():
     try:
@@ -197,6 +629,9 @@ def load_sample_data():
             engine.base_engine.memory_users.clear()
             engine.base_engine.memory_items.clear()
             engine.base_engine.memory_interactions.clear()
+            engine.base_engine.memory_daily.clear()
+            engine.base_engine.memory_seen.clear()
+            engine.sessions.clear()
         
         # Sample items
         items = [
@@ -248,16 +683,21 @@ def load_sample_data():
         for user_id, history in sample_histories.items():
             engine.update_search_profile(user_id, history)
         
+        engine.candidate_pools.rebuild()
+        engine.results.clear()
+        response_cache.clear()
         return jsonify({"status": "Enhanced sample data loaded successfully!"})
     
     except Exception as e:
-        print(f"Sample data error: {e}")
+        log.error("Sample data error", error=str(e))
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    print("Starting Enhanced Real-Time Recommendation Engine...")
-    print(f"Database: {engine.get_database_status()}")
-    print("Real-time content fetching: Enabled")
-    print("Google Search Integration: Enhanced")
-    print("Server running at: http://localhost:5001")
+    if '--startup-report' in sys.argv:
+        # Import/init breakdown and first-request latency, for tuning cold starts
+        startup.mark('app_setup')
+        print(json.dumps(startup.report(app), indent=2))
+        sys.exit(0)
+    log.info("Starting Enhanced Real-Time Recommendation Engine", database=engine.get_database_status(),
+             real_time_content=True, url="http://localhost:5001")
     app.run(debug=True, port=5001, host='0.0.0.0')
@@ -0,0 +1,125 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'log_records_dropped_total',
+    'Log records dropped because the log queue was full'
+)
+
+LOG_RECORDS_SAMPLED_OUT = registry.counter(
+    'log_records_sampled_out_total',
+    'Per-request log records skipped by sampling',
+    labels=('logger',)
+)
+
+_RESERVED_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, structured fields, exception"""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: records are dropped (and counted) when the queue is full"""
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record):
+        # Same process, so message formatting and traceback rendering can
+        # happen on the writer thread instead of the request thread
+        return record
+
+class SampledFilter(logging.Filter):
+    """Pass roughly `rate` of INFO/DEBUG records; warnings and errors always pass"""
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            fields = getattr(record, 'fields', None)
+            if fields is not None:
+                fields["sample_rate"] = self.rate
+            return True
+        LOG_RECORDS_SAMPLED_OUT.labels(record.name).inc()
+        return False
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger whose keyword arguments become structured fields:
+
+        log.info("recommendations served", user_id=user_id, count=10)
+    """
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _RESERVED_KWARGS}
+        kwargs['extra'] = {'fields': fields}
+        return msg, kwargs
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+
+def configure():
+    """Route the `recommendation` logger tree through a bounded queue to a writer thread"""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+        log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(TextFormatter() if os.getenv('LOG_FORMAT', 'json') == 'text' else JsonFormatter())
+        _listener = QueueListener(log_queue, output, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger('recommendation')
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        root.addHandler(DroppingQueueHandler(log_queue))
+        root.propagate = False
+        _configured = True
+
+def get_logger(name, sample_rate=None):
+    """Structured logger under `recommendation.<name>`; sample_rate thins INFO/DEBUG lines"""
+    configure()
+    logger = logging.getLogger(f'recommendation.{name}')
+    if sample_rate is not None and not any(isinstance(f, SampledFilter) for f in logger.filters):
+        logger.addFilter(SampledFilter(sample_rate))
+    return StructuredLogger(logger, {})
+
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', 0.1))
@@ -0,0 +1,333 @@
+"""HTTP load generator and latency report for the Flask API.
+
+Generate a deterministic traffic file, then replay it against a running
+server (or one started here with in-memory storage):
+
+    python -m benchmarks.loadgen record --requests 5000 --rate 200
+    python -m benchmarks.loadgen replay --start-app --concurrency 16
+    python -m benchmarks.loadgen replay --target http://localhost:5001 --open-loop
+
+Traffic captured by the app itself (TRAFFIC_CAPTURE_PATH) uses the same
+JSONL format and can be replayed the same way.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlparse
+
+from benchmarks.stats import summarize
+from benchmarks.synthetic import SyntheticDataset
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRAFFIC_FILE = os.path.join(REPO_ROOT, 'requests.jsonl')
+
+# Share of each endpoint in generated traffic
+TRAFFIC_MIX = (
+    ('recommendations', 0.35),
+    ('trending', 0.25),
+    ('search-suggestions', 0.25),
+    ('interactions', 0.10),
+    ('search-history', 0.05)
+)
+
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+FALLBACK_SOURCES = ('fallback', 'default')
+
+def endpoint_name(method, path):
+    """Group concrete paths into endpoint names for the report"""
+    route = path.split('?', 1)[0]
+    if route.startswith('/recommendations/'):
+        route = '/recommendations/batch' if route == '/recommendations/batch' else '/recommendations/<user_id>'
+    return f"{method} {route}"
+
+def generate_traffic(dataset, n_requests, rate, seed):
+    """Deterministic request schedule with Poisson arrivals at `rate` req/s"""
+    rng = random.Random(seed)
+    names = [name for name, _ in TRAFFIC_MIX]
+    weights = [weight for _, weight in TRAFFIC_MIX]
+    offset = 0.0
+    for _ in range(n_requests):
+        offset += rng.expovariate(rate)
+        user_id = rng.choice(dataset.user_ids)
+        kind = rng.choices(names, weights)[0]
+        if kind == 'recommendations':
+            if rng.random() < 0.5:
+                path = f"/recommendations/{user_id}?limit=10"
+            else:
+                query = quote(dataset.search_query())
+                path = f"/recommendations/{user_id}?limit=10&search_based=true&query={query}"
+            request = {"method": "GET", "path": path}
+        elif kind == 'trending':
+            request = {"method": "GET", "path": f"/trending?limit=10&query={quote(dataset.search_query())}"}
+        elif kind == 'search-suggestions':
+            prefix = dataset.search_query()[:rng.randint(3, 8)]
+            request = {"method": "GET", "path": f"/search-suggestions?q={quote(prefix)}&limit=5"}
+        elif kind == 'interactions':
+            request = {"method": "POST", "path": "/interactions", "body": {
+                "user_id": user_id,
+                "item_id": rng.choice(dataset.items)["item_id"],
+                "interaction_type": rng.choice(['view', 'view', 'like', 'purchase'])
+            }}
+        else:
+            request = {"method": "POST", "path": "/search-history", "body": {
+                "user_id": user_id,
+                "history": dataset.search_history(user_id)
+            }}
+        request["t"] = round(offset, 6)
+        yield request
+
+def load_traffic(path):
+    """Read a traffic file, skipping lines that are not request records"""
+    requests = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'method' in record and 'path' in record:
+                requests.append(record)
+    requests.sort(key=lambda r: r.get('t', 0))
+    return requests
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.errors = 0
+        self.fallbacks = 0
+        self.status_codes = {}
+
+    def observe(self, latency_ms, status, fallback):
+        self.latencies_ms.append(latency_ms)
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[i] += 1
+                break
+        self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+        if status == 'error' or not (200 <= status < 400):
+            self.errors += 1
+        if fallback:
+            self.fallbacks += 1
+
+    def report(self, elapsed):
+        count = len(self.latencies_ms)
+        report = summarize(self.latencies_ms)
+        report.update({
+            "throughput_rps": round(count / elapsed, 2) if elapsed > 0 else None,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "fallback_rate": round(self.fallbacks / count, 4) if count else 0.0,
+            "status_codes": self.status_codes,
+            "histogram_ms": {
+                ("+Inf" if bound == float('inf') else str(bound)): n
+                for bound, n in zip(HISTOGRAM_BUCKETS_MS, self.histogram)
+            }
+        })
+        return report
+
+def is_fallback(body):
+    """True if a list response was served from static fallback/default content"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return False
+    return (isinstance(payload, list) and bool(payload) and isinstance(payload[0], dict)
+            and payload[0].get('source') in FALLBACK_SOURCES)
+
+class LoadRunner:
+    def __init__(self, target, concurrency, timeout=30):
+        parsed = urlparse(target)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def send(self, request, scheduled_at=None):
+        """Issue one request; latency counts from scheduled_at to avoid coordinated omission"""
+        start = scheduled_at if scheduled_at is not None else time.perf_counter()
+        body = request.get('body')
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        status, fallback = 'error', False
+        try:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(request['method'], request['path'], body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                status = response.status
+                fallback = request['method'] == 'GET' and is_fallback(data)
+            finally:
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            pass
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        name = endpoint_name(request['method'], request['path'])
+        with self._lock:
+            self.stats.setdefault(name, EndpointStats()).observe(latency_ms, status, fallback)
+
+    def run_closed_loop(self, requests):
+        """Each worker sends its next request as soon as the previous one returns"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self.send, requests))
+
+    def run_open_loop(self, requests, speed=1.0):
+        """Send each request at its recorded offset regardless of outstanding requests"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for request in requests:
+                scheduled_at = started + request.get('t', 0) / speed
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, request, scheduled_at)
+
+    def report(self, elapsed, mode):
+        total = sum(len(s.latencies_ms) for s in self.stats.values())
+        return {
+            "mode": mode,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "total_requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else None,
+            "endpoints": {name: stats.report(elapsed) for name, stats in sorted(self.stats.items())}
+        }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_app(port):
+    """Start app.py with in-memory storage on a local port and wait until it answers"""
+    env = dict(os.environ, STORAGE_BACKEND='memory')
+    command = [sys.executable, '-c',
+               f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/status')
+            connection.getresponse().read()
+            connection.close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("App exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start within 60s")
+
+def seed_app(target, dataset, concurrency):
+    """Load the synthetic dataset through the public write endpoints"""
+    runner = LoadRunner(target, concurrency)
+    writes = [{"method": "POST", "path": "/users", "body": {"user_id": u}} for u in dataset.user_ids]
+    writes += [{"method": "POST", "path": "/items", "body": {
+        k: item[k] for k in ('item_id', 'title', 'category', 'description')
+    }} for item in dataset.items]
+    writes += [{"method": "POST", "path": "/interactions", "body": {
+        "user_id": i["user_id"], "item_id": i["item_id"], "interaction_type": i["interaction_type"]
+    }} for i in dataset.interactions()]
+    runner.run_closed_loop(writes)
+
+def build_dataset(args):
+    users, items, interactions = (int(part) for part in args.dataset.lower().split('x'))
+    return SyntheticDataset(users, items, interactions, seed=args.seed)
+
+def cmd_record(args):
+    path = args.traffic_file
+    if os.path.exists(path) and os.path.getsize(path) and not args.force:
+        sys.exit(f"{path} is not empty; pass --force to overwrite it")
+    dataset = build_dataset(args)
+    with open(path, 'w') as f:
+        for request in generate_traffic(dataset, args.requests, args.rate, args.seed):
+            f.write(json.dumps(request, sort_keys=True) + '\n')
+    print(f"Wrote {args.requests} requests to {path}", file=sys.stderr)
+
+def cmd_replay(args):
+    requests = load_traffic(args.traffic_file)
+    if not requests:
+        sys.exit(f"No request records in {args.traffic_file}; run 'record' first")
+
+    process = None
+    target = args.target
+    if args.start_app:
+        port = free_port()
+        target = f"http://127.0.0.1:{port}"
+        process = start_app(port)
+        if args.seed_data:
+            seed_app(target, build_dataset(args), args.concurrency)
+    try:
+        runner = LoadRunner(target, args.concurrency, args.timeout)
+        started = time.perf_counter()
+        if args.open_loop:
+            runner.run_open_loop(requests, args.speed)
+        else:
+            runner.run_closed_loop(requests)
+        elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = runner.report(elapsed, 'open-loop' if args.open_loop else 'closed-loop')
+    report["traffic_file"] = os.path.basename(args.traffic_file)
+    report["finished_at"] = datetime.utcnow().isoformat()
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against the recommendation API")
+    parser.add_argument('--traffic-file', default=DEFAULT_TRAFFIC_FILE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dataset', default='500x2000x20000', help="USERSxITEMSxINTERACTIONS used for generated traffic and --seed-data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help="write a deterministic synthetic traffic file")
+    record.add_argument('--requests', type=int, default=5000)
+    record.add_argument('--rate', type=float, default=100.0, help="mean arrival rate (req/s) for recorded offsets")
+    record.add_argument('--force', action='store_true')
+
+    replay = subparsers.add_parser('replay', help="replay a traffic file and report per-endpoint latency")
+    replay.add_argument('--target', default='http://localhost:5001')
+    replay.add_argument('--start-app', action='store_true', help="start app.py locally with in-memory storage")
+    replay.add_argument('--no-seed-data', dest='seed_data', action='store_false', help="with --start-app, skip loading the synthetic dataset")
+    replay.add_argument('--concurrency', type=int, default=8)
+    replay.add_argument('--open-loop', action='store_true', help="send at recorded arrival times instead of back-to-back")
+    replay.add_argument('--speed', type=float, default=1.0, help="open-loop time scale (2.0 = twice the recorded rate)")
+    replay.add_argument('--timeout', type=float, default=30.0)
+    replay.add_argument('--output')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        cmd_record(args)
+    else:
+        cmd_replay(args)
+
+if __name__ == '__main__':
+    main()
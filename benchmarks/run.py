@@ -0,0 +1,260 @@
+"""Synthetic-scale benchmarks for the recommendation engine.
+
+Each (mode, size) scenario runs in its own subprocess so peak RSS is
+measured per scenario. Results are written as JSON with sorted keys so two
+runs can be diffed directly or with --compare.
+
+    python -m benchmarks.run --sizes small,medium --modes memory,mongomock
+    python -m benchmarks.run --compare baseline.json latest.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = {
+    'small': (1000, 2000, 20000),
+    'medium': (10000, 20000, 200000),
+    'large': (50000, 100000, 1000000)
+}
+
+MODES = ('memory', 'mongomock', 'mongo')
+
+def parse_size(name):
+    """A preset name or USERSxITEMSxINTERACTIONS"""
+    if name in SIZES:
+        return SIZES[name]
+    users, items, interactions = (int(part) for part in name.lower().split('x'))
+    return users, items, interactions
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+def time_operation(fn, args_for, iterations, warmup, max_seconds):
+    """Call fn(*args_for(i)) repeatedly and return latency samples in ms"""
+    for i in range(warmup):
+        fn(*args_for(i))
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(iterations):
+        args = args_for(i)
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        if time.perf_counter() > deadline:
+            break
+    return samples
+
+def build_base_engine(mode, mongo_uri):
+    from models import RecommendationEngine
+    if mode == 'memory':
+        return RecommendationEngine(use_memory=True)
+    if mode == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    client.drop_database(os.environ['DATABASE_NAME'])
+    base_engine = RecommendationEngine(client=client, use_memory=False)
+    if base_engine.use_memory:
+        raise RuntimeError(f"Could not connect to {mode} at {mongo_uri}")
+    return base_engine
+
+def run_scenario(mode, size, iterations, warmup, seed, mongo_uri, max_seconds):
+    from benchmarks.stats import summarize
+    from benchmarks.synthetic import SyntheticDataset, load_into
+
+    n_users, n_items, n_interactions = parse_size(size)
+    dataset = SyntheticDataset(n_users, n_items, n_interactions, seed=seed)
+    base_engine = build_base_engine(mode, mongo_uri)
+
+    load_start = time.perf_counter()
+    load_into(base_engine, dataset)
+    load_seconds = time.perf_counter() - load_start
+
+    from engine import EnhancedRecommendationEngine
+    import app as web_app
+    engine = EnhancedRecommendationEngine(base_engine)
+    web_app.engine = engine
+    client = web_app.app.test_client()
+
+    picker = random.Random(seed)
+    users = [picker.choice(dataset.user_ids) for _ in range(iterations + warmup)]
+    queries = [dataset.search_query() for _ in range(iterations + warmup)]
+    histories = [dataset.search_history(user_id) for user_id in users]
+    item_ids = [picker.choice(dataset.items)["item_id"] for _ in range(iterations + warmup)]
+
+    def get(path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+
+    def post(path, payload):
+        response = client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {path} returned {response.status_code}")
+
+    operations = {
+        'engine.get_user_recommendations': (
+            base_engine.get_user_recommendations, lambda i: (users[i], 10)),
+        'engine.get_trending_items': (
+            base_engine.get_trending_items, lambda i: (24, 10)),
+        'engine.analyze_search_query': (
+            engine.dynamic_search.analyze_search_query, lambda i: (queries[i],)),
+        'engine.update_user_profile': (
+            engine.search_engine.update_user_profile, lambda i: (users[i], histories[i])),
+        'engine.get_personalized_recommendations': (
+            engine.search_engine.get_personalized_recommendations, lambda i: (users[i], 10)),
+        'http.GET /recommendations': (
+            get, lambda i: (f"/recommendations/{users[i]}?limit=10",)),
+        'http.GET /recommendations search_based': (
+            get, lambda i: (f"/recommendations/{users[i]}?limit=10&search_based=true&query={queries[i]}",)),
+        'http.GET /trending': (
+            get, lambda i: (f"/trending?limit=10&query={queries[i]}",)),
+        'http.GET /search-suggestions': (
+            get, lambda i: (f"/search-suggestions?q={queries[i][:5]}",)),
+        'http.POST /search-history': (
+            post, lambda i: ("/search-history", {"user_id": users[i], "history": histories[i]})),
+        'http.POST /interactions': (
+            post, lambda i: ("/interactions", {"user_id": users[i], "item_id": item_ids[i]}))
+    }
+
+    results = {}
+    for name, (fn, args_for) in operations.items():
+        samples = time_operation(fn, args_for, iterations, warmup, max_seconds)
+        results[name] = summarize(samples)
+        print(f"[{mode}/{size}] {name}: {results[name]}", file=sys.stderr)
+
+    return {
+        "mode": mode,
+        "size": size,
+        "dataset": {"users": n_users, "items": n_items, "interactions": n_interactions, "seed": seed},
+        "load_seconds": round(load_seconds, 3),
+        "operations": results,
+        "peak_rss_kb": peak_rss_kb()
+    }
+
+def run_worker(args):
+    # Keep the benchmark hermetic: no real Mongo, no response cache, no precomputed tables
+    os.environ['STORAGE_BACKEND'] = 'memory'
+    os.environ['RESPONSE_CACHE_TTL'] = '0'
+    os.environ['PRECOMPUTED_PATH'] = os.path.join(tempfile.mkdtemp(), 'precomputed.json')
+    os.environ.setdefault('DATABASE_NAME', 'recommendation_benchmark')
+    sys.path.insert(0, REPO_ROOT)
+    result = run_scenario(args.mode, args.size, args.iterations, args.warmup,
+                          args.seed, args.mongo_uri, args.max_seconds)
+    with open(args.result_file, 'w') as f:
+        json.dump(result, f)
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_all(args):
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": datetime.utcnow().isoformat(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "seed": args.seed
+        },
+        "results": []
+    }
+    for mode in args.modes.split(','):
+        for size in args.sizes.split(','):
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                result_file = f.name
+            command = [
+                sys.executable, '-m', 'benchmarks.run', '--worker',
+                '--mode', mode, '--size', size,
+                '--iterations', str(args.iterations), '--warmup', str(args.warmup),
+                '--seed', str(args.seed), '--mongo-uri', args.mongo_uri,
+                '--max-seconds', str(args.max_seconds), '--result-file', result_file
+            ]
+            # Engine/app print() output goes to /dev/null; progress lines arrive on stderr
+            completed = subprocess.run(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+            if completed.returncode != 0:
+                report["results"].append({"mode": mode, "size": size, "error": f"exit code {completed.returncode}"})
+                continue
+            with open(result_file) as f:
+                report["results"].append(json.load(f))
+            os.remove(result_file)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+def compare(baseline_path, current_path):
+    """Print per-operation percentile deltas between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    indexed = {(r["mode"], r["size"]): r for r in baseline["results"] if "operations" in r}
+    for result in current["results"]:
+        old = indexed.get((result["mode"], result["size"]))
+        if old is None or "operations" not in result:
+            continue
+        print(f"== {result['mode']}/{result['size']} "
+              f"(peak RSS {old['peak_rss_kb']} -> {result['peak_rss_kb']} KB)")
+        for name, stats in sorted(result["operations"].items()):
+            old_stats = old["operations"].get(name)
+            if not old_stats or not stats.get("count"):
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                before, after = old_stats[key], stats[key]
+                change = (after - before) / before * 100 if before else 0.0
+                deltas.append(f"{key[:3]} {before:.3f}->{after:.3f}ms ({change:+.1f}%)")
+            print(f"  {name}: " + ", ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation engine on synthetic data")
+    parser.add_argument('--sizes', default='small,medium', help="comma list of presets (small, medium, large) or UxIxN")
+    parser.add_argument('--modes', default='memory', help="comma list of: " + ', '.join(MODES))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-seconds', type=float, default=60.0, help="time budget per operation")
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help="used by --modes mongo")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--size', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import math
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(math.ceil(pct / 100.0 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+def summarize(latencies_ms):
+    """p50/p95/p99/mean/max summary of latency samples in milliseconds"""
+    values = sorted(latencies_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 4),
+        "p50_ms": round(percentile(values, 50), 4),
+        "p95_ms": round(percentile(values, 95), 4),
+        "p99_ms": round(percentile(values, 99), 4),
+        "max_ms": round(values[-1], 4)
+    }
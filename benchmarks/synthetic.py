@@ -0,0 +1,135 @@
+import random
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+import numpy as np
+
+CATEGORY_VOCABULARY = {
+    'technology': ['python', 'javascript', 'machine learning', 'cloud', 'kubernetes', 'data science', 'algorithms', 'ai', 'web development', 'databases'],
+    'entertainment': ['movies', 'netflix', 'sci fi', 'streaming', 'tv shows', 'music', 'gaming', 'documentaries', 'anime', 'podcasts'],
+    'shopping': ['headphones', 'electronics', 'deals', 'laptops', 'smartphones', 'gadgets', 'reviews', 'discounts', 'cameras', 'watches'],
+    'education': ['online courses', 'tutorials', 'certification', 'university', 'study tips', 'programming', 'languages', 'math', 'books', 'exams'],
+    'health': ['fitness', 'nutrition', 'workout', 'diet', 'wellness', 'yoga', 'running', 'sleep', 'mental health', 'recipes'],
+    'travel': ['destinations', 'hotels', 'flights', 'vacation', 'europe', 'beaches', 'backpacking', 'road trip', 'travel guide', 'cruises']
+}
+
+QUERY_TEMPLATES = [
+    'best {} 2024', 'how to learn {}', '{} tutorial', 'latest {} trends',
+    '{} for beginners', 'top {} reviews', 'cheap {}', '{} vs alternatives'
+]
+
+ITEM_TEMPLATES = [
+    'Complete guide to {}', 'Advanced {} techniques', 'Top picks in {}',
+    'Beginner friendly {} overview', 'Expert reviews of {}', 'Latest news about {}'
+]
+
+INTERACTION_TYPES = ['view', 'view', 'view', 'like', 'purchase']
+
+class SyntheticDataset:
+    """Seeded users/items/interactions with Zipfian item popularity"""
+    def __init__(self, n_users, n_items, n_interactions, seed=42, zipf_exponent=1.1,
+                 window_hours=72, searches_per_user=8):
+        self.n_users = n_users
+        self.n_items = n_items
+        self.n_interactions = n_interactions
+        self.seed = seed
+        self.zipf_exponent = zipf_exponent
+        self.window_hours = window_hours
+        self.searches_per_user = searches_per_user
+        self.now = datetime.utcnow()
+
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self.categories = sorted(CATEGORY_VOCABULARY)
+        self.user_ids = [f"user_{i}" for i in range(n_users)]
+        self.items = self._generate_items()
+        # Each user leans towards one category, which drives both clicks and searches
+        self.user_categories = {
+            user_id: self._random.choice(self.categories) for user_id in self.user_ids
+        }
+
+    def _generate_items(self):
+        items = []
+        for i in range(self.n_items):
+            category = self.categories[i % len(self.categories)]
+            topic = self._random.choice(CATEGORY_VOCABULARY[category])
+            other = self._random.choice(CATEGORY_VOCABULARY[category])
+            items.append({
+                "item_id": f"item_{i}",
+                "title": self._random.choice(ITEM_TEMPLATES).format(topic).capitalize(),
+                "category": category,
+                "description": f"{topic} and {other} content for {category} fans",
+                "features": [topic, other],
+                "created_at": self.now
+            })
+        return items
+
+    def users(self):
+        return [
+            {"user_id": user_id, "preferences": [self.user_categories[user_id]], "created_at": self.now}
+            for user_id in self.user_ids
+        ]
+
+    def interactions(self):
+        """Interactions with Zipfian item popularity and a uniform timestamp spread over the window"""
+        ranks = np.arange(1, self.n_items + 1, dtype=float)
+        weights = 1.0 / np.power(ranks, self.zipf_exponent)
+        weights /= weights.sum()
+        # Shuffle which items are popular so popularity is independent of item index
+        popularity_order = self._rng.permutation(self.n_items)
+        item_choices = popularity_order[self._rng.choice(self.n_items, size=self.n_interactions, p=weights)]
+        # User activity is skewed as well: a few heavy users, a long tail of light ones
+        user_choices = self._rng.zipf(1.5, size=self.n_interactions) % self.n_users
+        offsets = self._rng.uniform(0, self.window_hours * 3600, size=self.n_interactions)
+        types = self._rng.integers(0, len(INTERACTION_TYPES), size=self.n_interactions)
+
+        interactions = []
+        for item_index, user_index, offset, type_index in zip(item_choices, user_choices, offsets, types):
+            interaction_type = INTERACTION_TYPES[type_index]
+            interactions.append({
+                "user_id": self.user_ids[user_index],
+                "item_id": self.items[item_index]["item_id"],
+                "interaction_type": interaction_type,
+                "rating": None,
+                "timestamp": self.now - timedelta(seconds=float(offset))
+            })
+        interactions.sort(key=lambda interaction: interaction["timestamp"])
+        return interactions
+
+    def search_query(self, category=None):
+        category = category or self._random.choice(self.categories)
+        keyword = self._random.choice(CATEGORY_VOCABULARY[category])
+        return self._random.choice(QUERY_TEMPLATES).format(keyword)
+
+    def search_history(self, user_id):
+        """Browser history entries shaped like the /search-history payload"""
+        home = self.user_categories[user_id]
+        history = []
+        for i in range(self.searches_per_user):
+            # Mostly the user's home category with some exploration
+            category = home if self._random.random() < 0.7 else None
+            query = self.search_query(category)
+            history.append({
+                "url": f"https://www.google.com/search?q={quote_plus(query)}",
+                "title": query,
+                "timestamp": (self.now - timedelta(hours=i * 6)).isoformat()
+            })
+        return history
+
+def load_into(base_engine, dataset, batch_size=10000):
+    """Bulk-load a dataset into a RecommendationEngine (memory or Mongo)"""
+    users = dataset.users()
+    interactions = dataset.interactions()
+    if base_engine.use_memory:
+        base_engine.memory_users.update((user["user_id"], user) for user in users)
+        base_engine.memory_items.update((item["item_id"], dict(item)) for item in dataset.items)
+        base_engine.memory_interactions.extend(interactions)
+        base_engine.rebuild_seen_filters()
+        return
+    for collection, docs in ((base_engine.users, users),
+                             (base_engine.items, [dict(item) for item in dataset.items]),
+                             (base_engine.interactions, interactions)):
+        for start in range(0, len(docs), batch_size):
+            collection.insert_many(docs[start:start + batch_size], ordered=False)
+    # Raw inserts bypass record_interaction, so build the trending buckets and seen filters afterwards
+    base_engine.backfill_interaction_buckets(batch_size=batch_size)
+    base_engine.rebuild_seen_filters()
@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+from applog import get_logger
+
+log = get_logger('broadcast')
+
+class Subscription:
+    """One client's view of a broadcast channel"""
+    def __init__(self, channel, queue_size):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=queue_size)
+
+    def push(self, message):
+        # Slow clients only ever need the latest ranking, so drop the oldest update
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def next(self, timeout):
+        """Return the next (version, body) update, or None on timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class _Channel:
+    def __init__(self, key):
+        self.key = key
+        self.subscribers = set()
+        self.version = 0
+        self.last_body = None
+        self.wakeup = threading.Event()
+        self.thread = None
+
+class TrendingBroadcaster:
+    """Fan-out of trending results: one computation per key, many subscribers.
+
+    Each channel runs a single refresh thread that recomputes the encoded
+    result every `interval` seconds (or sooner after notify()) and pushes it
+    to subscribers only when the body actually changed.
+    """
+    def __init__(self, compute, interval=15, queue_size=8, max_channels=256):
+        self.compute = compute
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_channels = max_channels
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, compute):
+        return cls(
+            compute,
+            interval=float(os.getenv('TRENDING_STREAM_INTERVAL', 15)),
+            queue_size=int(os.getenv('TRENDING_STREAM_QUEUE_SIZE', 8)),
+            max_channels=int(os.getenv('TRENDING_STREAM_MAX_CHANNELS', 256))
+        )
+
+    def subscribe(self, key):
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                if len(self._channels) >= self.max_channels:
+                    raise RuntimeError("Too many active trending streams")
+                channel = _Channel(key)
+                self._channels[key] = channel
+                channel.thread = threading.Thread(
+                    target=self._run, args=(channel,), daemon=True,
+                    name=f"trending-stream-{len(self._channels)}"
+                )
+                channel.thread.start()
+            subscription = Subscription(channel, self.queue_size)
+            channel.subscribers.add(subscription)
+            if channel.last_body is not None:
+                subscription.push((channel.version, channel.last_body))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        channel = subscription.channel
+        with self._lock:
+            channel.subscribers.discard(subscription)
+            if not channel.subscribers and self._channels.get(channel.key) is channel:
+                del self._channels[channel.key]
+                channel.wakeup.set()
+
+    def notify(self):
+        """Ask every channel to recompute now (e.g. after new interactions)"""
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            channel.wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscribers": sum(len(c.subscribers) for c in self._channels.values())
+            }
+
+    def _run(self, channel):
+        while True:
+            with self._lock:
+                if not channel.subscribers:
+                    return
+            try:
+                body = self.compute(*channel.key)
+            except Exception as e:
+                log.error("Trending stream error", channel=channel.key, error=str(e))
+                body = None
+            if body is not None and body != channel.last_body:
+                with self._lock:
+                    channel.version += 1
+                    channel.last_body = body
+                    message = (channel.version, body)
+                    subscribers = list(channel.subscribers)
+                for subscription in subscribers:
+                    subscription.push(message)
+            channel.wakeup.wait(self.interval)
+            channel.wakeup.clear()
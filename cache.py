@@ -0,0 +1,354 @@
+import heapq
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from applog import get_logger
+from deadline import DeadlineExceeded, check_deadline, current_deadline
+
+log = get_logger('cache')
+
+# Tags share this many invalidation counters, so versions take fixed memory however many tags exist
+VERSION_SLOTS = 4096
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and tag-based invalidation"""
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, tag)
+        self._tags = {}  # tag -> set of keys
+        self._generation = 0  # clear() count
+        self._tag_versions = [0] * VERSION_SLOTS  # invalidate_tag() count per tag slot
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, prefix, ttl=30, max_entries=10000):
+        """Build a cache configured by <prefix>_TTL and <prefix>_MAX_ENTRIES"""
+        return cls(
+            ttl=float(os.getenv(f'{prefix}_TTL', ttl)),
+            max_entries=int(os.getenv(f'{prefix}_MAX_ENTRIES', max_entries))
+        )
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                # Expired entries stay until replaced or evicted, so get_stale() can still serve them
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key):
+        """Value for `key` even if it has expired; None once invalidated or evicted"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[1]
+
+    def set(self, key, value, tag=None, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            self._tag_versions[_slot(tag)] += 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def version(self, tag=None):
+        """Changes whenever entries tagged `tag` (or all entries) are invalidated.
+
+        Tags hash into VERSION_SLOTS counters, so invalidating one tag may
+        also change the version of a few others, never the reverse.
+        """
+        with self._lock:
+            return self._generation, None if tag is None else self._tag_versions[_slot(tag)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+def _slot(tag):
+    return zlib.crc32(str(tag).encode()) % VERSION_SLOTS
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller (leader) runs the function; callers arriving while it
+    is in flight (followers) wait up to `timeout` seconds, or less if their
+    request deadline comes first, and get the same result object, which
+    they must treat as read-only. A leader exception is re-raised in every
+    follower, except the leader's own DeadlineExceeded: followers with
+    budget left try again, one of them becoming the new leader. A follower
+    that times out raises TimeoutError (DeadlineExceeded if its deadline
+    passed) without affecting the leader.
+    """
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls, prefix, timeout=10):
+        """Build a group configured by <prefix>_TIMEOUT"""
+        return cls(timeout=float(os.getenv(f'{prefix}_TIMEOUT', timeout)))
+
+    def do(self, key, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.leaders += 1
+                else:
+                    call.followers += 1
+                    self.followers += 1
+            if leader:
+                try:
+                    call.result = fn(*args, **kwargs)
+                    return call.result
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+            # Never wait past the caller's own request deadline, which holds its admission slot
+            deadline = current_deadline()
+            timeout = self.timeout if deadline is None else min(self.timeout, deadline.remaining())
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded()
+                raise TimeoutError(f"Timed out after {timeout:.3g}s waiting for in-flight call {key!r}")
+            if isinstance(call.error, DeadlineExceeded):
+                # The leader ran out of its own budget; this caller may still have time to compute
+                check_deadline()
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+class _SWREntry:
+    __slots__ = ('value', 'fresh_until', 'stale_until', 'fn', 'args')
+
+    def __init__(self, value, fresh_until, stale_until, fn, args):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.fn = fn
+        self.args = args
+
+class StaleWhileRevalidateCache:
+    """Result cache that keeps serving expired entries while they are recomputed.
+
+    An entry is fresh for `ttl` seconds and may then be served stale for up
+    to `stale_ttl` more while a background refresh runs; only misses (and
+    entries past `stale_ttl`) compute inline, coalesced through `inflight`.
+    A scheduler thread refreshes the `hot_keys` most requested keys shortly
+    before they expire, so popular queries rarely go stale at all. At most
+    `refresh_concurrency` refreshes run at once.
+    """
+    def __init__(self, ttl=30, stale_ttl=300, max_entries=1000, refresh_concurrency=4,
+                 hot_keys=50, schedule_interval=5, inflight=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.refresh_concurrency = refresh_concurrency
+        self.hot_keys = hot_keys
+        self.schedule_interval = schedule_interval
+        self.inflight = inflight or SingleFlight()
+        self._entries = OrderedDict()
+        self._requests = {}  # key -> request count, halved every scheduler pass
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_concurrency, thread_name_prefix='swr-refresh')
+        self._thread = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @classmethod
+    def from_env(cls, prefix, inflight=None, ttl=30, stale_ttl=300):
+        """Build a cache configured by <prefix>_TTL, _STALE_TTL, _MAX_ENTRIES,
+        _REFRESH_CONCURRENCY, _HOT_KEYS and _SCHEDULE_INTERVAL"""
+        return cls(
+            ttl=float(os.getenv(f'{prefix}_TTL', ttl)),
+            stale_ttl=float(os.getenv(f'{prefix}_STALE_TTL', stale_ttl)),
+            max_entries=int(os.getenv(f'{prefix}_MAX_ENTRIES', 1000)),
+            refresh_concurrency=int(os.getenv(f'{prefix}_REFRESH_CONCURRENCY', 4)),
+            hot_keys=int(os.getenv(f'{prefix}_HOT_KEYS', 50)),
+            schedule_interval=float(os.getenv(f'{prefix}_SCHEDULE_INTERVAL', 5)),
+            inflight=inflight
+        )
+
+    def get(self, key, fn, *args):
+        """Cached fn(*args) for `key`, computing inline only on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now < entry.fresh_until:
+                    self.hits += 1
+                    return entry.value
+                if now < entry.stale_until:
+                    self.stale_hits += 1
+                    stale = entry
+                else:
+                    stale = None
+                    self.misses += 1
+            else:
+                stale = None
+                self.misses += 1
+        if stale is not None:
+            self._schedule(key, fn, args)
+            return stale.value
+        return self.inflight.do(key, self._load, key, fn, args)
+
+    def _load(self, key, fn, args):
+        value = fn(*args)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = _SWREntry(value, now + self.ttl, now + self.ttl + self.stale_ttl, fn, args)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _schedule(self, key, fn, args):
+        with self._lock:
+            # Bounded backlog: at most one pending refresh per key, a few per worker
+            if key in self._refreshing or len(self._refreshing) >= self.refresh_concurrency * 4:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, fn, args)
+
+    def _refresh(self, key, fn, args):
+        try:
+            self.inflight.do(key, self._load, key, fn, args)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            log.error("Background refresh error", key=str(key), error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def refresh_hot(self):
+        """Refresh the most requested keys that expire before the next scheduler pass"""
+        deadline = time.monotonic() + self.schedule_interval * 2
+        with self._lock:
+            hot = heapq.nlargest(self.hot_keys, self._requests.items(), key=lambda entry: entry[1])
+            due = []
+            for key, _count in hot:
+                entry = self._entries.get(key)
+                if entry is not None and entry.fresh_until <= deadline:
+                    due.append((key, entry.fn, entry.args))
+            self._requests = {key: count / 2 for key, count in self._requests.items() if count >= 1}
+        for key, fn, args in due:
+            self._schedule(key, fn, args)
+        return len(due)
+
+    def expire(self, kind, match=None):
+        """Mark entries whose key starts with `kind` (and satisfies `match`, if given) stale; the next read refreshes them"""
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key[0] == kind and entry.fresh_until > now and (match is None or match(key)):
+                    entry.fresh_until = now
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._requests.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "refreshing": len(self._refreshing)
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="swr-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.schedule_interval):
+            try:
+                self.refresh_hot()
+            except Exception as e:
+                log.error("Refresh scheduler error", error=str(e))
@@ -0,0 +1,203 @@
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+from metrics import registry
+from applog import get_logger
+
+log = get_logger('candidate_pools')
+
+POOL_REFRESH_LATENCY = registry.histogram(
+    'candidate_pool_refresh_duration_seconds',
+    'Time spent rebuilding candidate pools',
+    labels=('kind',)
+)
+
+POOL_CATEGORIES_REFRESHED = registry.counter(
+    'candidate_pool_categories_refreshed_total',
+    'Category pools re-ranked by incremental refreshes'
+)
+
+POOL_SERVED = registry.counter(
+    'candidate_pool_served_total',
+    'Cold-start requests answered from candidate pools',
+    labels=('pool',)
+)
+
+ALL_CATEGORIES = '*'  # pool key for the catalog-wide ranking
+
+class CandidatePools:
+    """Pre-ranked top-K popular and recent items per category for cold-start users.
+
+    A full rebuild reads the catalog and per-item interaction counts once.
+    After that, interactions and new items only bump in-process counts and
+    mark their category dirty, and refresh() re-ranks just the dirty
+    categories. Reads return slices of the current pool lists, so serving
+    costs O(limit) and never touches storage.
+    """
+    def __init__(self, base_engine, size=100, recent_share=0.2, refresh_interval=30, full_refresh_interval=3600):
+        self.base_engine = base_engine
+        self.size = size
+        self.recent_share = recent_share
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._counts = {}
+        self._categories = {}
+        self._created = {}
+        self._members = {}
+        self._docs = {}
+        self._dirty = set()
+        self._pools = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, base_engine):
+        return cls(
+            base_engine,
+            size=int(os.getenv('CANDIDATE_POOL_SIZE', 100)),
+            refresh_interval=float(os.getenv('CANDIDATE_POOL_REFRESH_INTERVAL', 30)),
+            full_refresh_interval=float(os.getenv('CANDIDATE_POOL_FULL_REFRESH_INTERVAL', 3600))
+        )
+
+    def get(self, category=None, limit=10):
+        """Up to `limit` cold-start candidates for `category`, topped up from the overall pool"""
+        pools = self._pools
+        if pools is None:
+            self.rebuild()
+            pools = self._pools
+        pool = 'category' if category is not None and category in pools else 'all'
+        popular, recent = pools[category if pool == 'category' else ALL_CATEGORIES]
+        n_recent = int(limit * self.recent_share)
+        chosen = list(popular[:limit - n_recent])
+        seen = {item["item_id"] for item in chosen}
+        for candidates in (recent, popular, pools[ALL_CATEGORIES][0]):
+            for item in candidates:
+                if len(chosen) >= limit:
+                    break
+                if item["item_id"] not in seen:
+                    chosen.append(item)
+                    seen.add(item["item_id"])
+        if chosen:
+            POOL_SERVED.labels(pool).inc()
+        return [dict(item, source='popular') for item in chosen]
+
+    def note_interaction(self, item_id):
+        with self._lock:
+            self._counts[item_id] = self._counts.get(item_id, 0) + 1
+            if item_id in self._categories:
+                self._dirty.add(self._categories[item_id])
+
+    def note_item(self, item_id, category):
+        with self._lock:
+            previous = self._categories.get(item_id)
+            if item_id in self._categories and previous != category:
+                self._members.get(previous, set()).discard(item_id)
+                self._dirty.add(previous)
+            self._categories[item_id] = category
+            self._created[item_id] = datetime.utcnow()
+            self._counts.setdefault(item_id, 0)
+            self._members.setdefault(category, set()).add(item_id)
+            self._docs.pop(item_id, None)
+            self._dirty.add(category)
+
+    def rebuild(self):
+        """Full rebuild from storage: catalog metadata plus interaction counts"""
+        with self._build_lock:
+            with POOL_REFRESH_LATENCY.labels('full').time():
+                catalog = list(self.base_engine.get_item_catalog())
+                counts = self.base_engine.get_item_popularity()
+                with self._lock:
+                    self._counts = {item["item_id"]: counts.get(item["item_id"], 0) for item in catalog}
+                    self._categories = {item["item_id"]: item.get("category") for item in catalog}
+                    self._created = {item["item_id"]: item.get("created_at") or datetime.min for item in catalog}
+                    self._members = {}
+                    for item_id, category in self._categories.items():
+                        self._members.setdefault(category, set()).add(item_id)
+                    self._dirty = set()
+                    self._docs = {}
+                    categories = list(self._members)
+                self._pools = self._rank(categories, {})
+                self._built_at = time.monotonic()
+
+    def refresh(self):
+        """Re-rank only the categories touched since the last refresh"""
+        with self._build_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if not dirty or self._pools is None:
+                return 0
+            with POOL_REFRESH_LATENCY.labels('incremental').time():
+                self._pools = self._rank(dirty, self._pools)
+            POOL_CATEGORIES_REFRESHED.inc(len(dirty))
+            return len(dirty)
+
+    def _rank(self, categories, previous):
+        with self._lock:
+            counts = dict(self._counts)
+            created = dict(self._created)
+            members = {category: list(self._members.get(category, ())) for category in categories}
+        ranked = {}
+        for category, item_ids in members.items():
+            ranked[category] = (
+                heapq.nlargest(self.size, item_ids, key=lambda item_id: counts.get(item_id, 0)),
+                heapq.nlargest(self.size, item_ids, key=lambda item_id: created.get(item_id) or datetime.min)
+            )
+        # The overall ranking changes whenever any category does
+        ranked[ALL_CATEGORIES] = (
+            heapq.nlargest(self.size, counts, key=counts.get),
+            heapq.nlargest(self.size, created, key=lambda item_id: created[item_id] or datetime.min)
+        )
+
+        docs = self._docs
+        needed = {item_id for popular, recent in ranked.values() for item_id in popular + recent}
+        missing = [item_id for item_id in needed if item_id not in docs]
+        if missing:
+            docs.update(self.base_engine.get_items_by_ids(missing))
+        # note_item() may evict a doc concurrently, so look each one up once
+        found = {item_id: docs.get(item_id) for item_id in needed}
+
+        pools = dict(previous)
+        for category, (popular, recent) in ranked.items():
+            pools[category] = (
+                [dict(found[item_id], popularity=counts.get(item_id, 0)) for item_id in popular if found[item_id]],
+                [found[item_id] for item_id in recent if found[item_id]]
+            )
+        return pools
+
+    @property
+    def ready(self):
+        """Whether get() can answer from memory without a first rebuild"""
+        return self._pools is not None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="candidate-pools")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._pools is None or time.monotonic() - self._built_at >= self.full_refresh_interval:
+                    self.rebuild()
+                else:
+                    self.refresh()
+            except Exception as e:
+                log.error("Candidate pool refresh error", error=str(e))
+            self._stop.wait(self.refresh_interval)
@@ -0,0 +1,65 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before its work finished"""
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+class Deadline:
+    """Absolute time budget for one request, visible to everything it calls via a context variable.
+
+    Only the thread that entered scope() sees it, so background refreshes
+    started on behalf of a request are never cut short by its budget.
+    """
+    __slots__ = ('expires_at',)
+
+    def __init__(self, budget):
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    @contextmanager
+    def scope(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+def current_deadline():
+    return _current.get()
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request is out of time"""
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded()
+
+def max_time_ms():
+    """Remaining budget for MongoDB's maxTimeMS, or None outside a deadline"""
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return max(1, int(remaining * 1000))
+
+def raise_if_expired(error):
+    """Re-raise `error` as DeadlineExceeded when it was caused by running out of budget.
+
+    Lets catch-all handlers pass deadline expiry (including MongoDB's
+    ExecutionTimeout from maxTimeMS) up to the caller instead of
+    swallowing it.
+    """
+    if isinstance(error, DeadlineExceeded):
+        raise error
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded() from error
@@ -1,10 +1,11 @@
 import re
 from datetime import datetime
-from web_scraper import RealTimeContentFetcher
+from spelling import QuerySuggester
+from web import shared_content_fetcher
 
 class DynamicSearchEngine:
-    def __init__(self):
-        self.content_fetcher = RealTimeContentFetcher()
+    def __init__(self, content_fetcher=None):
+        self.content_fetcher = content_fetcher or shared_content_fetcher()
         self.category_keywords = {
             'technology': ['python', 'javascript', 'programming', 'ai', 'machine learning', 'web development', 'software', 'coding', 'tech', 'computer', 'algorithm', 'data science'],
             'entertainment': ['movie', 'film', 'netflix', 'tv show', 'series', 'streaming', 'music', 'game', 'gaming', 'entertainment', 'video', 'cinema'],
@@ -13,6 +14,34 @@ class DynamicSearchEngine:
             'health': ['health', 'fitness', 'exercise', 'diet', 'nutrition', 'wellness', 'medical', 'doctor', 'workout', 'medicine', 'mental health'],
             'travel': ['travel', 'vacation', 'trip', 'hotel', 'flight', 'destination', 'tourism', 'holiday', 'adventure', 'explore', 'journey']
         }
+        # Category-based suggestions
+        self.category_suggestions = {
+            'tech': ['python programming', 'web development', 'machine learning', 'javascript'],
+            'entertainment': ['netflix shows', 'latest movies', 'streaming services', 'gaming'],
+            'shopping': ['best deals', 'product reviews', 'electronics', 'gadgets'],
+            'education': ['online courses', 'tutorials', 'certifications', 'learning'],
+            'health': ['fitness tips', 'nutrition', 'workout plans', 'wellness'],
+            'travel': ['destinations', 'travel guides', 'hotels', 'flights']
+        }
+        self.suggester = QuerySuggester()
+        self._seed_suggester()
+
+    def _seed_suggester(self):
+        """Index the built-in and catalog vocabulary so typos in common topics are corrected from the start"""
+        for keywords in self.category_keywords.values():
+            for keyword in keywords:
+                self.suggester.add_query(keyword)
+        for phrases in self.category_suggestions.values():
+            for phrase in phrases:
+                self.suggester.add_query(phrase, count=2)
+        catalog = getattr(self.content_fetcher, 'catalog', None)
+        if catalog is not None:
+            for phrase in catalog.vocabulary():
+                self.suggester.add_query(phrase)
+
+    def record_query(self, query):
+        """Count a query users actually searched, making it a suggestion candidate"""
+        self.suggester.add_query(query)
     
     def analyze_search_query(self, query):
         """Analyze search query to extract intent and categories"""
@@ -361,7 +390,9 @@ class DynamicSearchEngine:
     
     def get_search_suggestions(self, partial_query, limit=5):
         """Get search suggestions for autocomplete"""
-        suggestions = []
+        # Known queries first, matched despite typos, then templates around the corrected query
+        suggestions = self.suggester.suggest(partial_query, limit)
+        query = self.suggester.correct(partial_query) or partial_query.strip()
         
         # Popular search templates
         templates = [
@@ -375,26 +406,16 @@ class DynamicSearchEngine:
             "{} reviews"
         ]
         
-        # Category-based suggestions
-        category_suggestions = {
-            'tech': ['python programming', 'web development', 'machine learning', 'javascript'],
-            'entertainment': ['netflix shows', 'latest movies', 'streaming services', 'gaming'],
-            'shopping': ['best deals', 'product reviews', 'electronics', 'gadgets'],
-            'education': ['online courses', 'tutorials', 'certifications', 'learning'],
-            'health': ['fitness tips', 'nutrition', 'workout plans', 'wellness'],
-            'travel': ['destinations', 'travel guides', 'hotels', 'flights']
-        }
-        
         # Generate suggestions based on partial query
-        if len(partial_query) > 2:
+        if len(query) > 2:
             # Template-based suggestions
             for template in templates[:3]:
-                suggestions.append(template.format(partial_query))
+                suggestions.append(template.format(query))
             
             # Category-based suggestions
-            for category, items in category_suggestions.items():
+            for category, items in self.category_suggestions.items():
                 for item in items:
-                    if partial_query.lower() in item or item in partial_query.lower():
-                        suggestions.append(f"{partial_query} {item}")
+                    if query.lower() in item or item in query.lower():
+                        suggestions.append(f"{query} {item}")
         
-        return suggestions[:limit]
+        return list(dict.fromkeys(suggestions))[:limit]
@@ -1,16 +1,120 @@
 from models import RecommendationEngine
-from google_integration import RealTimeRecommendationEngine
-from web_scraper import RealTimeContentFetcher
+from Gsearch_integration import RealTimeRecommendationEngine
+from web import shared_content_fetcher
 from dynamic_search import DynamicSearchEngine
+from serialization import StaticPayload
+from cache import SingleFlight, StaleWhileRevalidateCache
+from metrics import stage
+from deadline import raise_if_expired
+from applog import get_logger
+from candidate_pools import CandidatePools
+from sessions import SessionModel
+from precompute import create_store, is_fresh, run_precompute, user_key, category_key, POPULAR_KEY, PRECOMPUTE_DEPTH
 from datetime import datetime, timedelta
 import json
+import os
+import time
+
+log = get_logger('engine')
+
+# Interactions move database trending; refreshing it more often than this is wasted work under write load
+TRENDING_EXPIRE_INTERVAL = float(os.getenv('TRENDING_EXPIRE_INTERVAL', 5))
+
+def normalize_query(query):
+    """Key form of a search query: case- and whitespace-insensitive"""
+    return ' '.join(query.lower().split())
+
+# Static result lists are encoded once at import time (see serialization.StaticPayload)
+DEFAULT_RECOMMENDATIONS = StaticPayload([
+    {
+        'item_id': 'default_1',
+        'title': 'Getting Started Guide',
+        'category': 'education',
+        'description': 'Complete beginner guide to our platform',
+        'source': 'default'
+    },
+    {
+        'item_id': 'default_2',
+        'title': 'Popular Content',
+        'category': 'entertainment',
+        'description': 'Most popular content on our platform',
+        'source': 'default'
+    },
+    {
+        'item_id': 'default_3',
+        'title': 'Latest Updates',
+        'category': 'technology',
+        'description': 'Recent updates and new features',
+        'source': 'default'
+    },
+    {
+        'item_id': 'default_4',
+        'title': 'Trending Topics',
+        'category': 'general',
+        'description': 'What everyone is talking about',
+        'source': 'default'
+    },
+    {
+        'item_id': 'default_5',
+        'title': 'Recommended for You',
+        'category': 'general',
+        'description': 'Personalized content suggestions',
+        'source': 'default'
+    }
+])
+
+FALLBACK_RECOMMENDATIONS = StaticPayload([
+    {
+        'item_id': 'fallback_1',
+        'title': 'Welcome to Recommendations',
+        'category': 'general',
+        'description': 'Start exploring our recommendation system',
+        'source': 'fallback'
+    }
+])
+
+FALLBACK_TRENDING = StaticPayload([
+    {
+        'item_id': 'trending_fallback_1',
+        'title': 'Latest Technology Trends',
+        'category': 'technology',
+        'description': 'Current trends in technology and innovation',
+        'trend_score': 95,
+        'source': 'fallback'
+    },
+    {
+        'item_id': 'trending_fallback_2',
+        'title': 'Popular Entertainment Content',
+        'category': 'entertainment',
+        'description': 'Trending movies, shows, and entertainment',
+        'trend_score': 90,
+        'source': 'fallback'
+    },
+    {
+        'item_id': 'trending_fallback_3',
+        'title': 'Hot Shopping Deals',
+        'category': 'shopping',
+        'description': 'Best deals and trending products',
+        'trend_score': 85,
+        'source': 'fallback'
+    }
+])
 
 class EnhancedRecommendationEngine:
-    def __init__(self):
-        self.base_engine = RecommendationEngine()
+    def __init__(self, base_engine=None):
+        self.base_engine = base_engine or RecommendationEngine()
         self.search_engine = RealTimeRecommendationEngine(self.base_engine)
-        self.content_fetcher = RealTimeContentFetcher()
-        self.dynamic_search = DynamicSearchEngine()
+        self.content_fetcher = shared_content_fetcher()
+        self.dynamic_search = DynamicSearchEngine(self.content_fetcher)
+        self.precomputed = create_store(self.base_engine)
+        self.candidate_pools = CandidatePools.from_env(self.base_engine)
+        # Item-to-next-item transitions from the order of interactions within sessions
+        self.sessions = SessionModel.from_env()
+        # Identical concurrent search queries share one computation
+        self.inflight = SingleFlight.from_env('SINGLEFLIGHT')
+        # Trending and query-driven results are served stale while they refresh
+        self.results = StaleWhileRevalidateCache.from_env('RESULT_CACHE', inflight=self.inflight)
+        self._trending_expired_at = 0.0
         
     def get_database_status(self):
         return self.base_engine.get_status()
@@ -19,14 +123,38 @@ class EnhancedRecommendationEngine:
         return self.base_engine.add_user(user_id, preferences)
     
     def add_item(self, item_id, title, category, description, features=None):
-        return self.base_engine.add_item(item_id, title, category, description, features)
+        result = self.base_engine.add_item(item_id, title, category, description, features)
+        self.candidate_pools.note_item(item_id, category)
+        return result
     
     def record_interaction(self, user_id, item_id, interaction_type="view", rating=None):
-        return self.base_engine.record_interaction(user_id, item_id, interaction_type, rating)
+        result = self.base_engine.record_interaction(user_id, item_id, interaction_type, rating)
+        self.candidate_pools.note_interaction(item_id)
+        self.sessions.observe(user_id, item_id)
+        try:
+            # The user's history changed, so their precomputed list is stale
+            self.precomputed.delete(user_key(user_id))
+        except Exception as e:
+            log.error("Precomputed invalidation error", user_id=user_id, error=str(e))
+        self._expire_interaction_trending()
+        return result
+    
+    def _expire_interaction_trending(self):
+        """Mark trending built from stored interactions stale, at most once per TRENDING_EXPIRE_INTERVAL"""
+        now = time.monotonic()
+        if now - self._trending_expired_at < TRENDING_EXPIRE_INTERVAL:
+            return
+        self._trending_expired_at = now
+        # Query-driven trending (a search query in the key) comes from web search, which interactions do not move
+        self.results.expire('trending', lambda key: key[4] is None)
     
     def get_standard_recommendations(self, user_id, limit=10):
         """Get standard recommendations from database"""
         try:
+            precomputed = self._get_precomputed_recommendations(user_id, limit)
+            if precomputed:
+                return precomputed
+            
             recommendations = self.base_engine.get_user_recommendations(user_id, limit)
             
             # Add source info to database recommendations
@@ -35,66 +163,115 @@ class EnhancedRecommendationEngine:
             
             # If no database recommendations, provide default content
             if not recommendations:
-                default_items = [
-                    {
-                        'item_id': 'default_1',
-                        'title': 'Getting Started Guide',
-                        'category': 'education',
-                        'description': 'Complete beginner guide to our platform',
-                        'source': 'default'
-                    },
-                    {
-                        'item_id': 'default_2', 
-                        'title': 'Popular Content',
-                        'category': 'entertainment',
-                        'description': 'Most popular content on our platform',
-                        'source': 'default'
-                    },
-                    {
-                        'item_id': 'default_3',
-                        'title': 'Latest Updates',
-                        'category': 'technology',
-                        'description': 'Recent updates and new features',
-                        'source': 'default'
-                    },
-                    {
-                        'item_id': 'default_4',
-                        'title': 'Trending Topics',
-                        'category': 'general',
-                        'description': 'What everyone is talking about',
-                        'source': 'default'
-                    },
-                    {
-                        'item_id': 'default_5',
-                        'title': 'Recommended for You',
-                        'category': 'general',
-                        'description': 'Personalized content suggestions',
-                        'source': 'default'
-                    }
-                ]
-                return default_items[:limit]
+                return DEFAULT_RECOMMENDATIONS.head(limit)
             
             return recommendations
         except Exception as e:
-            print(f"Standard recommendations error: {e}")
+            raise_if_expired(e)
+            log.error("Standard recommendations error", user_id=user_id, error=str(e))
             # Return fallback recommendations even on error
-            return [
-                {
-                    'item_id': 'fallback_1',
-                    'title': 'Welcome to Recommendations',
-                    'category': 'general',
-                    'description': 'Start exploring our recommendation system',
-                    'source': 'fallback'
-                }
+            return FALLBACK_RECOMMENDATIONS
+    
+    def get_session_recommendations(self, user_id, limit=10):
+        """What comes next after the user's current session, topped up with standard recommendations"""
+        try:
+            with stage('session'):
+                scored = self.sessions.next_items(user_id, limit)
+            if not scored:
+                return self.get_standard_recommendations(user_id, limit)
+            
+            items = self.base_engine.get_items_by_ids([item_id for item_id, _ in scored])
+            recommendations = [
+                dict(items[item_id], session_score=round(score, 4), source='session')
+                for item_id, score in scored if item_id in items
             ]
+            if len(recommendations) < limit:
+                chosen = {rec['item_id'] for rec in recommendations}
+                chosen.update(self.sessions.current_session(user_id))
+                for rec in self.get_standard_recommendations(user_id, limit + len(chosen)):
+                    if len(recommendations) >= limit:
+                        break
+                    if rec.get('item_id') not in chosen:
+                        recommendations.append(rec)
+            return recommendations
+        except Exception as e:
+            raise_if_expired(e)
+            log.error("Session recommendations error", user_id=user_id, error=str(e))
+            return self.get_standard_recommendations(user_id, limit)
+    
+    def _get_precomputed_recommendations(self, user_id, limit):
+        """Serve from the offline top-N tables or candidate pools; None means use the live path"""
+        try:
+            entry = self.precomputed.get(user_key(user_id))
+            if is_fresh(entry, limit):
+                return [dict(rec, source='precomputed') for rec in entry['recommendations'][:limit]]
+            if entry is not None or self.base_engine.has_interactions(user_id):
+                return None
+            return self._get_cold_start_recommendations(user_id, limit)
+        except Exception as e:
+            raise_if_expired(e)
+            log.error("Precomputed recommendations error", user_id=user_id, error=str(e))
+        return None
+    
+    def get_pooled_recommendations(self, user_id, limit=10):
+        """Candidate-pool items for the user's top search category; [] until the pools are built.
+
+        Never touches storage, so it is safe to serve when the full path is out of budget.
+        """
+        if not self.candidate_pools.ready:
+            return []
+        return self.candidate_pools.get(self._top_search_category(user_id), limit)
+    
+    def _top_search_category(self, user_id):
+        profile = self.search_engine.user_profiles.get(user_id)
+        if profile:
+            for category, _ in profile['search_intent'].get('top_categories', [])[:1]:
+                return category
+        return None
+    
+    def _get_cold_start_recommendations(self, user_id, limit):
+        """Popular items in the user's top search category, else overall"""
+        category = self._top_search_category(user_id)
+        with stage('candidate_pool'):
+            pooled = self.candidate_pools.get(category, limit)
+        if pooled:
+            return pooled
+        
+        # Empty catalog in this process: the offline tables may still have entries
+        keys = ([category_key(category)] if category else []) + [POPULAR_KEY]
+        for key in keys:
+            entry = self.precomputed.get(key)
+            if is_fresh(entry, limit) and entry['recommendations']:
+                return [dict(rec, source='popular') for rec in entry['recommendations'][:limit]]
+        return None
+    
+    def run_precompute(self, limit=PRECOMPUTE_DEPTH, active_days=30):
+        """Rebuild the offline top-N tables and return the job report"""
+        return run_precompute(self, self.precomputed, limit, active_days)
+    
+    def iter_recommendations_bulk(self, user_ids, limit=10):
+        """Yield (user_id, recommendations) for many users using shared queries and scoring"""
+        for user_id, recommendations in self.base_engine.iter_user_recommendations_bulk(list(user_ids), limit):
+            if not recommendations:
+                yield user_id, DEFAULT_RECOMMENDATIONS.head(limit)
+                continue
+            for rec in recommendations:
+                rec['source'] = 'database'
+            yield user_id, recommendations
+    
+    def get_recommendations_bulk(self, user_ids, limit=10):
+        """Top-N recommendations for many users, keyed by user_id"""
+        return dict(self.iter_recommendations_bulk(user_ids, limit))
     
     def get_search_powered_recommendations(self, user_id, limit=10, search_query=None):
         """Get recommendations powered by search history and real-time content"""
         try:
             # If search query provided, use dynamic search
             if search_query:
-                search_analysis = self.dynamic_search.analyze_search_query(search_query)
-                return self.dynamic_search.get_dynamic_recommendations(search_analysis, limit)
+                return self.results.get(
+                    ('search_recommendations', normalize_query(search_query), limit),
+                    self._dynamic_recommendations, search_query, limit
+                )
             
             # Get user's search profile
             if user_id in self.search_engine.user_profiles:
@@ -106,16 +283,22 @@ class EnhancedRecommendationEngine:
                 categories = [cat[0] for cat in search_intent.get('top_categories', [])]
                 
                 # Get personalized real-time content
-                personalized_content = self.content_fetcher.get_personalized_content(
-                    keywords, categories, limit//2
-                )
+                with stage('content_fetch'):
+                    personalized_content = self.content_fetcher.get_personalized_content(
+                        keywords, categories, limit//2
+                    )
                 
-                # Get database recommendations
+                # Get database recommendations (pooled by search category for users without history)
                 try:
-                    db_recs = self.base_engine.get_user_recommendations(user_id, limit//2)
-                    for rec in db_recs:
-                        rec['source'] = 'database'
-                except:
+                    if self.base_engine.has_interactions(user_id):
+                        db_recs = self.base_engine.get_user_recommendations(user_id, limit//2)
+                        for rec in db_recs:
+                            rec['source'] = 'database'
+                    else:
+                        with stage('candidate_pool'):
+                            db_recs = self.candidate_pools.get(categories[0] if categories else None, limit//2)
+                except Exception as e:
+                    raise_if_expired(e)
                     db_recs = []
                 
                 # Combine recommendations
@@ -130,111 +313,110 @@ class EnhancedRecommendationEngine:
                 return all_recommendations[:limit] if all_recommendations else self.get_standard_recommendations(user_id, limit)
             else:
                 # No search profile, generate AI-powered content anyway
-                ai_content = self.content_fetcher.get_personalized_content(
-                    ['trending', 'popular', 'recommended'], 
-                    ['technology', 'entertainment'], 
-                    limit
-                )
+                with stage('content_fetch'):
+                    ai_content = self.content_fetcher.get_personalized_content(
+                        ['trending', 'popular', 'recommended'], 
+                        ['technology', 'entertainment'], 
+                        limit
+                    )
                 return ai_content if ai_content else self.get_standard_recommendations(user_id, limit)
                 
         except Exception as e:
-            print(f"Search-powered recommendations error: {e}")
+            raise_if_expired(e)
+            log.error("Search-powered recommendations error", user_id=user_id, error=str(e))
             return self.get_standard_recommendations(user_id, limit)
     
     def get_trending_content(self, hours=24, limit=10, category="", search_query=None):
         """Get real-time trending content"""
         try:
-            # If search query provided, use dynamic search
-            if search_query:
-                search_analysis = self.dynamic_search.analyze_search_query(search_query)
-                return self.dynamic_search.get_dynamic_trending(search_analysis, hours, limit)
-            
-            # Get trending content from web scraper
-            trending_items = self.content_fetcher.search_trending_content(category, hours)
-            
-            # Get trending from database if available
-            try:
-                db_trending = self.base_engine.get_trending_items(hours, limit//2)
-                
-                # Format database trending to match expected structure
-                formatted_db_trending = []
-                for item in db_trending:
-                    if isinstance(item, dict):
-                        if 'item_details' in item:
-                            formatted_item = item['item_details'].copy()
-                            formatted_item['trend_score'] = item.get('trend_score', 0)
-                            formatted_item['source'] = 'database'
-                            formatted_db_trending.append(formatted_item)
-                        else:
-                            # Handle direct item format
-                            item['source'] = 'database'
-                            formatted_db_trending.append(item)
-            except Exception as db_error:
-                print(f"Database trending error: {db_error}")
-                formatted_db_trending = []
-            
-            # Combine trending sources
-            all_trending = trending_items + formatted_db_trending
-            
-            # Ensure all items have required fields
-            for item in all_trending:
-                if 'trend_score' not in item:
-                    item['trend_score'] = 50
-                if 'source' not in item:
-                    item['source'] = 'real-time'
-            
-            # Sort by trend score
-            all_trending.sort(key=lambda x: x.get('trend_score', 0), reverse=True)
-            
-            return all_trending[:limit] if all_trending else self._get_fallback_trending(limit)
-            
+            key = ('trending', hours, limit, category, normalize_query(search_query) if search_query else None)
+            return self.results.get(key, self._compute_trending_content, hours, limit, category, search_query)
         except Exception as e:
-            print(f"Trending content error: {e}")
+            raise_if_expired(e)
+            log.error("Trending content error", error=str(e))
             return self._get_fallback_trending(limit)
     
+    def _compute_trending_content(self, hours, limit, category, search_query):
+        # If search query provided, use dynamic search
+        if search_query:
+            return self._dynamic_trending(search_query, hours, limit)
+        
+        # Get trending content from web scraper
+        with stage('content_fetch'):
+            trending_items = self.content_fetcher.search_trending_content(category, hours)
+        
+        # Get trending from database if available
+        try:
+            db_trending = self.base_engine.get_trending_items(hours, limit//2)
+            
+            # Format database trending to match expected structure
+            formatted_db_trending = []
+            for item in db_trending:
+                if isinstance(item, dict):
+                    if 'item_details' in item:
+                        formatted_item = item['item_details'].copy()
+                        formatted_item['trend_score'] = item.get('trend_score', 0)
+                        formatted_item['source'] = 'database'
+                        formatted_db_trending.append(formatted_item)
+                    else:
+                        # Handle direct item format
+                        item['source'] = 'database'
+                        formatted_db_trending.append(item)
+        except Exception as db_error:
+            log.error("Database trending error", error=str(db_error))
+            formatted_db_trending = []
+        
+        # Combine trending sources
+        all_trending = trending_items + formatted_db_trending
+        
+        # Ensure all items have required fields
+        for item in all_trending:
+            if 'trend_score' not in item:
+                item['trend_score'] = 50
+            if 'source' not in item:
+                item['source'] = 'real-time'
+        
+        # Sort by trend score
+        all_trending.sort(key=lambda x: x.get('trend_score', 0), reverse=True)
+        
+        return all_trending[:limit] if all_trending else self._get_fallback_trending(limit)
+    
+    def _dynamic_recommendations(self, search_query, limit):
+        with stage('dynamic_search'):
+            search_analysis = self.dynamic_search.analyze_search_query(search_query)
+            return self.dynamic_search.get_dynamic_recommendations(search_analysis, limit)
+    
+    def _dynamic_trending(self, search_query, hours, limit):
+        with stage('dynamic_search'):
+            search_analysis = self.dynamic_search.analyze_search_query(search_query)
+            return self.dynamic_search.get_dynamic_trending(search_analysis, hours, limit)
+    
     def _get_fallback_trending(self, limit=10):
         """Fallback trending content when all else fails"""
-        return [
-            {
-                'item_id': 'trending_fallback_1',
-                'title': 'Latest Technology Trends',
-                'category': 'technology',
-                'description': 'Current trends in technology and innovation',
-                'trend_score': 95,
-                'source': 'fallback'
-            },
-            {
-                'item_id': 'trending_fallback_2',
-                'title': 'Popular Entertainment Content',
-                'category': 'entertainment',
-                'description': 'Trending movies, shows, and entertainment',
-                'trend_score': 90,
-                'source': 'fallback'
-            },
-            {
-                'item_id': 'trending_fallback_3',
-                'title': 'Hot Shopping Deals',
-                'category': 'shopping',
-                'description': 'Best deals and trending products',
-                'trend_score': 85,
-                'source': 'fallback'
-            }
-        ][:limit]
+        return FALLBACK_TRENDING.head(limit)
     
     def update_search_profile(self, user_id, search_history):
         """Update user's search profile"""
         try:
-            return self.search_engine.update_user_profile(user_id, search_history)
+            search_intent = self.search_engine.update_user_profile(user_id, search_history)
+            for query in search_intent.get('recent_searches', []):
+                self.dynamic_search.record_query(query)
+            return search_intent
         except Exception as e:
-            print(f"Search profile update error: {e}")
+            log.error("Search profile update error", user_id=user_id, error=str(e))
             return {'error': str(e)}
     
+    def record_search_query(self, query):
+        """Count a query a user searched; routes call this once per request, cache hits included"""
+        self.dynamic_search.record_query(query)
+    
     def get_search_suggestions(self, partial_query, limit=5):
         """Get dynamic search suggestions"""
         try:
-            return self.dynamic_search.get_search_suggestions(partial_query, limit)
+            with stage('dynamic_search'):
+                return self.dynamic_search.get_search_suggestions(partial_query, limit)
         except Exception as e:
-            print(f"Search suggestions error: {e}")
+            log.error("Search suggestions error", error=str(e))
             return []
     
     def get_status_info(self):
@@ -0,0 +1,77 @@
+import math
+import os
+import re
+import zlib
+from functools import lru_cache
+
+# Both sides of every dot product must agree on the width, so it is fixed per deployment, not per process
+FEATURE_HASH_BITS = int(os.getenv('FEATURE_HASH_BITS', 18))
+CATEGORY_WEIGHT = float(os.getenv('FEATURE_CATEGORY_WEIGHT', 2.0))
+
+_MASK = (1 << FEATURE_HASH_BITS) - 1
+_WORD = re.compile(r'[a-z0-9]+')
+
+@lru_cache(maxsize=65536)
+def _slot(feature):
+    """(index, sign) of a feature string; crc32 is the same in every process, unlike hash()"""
+    h = zlib.crc32(feature.encode())
+    return h & _MASK, -1.0 if h & 0x80000000 else 1.0
+
+def text_features(text):
+    """Unigram and bigram feature strings of a text"""
+    words = _WORD.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def category_feature(category):
+    return f"category={category.lower()}"
+
+def hash_features(features, weight=1.0, into=None):
+    """Add `features` to the sparse vector `into` ({index: value}), created if None"""
+    vector = {} if into is None else into
+    for feature in features:
+        index, sign = _slot(feature)
+        vector[index] = vector.get(index, 0.0) + sign * weight
+    return vector
+
+def merge(*vectors):
+    """Sum of sparse vectors, e.g. partial profiles built by different workers"""
+    total = {}
+    for vector in vectors:
+        for index, value in vector.items():
+            total[index] = total.get(index, 0.0) + value
+    return total
+
+def normalized(vector):
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {index: value / norm for index, value in vector.items()}
+
+@lru_cache(maxsize=16384)
+def _item_vector(title, description, category):
+    vector = hash_features(text_features(f"{title} {description}"))
+    if category:
+        hash_features([category_feature(category)], CATEGORY_WEIGHT, into=vector)
+    return tuple(normalized(vector).items())
+
+def item_vector(item):
+    """Unit-length hashed features of an item's title, description and category, as (index, value) pairs"""
+    return _item_vector(item.get('title') or '', item.get('description') or '', item.get('category') or '')
+
+def profile_vector(search_intent):
+    """Unnormalized hashed features of a search profile; profiles merge by addition"""
+    vector = hash_features(text_features(search_intent.get('keywords', '')))
+    for category, count in search_intent.get('top_categories', []):
+        hash_features([category_feature(category)], CATEGORY_WEIGHT * count, into=vector)
+    return vector
+
+def score_batch(profile, items):
+    """Cosine similarity of a profile to each item: the sparse matrix-vector product of items and profile.
+
+    Costs one lookup per nonzero item feature, whatever the vocabulary size.
+    """
+    unit = normalized(profile)
+    if not unit:
+        return [0.0] * len(items)
+    get = unit.get
+    return [sum(value * get(index, 0.0) for index, value in item_vector(item)) for item in items]
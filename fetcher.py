@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+import aiohttp
+from bs4 import BeautifulSoup
+from cache import TTLCache
+from metrics import registry
+from applog import get_logger
+
+log = get_logger('fetcher')
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+CONTENT_FETCH_CACHE_DIR = os.getenv(
+    'CONTENT_FETCH_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.content_cache')
+)
+
+FETCHES = registry.counter(
+    'content_fetches_total',
+    'Page fetches by outcome',
+    labels=('outcome',)
+)
+
+FETCH_LATENCY = registry.histogram(
+    'content_fetch_duration_seconds',
+    'Time from scheduling a page fetch to its parsed result'
+)
+
+def parse_page(url, html):
+    """Title and description of an HTML page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.get_text(strip=True) if soup.title else None
+    description = None
+    for attrs in ({'name': 'description'}, {'property': 'og:description'}):
+        tag = soup.find('meta', attrs=attrs)
+        if tag and tag.get('content'):
+            description = tag['content'].strip()
+            break
+    return {'url': url, 'title': title, 'description': description}
+
+class DiskCache:
+    """HTTP response cache on disk: one metadata file and one body file per URL.
+
+    Metadata holds the validators (ETag, Last-Modified) and when the entry
+    was last confirmed, so an expired entry can be revalidated with a
+    conditional request instead of downloaded again. Files are written to a
+    temporary name and renamed, so readers never see half an entry.
+    """
+    def __init__(self, directory=CONTENT_FETCH_CACHE_DIR):
+        self.directory = directory
+
+    def _paths(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, digest[:2], digest)
+        return base + '.json', base + '.body'
+
+    def load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, url, meta, body=None):
+        """Write `meta`, and `body` when it changed (None keeps the stored body)"""
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        if body is not None:
+            _write_atomic(body_path, body)
+        _write_atomic(meta_path, json.dumps(meta).encode())
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+class _Host:
+    """Per-host concurrency slots and minimum spacing between request starts"""
+    def __init__(self, concurrency, rate):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_start = 0
+
+    async def __aenter__(self):
+        await self.slots.acquire()
+        now = time.monotonic()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.slots.release()
+
+class ContentFetcher:
+    """Pooled asynchronous page fetcher with an on-disk conditional HTTP cache.
+
+    An event loop on a background thread owns one aiohttp session, so
+    connections are reused across all pages. Each host gets at most
+    `per_host` requests in flight and at most `rate` request starts per
+    second. Bodies are cached on disk: entries younger than `fresh_for`
+    are served without a request, older ones are revalidated with
+    If-None-Match / If-Modified-Since, and a failed request falls back to
+    whatever body is cached. A URL whose fetch failed with nothing cached
+    (an error, timeout or non-2xx status) is not requested again for
+    `error_ttl` seconds. HTML parsing runs in a thread pool so the
+    loop only ever waits on sockets.
+
+    Callers on request threads use peek() and prefetch(): they never wait
+    longer than the deadline they pass, and fetches that miss it keep
+    running and land in the parsed-page cache for the next caller.
+    """
+    def __init__(self, concurrency=20, per_host=2, rate=1.0, timeout=5.0, fresh_for=3600,
+                 max_bytes=1 << 20, parse_workers=2, cache_dir=CONTENT_FETCH_CACHE_DIR, max_pages=5000,
+                 error_ttl=60):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.rate = rate
+        self.timeout = timeout
+        self.fresh_for = fresh_for
+        self.max_bytes = max_bytes
+        self.disk = DiskCache(cache_dir)
+        self.pages = TTLCache(ttl=fresh_for, max_entries=max_pages)
+        # URLs whose last fetch failed, so dead links are not refetched for every request
+        self.failures = TTLCache(ttl=error_ttl, max_entries=max_pages)
+        self._parse_pool = ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix="content-parse")
+        self._hosts = {}
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            concurrency=int(os.getenv('CONTENT_FETCH_CONCURRENCY', 20)),
+            per_host=int(os.getenv('CONTENT_FETCH_PER_HOST', 2)),
+            rate=float(os.getenv('CONTENT_FETCH_HOST_RATE', 1.0)),
+            timeout=float(os.getenv('CONTENT_FETCH_TIMEOUT', 5.0)),
+            fresh_for=float(os.getenv('CONTENT_FETCH_FRESH_FOR', 3600)),
+            max_bytes=int(os.getenv('CONTENT_FETCH_MAX_BYTES', 1 << 20)),
+            error_ttl=float(os.getenv('CONTENT_FETCH_ERROR_TTL', 60))
+        )
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._start_lock:
+            if self.running:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="content-fetcher")
+            self._thread.start()
+
+    def stop(self):
+        with self._start_lock:
+            if not self.running:
+                return
+            if self._session is not None:
+                asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=1)
+                self._session = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1)
+            self._loop.close()
+            self._thread = None
+            self._loop = None
+            self._hosts = {}
+
+    def peek(self, url):
+        """Parsed page for `url` if one is already cached, else None"""
+        return self.pages.get(url)
+
+    def submit(self, url):
+        """Schedule a fetch of `url`; returns a Future of the parsed page (or None on failure).
+
+        Concurrent submits of the same URL share one fetch.
+        """
+        self.start()
+        with self._pending_lock:
+            future = self._pending.get(url)
+            if future is not None:
+                return future
+            future = self._pending[url] = asyncio.run_coroutine_threadsafe(self._fetch_page(url), self._loop)
+        # Outside the lock: the callback runs inline if the fetch already finished
+        future.add_done_callback(lambda _: self._forget(url))
+        return future
+
+    def prefetch(self, urls, deadline=0.0):
+        """Parsed pages for `urls` available within `deadline` seconds.
+
+        Cached pages are returned at once; the rest are fetched, and those
+        that finish in time are included. Late fetches keep running.
+        """
+        found = {}
+        futures = {}
+        for url in dict.fromkeys(urls):
+            page = self.peek(url)
+            if page is not None:
+                found[url] = page
+            elif self.failures.get(url) is None:
+                futures[url] = self.submit(url)
+        give_up_at = time.monotonic() + deadline
+        for url, future in futures.items():
+            try:
+                page = future.result(timeout=max(0.0, give_up_at - time.monotonic()))
+            except FutureTimeout:
+                continue
+            if page is not None:
+                found[url] = page
+        return found
+
+    def fetch(self, url, timeout=None):
+        """Blocking fetch of one page, for scripts and maintenance tasks"""
+        return self.submit(url).result(timeout=timeout)
+
+    def _forget(self, url):
+        with self._pending_lock:
+            self._pending.pop(url, None)
+
+    def _host(self, url):
+        host = urlsplit(url).netloc.lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.per_host, self.rate)
+        return state
+
+    async def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self._session
+
+    async def _fetch_page(self, url):
+        if self.failures.get(url) is not None:
+            FETCHES.labels('failed_recently').inc()
+            return None
+        started = time.perf_counter()
+        try:
+            body = await self._fetch_body(url)
+            if body is None:
+                return None
+            page = await self._loop.run_in_executor(self._parse_pool, parse_page, url, body)
+            self.pages.set(url, page)
+            return page
+        except Exception as e:
+            self.failures.set(url, True)
+            FETCHES.labels('timeout' if isinstance(e, asyncio.TimeoutError) else 'error').inc()
+            log.warning("Content fetch error", url=url, error=str(e) or type(e).__name__)
+            return None
+        finally:
+            FETCH_LATENCY.observe(time.perf_counter() - started)
+
+    async def _fetch_body(self, url):
+        meta, body = await self._loop.run_in_executor(self._parse_pool, self.disk.load, url)
+        if meta is not None and time.time() - meta.get('checked_at', 0) < self.fresh_for:
+            FETCHES.labels('disk').inc()
+            return body
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        session = await self._get_session()
+        try:
+            async with self._host(url):
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and meta is not None:
+                        meta['checked_at'] = time.time()
+                        await self._loop.run_in_executor(self._parse_pool, self.disk.store, url, meta)
+                        FETCHES.labels('not_modified').inc()
+                        return body
+                    response.raise_for_status()
+                    fresh = await response.content.read(self.max_bytes)
+                    fresh_meta = {
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'checked_at': time.time()
+                    }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if body is None:
+                raise
+            # Serve the stale copy rather than nothing
+            FETCHES.labels('stale').inc()
+            log.warning("Content fetch failed, serving cached copy", url=url, error=str(e) or type(e).__name__)
+            return body
+
+        await self._loop.run_in_executor(self._parse_pool, self.disk.store, url, fresh_meta, fresh)
+        FETCHES.labels('fetched').inc()
+        return fresh
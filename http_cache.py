@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import os
+import secrets
+import time
+import zlib
+from functools import lru_cache
+from metrics import registry
+
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 5))
+# Browser/proxy freshness for shared read endpoints; personalized ones are always revalidated
+HTTP_MAX_AGE = int(os.getenv('HTTP_MAX_AGE', 5))
+
+NOT_MODIFIED = registry.counter(
+    'http_not_modified_total',
+    'Conditional GETs answered with 304 Not Modified',
+    labels=('route',)
+)
+
+COMPRESSED_BYTES = registry.counter(
+    'http_compressed_bytes_total',
+    'Response body bytes before and after compression',
+    labels=('stage',)
+)
+
+# Encoded bodies are shared objects (response cache, stored pages, static payloads);
+# bytes cache their own hash, so repeat lookups for the same body cost one dict probe.
+@lru_cache(maxsize=1024)
+def etag_for(body):
+    """Content-hash ETag value for an encoded body"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+# Version ETags are only comparable within the process that issued them
+_PROCESS_NONCE = secrets.token_hex(8)
+
+def version_etag(key, version, window):
+    """ETag for the response under `key` at a cache `version`, known before any result is computed.
+
+    It also rolls over every `window` seconds, so results that change
+    without an invalidation (web search, other users' activity) are
+    revalidated at least that often.
+    """
+    state = (_PROCESS_NONCE, key, version, int(time.time() // window))
+    return hashlib.blake2b(repr(state).encode(), digest_size=12).hexdigest()
+
+def cache_control(public):
+    return f'public, max-age={HTTP_MAX_AGE}' if public else 'private, no-cache'
+
+def matches(request, etag, route):
+    """True if the client's cached copy carries `etag`, so a 304 can be sent without computing the body"""
+    if request.if_none_match.contains_weak(etag):
+        NOT_MODIFIED.labels(route).inc()
+        return True
+    return False
+
+@lru_cache(maxsize=512)
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0)
+    return zlib.compress(body, COMPRESSION_LEVEL)
+
+def negotiate_encoding(accept_encodings):
+    """Best of gzip/deflate the client accepts, or None"""
+    return accept_encodings.best_match(('gzip', 'deflate'))
+
+def finalize(response, request, route, public):
+    """Add ETag (a content hash unless a version ETag is set) and Cache-Control, answer 304
+    when the client's copy is current, else maybe compress"""
+    body = response.get_data()
+    if 'ETag' not in response.headers:
+        response.set_etag(etag_for(body), weak=True)
+    response.headers['Cache-Control'] = cache_control(public)
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if response.status_code == 304:
+        NOT_MODIFIED.labels(route).inc()
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None or len(body) < COMPRESSION_MIN_BYTES or 'Content-Encoding' in response.headers:
+        return response
+    compressed = compress(body, encoding)
+    COMPRESSED_BYTES.labels('in').inc(len(body))
+    COMPRESSED_BYTES.labels('out').inc(len(compressed))
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,318 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from applog import get_logger
+
+log = get_logger('importer')
+
+KINDS = ('users', 'items', 'interactions')
+LIST_SEPARATOR = '|'  # preferences/features inside one CSV cell
+MAX_ERROR_SAMPLES = 20
+
+class InvalidRecord(ValueError):
+    """A record that cannot be imported; it is counted and skipped"""
+
+class ImportAborted(Exception):
+    """Too many invalid records; the checkpoint keeps everything written so far"""
+
+def read_records(path, skip=0):
+    """Yield raw records of a CSV (header row) or JSON-lines file, after the first `skip`.
+
+    JSON lines are yielded unparsed, so skipping them on resume costs no decoding.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for index, row in enumerate(csv.DictReader(f)):
+                if index >= skip:
+                    yield row
+        return
+    with open(path, encoding='utf-8') as f:
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if index >= skip:
+                yield line
+            index += 1
+
+def _text(record, field, required=True):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise InvalidRecord(f"missing {field}")
+        return None
+    if isinstance(value, (dict, list)):
+        raise InvalidRecord(f"{field} must be a string")
+    return str(value).strip()
+
+def _list(record, field):
+    value = record.get(field)
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(LIST_SEPARATOR) if part.strip()]
+    if isinstance(value, list):
+        return value
+    raise InvalidRecord(f"{field} must be a list")
+
+def _rating(record):
+    value = record.get('rating')
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"invalid rating {value!r}")
+
+def _timestamp(record, now):
+    """Naive UTC datetime from an ISO string or epoch seconds; `now` when absent"""
+    value = record.get('timestamp')
+    if value is None or value == '':
+        return now
+    try:
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+            return datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None)
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise InvalidRecord(f"invalid timestamp {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def user_document(record, now):
+    return {
+        "user_id": _text(record, 'user_id'),
+        "preferences": _list(record, 'preferences'),
+        "created_at": now
+    }
+
+def item_document(record, now):
+    return {
+        "item_id": _text(record, 'item_id'),
+        "title": _text(record, 'title'),
+        "category": _text(record, 'category'),
+        "description": _text(record, 'description', required=False) or '',
+        "features": _list(record, 'features'),
+        "created_at": now
+    }
+
+def interaction_document(record, now):
+    return {
+        "user_id": _text(record, 'user_id'),
+        "item_id": _text(record, 'item_id'),
+        "interaction_type": _text(record, 'interaction_type', required=False) or 'view',
+        "rating": _rating(record),
+        "timestamp": _timestamp(record, now)
+    }
+
+def interaction_id(document):
+    """Content key of an imported interaction, so the same event from any file, or imported twice, is stored once"""
+    key = '\x1f'.join((document["user_id"], document["item_id"], document["interaction_type"],
+                        document["timestamp"].isoformat()))
+    return f"import:{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"
+
+BUILDERS = {'users': user_document, 'items': item_document, 'interactions': interaction_document}
+
+def file_fingerprint(path):
+    """Identifies a file's content across runs: its size and first MiB"""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(os.path.getsize(path)).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(1 << 20))
+    return digest.hexdigest()
+
+class Checkpoint:
+    """Records imported per file, saved atomically after every batch that completes in order"""
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f)
+
+    def position(self, fingerprint):
+        return self.files.get(fingerprint, {}).get('records', 0)
+
+    def save(self, fingerprint, path, kind, records):
+        self.files[fingerprint] = {"path": path, "kind": kind, "records": records}
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.files, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class Importer:
+    """Streams users, items and interactions from files into storage in bulk batches.
+
+    The calling thread reads and validates records while up to `writers`
+    threads run bulk writes, with at most two batches per writer queued.
+    Batches can finish out of order, so the checkpoint only advances over
+    the prefix of batches that have all been written; a rerun after a
+    failure starts from there. Users and items are upserts that keep their
+    original created_at, and interactions get an `_id` from their user,
+    item, type and timestamp (undated ones from the file fingerprint and
+    record number), so batches written twice by a resume, or events
+    exported again in another file, leave no duplicates.
+    """
+    def __init__(self, base_engine, batch_size=5000, writers=4, checkpoint=None,
+                 max_errors=1000, progress_seconds=10):
+        self.base_engine = base_engine
+        self.batch_size = batch_size
+        # In-memory lists and dicts are not safe to bulk-write from several threads at once
+        self.writers = 1 if base_engine.use_memory else writers
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.max_errors = max_errors
+        self.progress_seconds = progress_seconds
+        self.rejected = 0
+
+    def _write(self, kind, documents):
+        if kind == 'users':
+            return self.base_engine.bulk_upsert_users(documents)
+        if kind == 'items':
+            return self.base_engine.bulk_upsert_items(documents)
+        return self.base_engine.bulk_insert_interactions(documents)
+
+    def run(self, kind, path):
+        """Import one file and return its report"""
+        build = BUILDERS[kind]
+        fingerprint = file_fingerprint(path)
+        start = self.checkpoint.position(fingerprint)
+        if start:
+            log.info("Resuming import", kind=kind, path=path, records=start)
+
+        started = time.perf_counter()
+        last_progress = started
+        index = start
+        committed = start
+        written = 0
+        rejected = 0
+        errors = []
+        batch = []
+        pending = deque()  # (records up to and including this batch, future), in file order
+
+        def settle(wait_all=False):
+            nonlocal committed, written
+            while pending and (wait_all or pending[0][1].done() or len(pending) >= self.writers * 2):
+                end, future = pending[0]
+                written += future.result()
+                pending.popleft()
+                committed = end
+                self.checkpoint.save(fingerprint, path, kind, committed)
+
+        with ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix=f'import-{kind}') as executor:
+            try:
+                for raw in read_records(path, start):
+                    now = datetime.utcnow()
+                    try:
+                        record = json.loads(raw) if isinstance(raw, str) else raw
+                        if not isinstance(record, dict):
+                            raise InvalidRecord("record must be an object")
+                        document = build(record, now)
+                    except (InvalidRecord, ValueError) as e:
+                        rejected += 1
+                        if len(errors) < MAX_ERROR_SAMPLES:
+                            errors.append({"record": index, "error": str(e)})
+                        if self.rejected + rejected > self.max_errors:
+                            raise ImportAborted(f"more than {self.max_errors} invalid records")
+                    else:
+                        if kind == 'interactions':
+                            # Undated records are timestamped at import time, so only their position identifies them
+                            dated = record.get('timestamp') not in (None, '')
+                            document["_id"] = interaction_id(document) if dated else f"import:{fingerprint}:{index}"
+                        batch.append(document)
+                    index += 1
+
+                    if len(batch) >= self.batch_size:
+                        pending.append((index, executor.submit(self._write, kind, batch)))
+                        batch = []
+                        settle()
+                        if time.perf_counter() - last_progress >= self.progress_seconds:
+                            last_progress = time.perf_counter()
+                            log.info("Import progress", kind=kind, records=index,
+                                     records_per_second=round((index - start) / (last_progress - started), 1))
+                if batch:
+                    pending.append((index, executor.submit(self._write, kind, batch)))
+                # Invalid records at the end are past the last batch; nothing is left to redo for them
+                settle(wait_all=True)
+                committed = index
+                self.checkpoint.save(fingerprint, path, kind, committed)
+            except BaseException:
+                # Keep whatever finished in order, so a rerun resumes as late as possible
+                for _, future in pending:
+                    future.cancel()
+                for end, future in pending:
+                    if future.cancelled() or future.exception() is not None:
+                        break
+                    self.checkpoint.save(fingerprint, path, kind, end)
+                raise
+            finally:
+                self.rejected += rejected
+
+        elapsed = time.perf_counter() - started
+        return {
+            "kind": kind,
+            "path": path,
+            "resumed_from": start,
+            "records_read": index - start,
+            "written": written,
+            "rejected": rejected,
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "records_per_second": round((index - start) / elapsed, 1) if elapsed > 0 else None
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users, items and interactions from JSON-lines or CSV files")
+    parser.add_argument('--users', action='append', default=[], help="users file (repeatable)")
+    parser.add_argument('--items', action='append', default=[], help="items file (repeatable)")
+    parser.add_argument('--interactions', action='append', default=[], help="interactions file (repeatable)")
+    parser.add_argument('--batch-size', type=int, default=5000, help="records per bulk write")
+    parser.add_argument('--writers', type=int, default=4, help="bulk writes in flight while parsing continues")
+    parser.add_argument('--checkpoint', default='.import_checkpoint.json', help="progress file used to resume after a failure")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint and import from the start")
+    parser.add_argument('--max-errors', type=int, default=1000, help="abort after this many invalid records")
+    parser.add_argument('--skip-rebuild', action='store_true', help="do not rebuild hourly buckets and seen filters after importing interactions")
+    args = parser.parse_args()
+    if not (args.users or args.items or args.interactions):
+        parser.error("nothing to import: pass --users, --items and/or --interactions")
+
+    from models import RecommendationEngine
+    base_engine = RecommendationEngine()
+    if base_engine.use_memory:
+        parser.exit(1, "import needs MongoDB; in-memory storage does not outlive this command\n")
+
+    if args.restart:
+        Checkpoint(args.checkpoint).remove()
+    checkpoint = Checkpoint(args.checkpoint)
+    importer = Importer(base_engine, args.batch_size, args.writers, checkpoint, args.max_errors)
+    started = time.perf_counter()
+    files = []
+    try:
+        for kind in KINDS:
+            for path in getattr(args, kind):
+                files.append(importer.run(kind, path))
+    except ImportAborted as e:
+        parser.exit(1, f"import aborted: {e}; fix them or raise --max-errors, then rerun to resume from {args.checkpoint}\n")
+
+    report = {"files": files}
+    if args.interactions and not args.skip_rebuild:
+        # Derived per-event state was skipped by the bulk path; both rebuilds are idempotent
+        report["buckets_written"] = base_engine.backfill_interaction_buckets()
+        report["seen_filters_written"] = base_engine.rebuild_seen_filters()
+    checkpoint.remove()
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+import time
+
+def cmd_backfill_buckets(base_engine, args):
+    started = time.perf_counter()
+    written = base_engine.backfill_interaction_buckets(args.hours, args.batch_size)
+    return {
+        "buckets_written": written,
+        "hours": args.hours,
+        "elapsed_seconds": round(time.perf_counter() - started, 3)
+    }
+
+def cmd_rollup(base_engine, args):
+    from retention import RetentionWorker, RETENTION_DAYS
+    worker = RetentionWorker(
+        base_engine,
+        retention_days=RETENTION_DAYS if args.days is None else args.days,
+        batch_size=args.batch_size
+    )
+    return worker.run_once(args.max_batches)
+
+def cmd_rebuild_seen(base_engine, args):
+    started = time.perf_counter()
+    users = base_engine.rebuild_seen_filters(args.batch_size)
+    return {
+        "users_written": users,
+        "elapsed_seconds": round(time.perf_counter() - started, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage maintenance tasks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill = subparsers.add_parser('backfill-buckets', help="rebuild hourly interaction buckets from raw interactions")
+    backfill.add_argument('--hours', type=int, default=None, help="only rebuild the last N hours (default: all history)")
+    backfill.add_argument('--batch-size', type=int, default=1000, help="buckets per bulk write")
+    backfill.set_defaults(handler=cmd_backfill_buckets)
+
+    rollup = subparsers.add_parser('rollup', help="fold raw interactions past the retention window into daily aggregates")
+    rollup.add_argument('--days', type=float, default=None, help="retention window (default: INTERACTION_RETENTION_DAYS)")
+    rollup.add_argument('--batch-size', type=int, default=1000, help="interactions folded per batch")
+    rollup.add_argument('--max-batches', type=int, default=None, help="stop after N batches (default: drain the backlog)")
+    rollup.set_defaults(handler=cmd_rollup)
+
+    rebuild_seen = subparsers.add_parser('rebuild-seen', help="rebuild per-user seen-item filters from interaction history")
+    rebuild_seen.add_argument('--batch-size', type=int, default=1000, help="users per bulk write")
+    rebuild_seen.set_defaults(handler=cmd_rebuild_seen)
+
+    args = parser.parse_args()
+
+    from models import RecommendationEngine
+    base_engine = RecommendationEngine()
+    if base_engine.use_memory:
+        parser.exit(1, "maintenance commands need MongoDB; in-memory storage has nothing to maintain\n")
+    report = args.handler(base_engine, args)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
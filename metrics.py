@@ -0,0 +1,289 @@
+import threading
+import weakref
+from bisect import bisect_left
+from time import perf_counter
+from deadline import check_deadline
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _ShardHolder:
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self, values):
+        self.values = values
+
+class _Shards:
+    """Per-thread value arrays, so hot-path updates never take a lock.
+
+    A thread's array is folded into `retired` when the thread exits, which
+    keeps memory bounded under thread-per-request servers.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._live = {}
+        self._retired = [0] * size
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self._local.holder.values
+        except AttributeError:
+            return self._register()
+
+    def _register(self):
+        values = [0] * self.size
+        holder = _ShardHolder(values)
+        self._local.holder = holder
+        key = id(values)
+        with self._lock:
+            self._live[key] = values
+        weakref.finalize(holder, self._retire, key)
+        return values
+
+    def _retire(self, key):
+        with self._lock:
+            values = self._live.pop(key, None)
+            if values is not None:
+                for i, value in enumerate(values):
+                    self._retired[i] += value
+
+    def snapshot(self):
+        with self._lock:
+            totals = list(self._retired)
+            for values in self._live.values():
+                for i, value in enumerate(values):
+                    totals[i] += value
+        return totals
+
+class CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.get()[0] += amount
+
+    def value(self):
+        return self._shards.snapshot()[0]
+
+class _Timer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(perf_counter() - self._start)
+        return False
+
+class HistogramChild:
+    __slots__ = ('bounds', '_shards', '_sum_index')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One slot per bucket, one overflow slot, then the running sum
+        self._sum_index = len(bounds) + 1
+        self._shards = _Shards(len(bounds) + 2)
+
+    def observe(self, value):
+        values = self._shards.get()
+        values[bisect_left(self.bounds, value)] += 1
+        values[self._sum_index] += value
+
+    def time(self):
+        """Context manager that observes the elapsed seconds of its block"""
+        return _Timer(self)
+
+    def snapshot(self):
+        values = self._shards.snapshot()
+        return values[:self._sum_index], values[self._sum_index]
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.label_names, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def expose(self):
+        lines = self._header()
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{self._label_text(values)} {_format(child.value())}")
+        return lines
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def expose(self):
+        lines = self._header()
+        for values, child in sorted(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+class Gauge(_Metric):
+    """Gauge whose value(s) are read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback, labels=()):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def expose(self):
+        lines = self._header()
+        try:
+            value = self.callback()
+        except Exception as e:
+            return lines + [f"# {self.name} unavailable: {_escape(e)}"]
+        if isinstance(value, dict):
+            for values, v in sorted(value.items()):
+                values = values if isinstance(values, tuple) else (values,)
+                lines.append(f"{self.name}{self._label_text(values)} {_format(v)}")
+        else:
+            lines.append(f"{self.name} {_format(value)}")
+        return lines
+
+class CallbackCounter(Gauge):
+    """Counter whose running total(s) are read from a callback at scrape time, e.g. a cache's hit count"""
+    kind = 'counter'
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        counter = self._register(Counter(name, help_text, labels))
+        if not labels:
+            counter.labels()  # expose 0 before the first increment
+        return counter
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, callback, labels=()):
+        return self._register(Gauge(name, help_text, callback, labels))
+
+    def callback_counter(self, name, help_text, callback, labels=()):
+        return self._register(CallbackCounter(name, help_text, callback, labels))
+
+    def expose(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+STAGE_LATENCY = registry.histogram(
+    'recommendation_stage_duration_seconds',
+    'Time spent in each engine stage',
+    labels=('stage',)
+)
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total',
+    'HTTP requests by route and status code',
+    labels=('route', 'method', 'status')
+)
+
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route',
+    labels=('route',)
+)
+
+_stage_children = {}
+
+def stage(name):
+    """Time a block as one engine stage: `with stage('mongo_query'): ...`
+
+    Stages are also deadline checkpoints: entering one after the current
+    request's deadline has passed raises DeadlineExceeded.
+    """
+    check_deadline()
+    child = _stage_children.get(name)
+    if child is None:
+        child = _stage_children[name] = STAGE_LATENCY.labels(name)
+    return _Timer(child)
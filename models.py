@@ -1,32 +1,86 @@
-from pymongo import MongoClient
-from datetime import datetime
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from pymongo import MongoClient, ReplaceOne, ReturnDocument, UpdateOne
+from datetime import datetime, timedelta
+from itertools import islice
+import heapq
 import os
 from dotenv import load_dotenv
+from metrics import stage
+from applog import get_logger
+from cache import TTLCache
+from retention import RETENTION_DAYS, day_start
+from seen import SeenFilter
+from sketch import hll_add, hll_register, hll_estimate_stages
+from deadline import max_time_ms
 
 load_dotenv()
 
+log = get_logger('storage')
+
+SEEN_POOL_MARGIN = 200
+# Conditional seen-filter writes that lose this many races in a row are dropped
+SEEN_WRITE_ATTEMPTS = 3
+
+def similarity_backend():
+    """numpy and scikit-learn, imported on first use; together they are most of the app's import time"""
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    return np, TfidfVectorizer, cosine_similarity
+
+def deadline_options():
+    """maxTimeMS for aggregate() from the current request deadline, if there is one"""
+    ms = max_time_ms()
+    return {} if ms is None else {"maxTimeMS": ms}
+
+def bucket_hour(timestamp):
+    """Start of the hourly interaction bucket that `timestamp` falls in"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _upsert_keeping_created(key, document):
+    """Upsert of `document` by `key` that sets created_at only when inserting, so re-imports keep it"""
+    fields = {field: value for field, value in document.items() if field != "created_at"}
+    update = {"$set": fields}
+    if "created_at" in document:
+        update["$setOnInsert"] = {"created_at": document["created_at"]}
+    return UpdateOne({key: document[key]}, update, upsert=True)
+
 class RecommendationEngine:
-    def __init__(self):
+    def __init__(self, client=None, use_memory=None):
+        if use_memory is None:
+            use_memory = os.getenv('STORAGE_BACKEND', '').lower() == 'memory'
+        if use_memory:
+            log.info("Using in-memory storage")
+            self._use_memory_storage()
+            return
         try:
-            self.client = MongoClient(os.getenv('MONGODB_URI'), serverSelectionTimeoutMS=5000)
+            self.client = client or MongoClient(
+                os.getenv('MONGODB_URI'),
+                serverSelectionTimeoutMS=int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+            )
             self.client.admin.command('ping')
-            self.db = self.client[os.getenv('DATABASE_NAME')]
+            self.db = self.client[os.getenv('DATABASE_NAME', 'recommendation_engine')]
             self.users = self.db.users
             self.items = self.db.items
             self.interactions = self.db.interactions
+            self.interaction_buckets = self.db.interaction_buckets
+            self.interaction_daily = self.db.interaction_daily
+            # Last seen filter this process wrote per user, so the next write needs no read
+            self.seen_cache = TTLCache.from_env('SEEN_FILTER_CACHE', ttl=300)
             self._setup_indexes()
             self.use_memory = False
-            print("Connected to MongoDB successfully")
+            log.info("Connected to MongoDB successfully")
         except Exception as e:
-            print(f"MongoDB connection failed: {str(e)}")
-            print("Using in-memory storage instead")
-            self.use_memory = True
-            self.memory_users = {}
-            self.memory_items = {}
-            self.memory_interactions = []
+            log.warning("MongoDB connection failed, using in-memory storage instead", error=str(e))
+            self._use_memory_storage()
+    
+    def _use_memory_storage(self):
+        self.use_memory = True
+        self.memory_users = {}
+        self.memory_items = {}
+        self.memory_interactions = []
+        # (user_id, item_id, day) -> {"count", "last_seen"} for rolled-up events
+        self.memory_daily = {}
+        self.memory_seen = {}
     
     def get_status(self):
         return "MongoDB" if not self.use_memory else "In-Memory"
@@ -37,8 +91,19 @@ class RecommendationEngine:
             self.items.create_index("item_id")
             self.interactions.create_index([("user_id", 1), ("timestamp", -1)])
             self.interactions.create_index("item_id")
+            self.interactions.create_index("timestamp")
+            # Roll-up marks folded events; the TTL monitor deletes them shortly after
+            self.interactions.create_index("rolled_up_at", expireAfterSeconds=0)
+            # Trending scans one hour range, then groups by item; upserts hit the same key
+            self.interaction_buckets.create_index([("hour", 1), ("item_id", 1)], unique=True)
+            self.interaction_daily.create_index([("user_id", 1), ("item_id", 1), ("day", 1)], unique=True)
+            self.interaction_daily.create_index([("user_id", 1), ("last_seen", -1)])
+            self.interaction_daily.create_index("item_id")
+            self.interaction_daily.create_index("last_seen")
+            if RETENTION_DAYS > 0:
+                self.interaction_buckets.create_index("hour", expireAfterSeconds=int(RETENTION_DAYS * 86400))
         except Exception as e:
-            print(f"Index creation warning: {e}")
+            log.warning("Index creation warning", error=str(e))
     
     def add_user(self, user_id, preferences=None):
         user = {
@@ -75,53 +140,149 @@ class RecommendationEngine:
         }
         if self.use_memory:
             self.memory_interactions.append(interaction)
+            self.memory_seen.setdefault(user_id, SeenFilter()).add(item_id)
         else:
             self.interactions.insert_one(interaction)
+            self._add_to_seen_filter(user_id, item_id)
+            register, rank = hll_register(user_id)
+            self.interaction_buckets.update_one(
+                {"item_id": item_id, "hour": bucket_hour(interaction["timestamp"])},
+                {"$inc": {"count": 1}, "$max": {f"hll.{register}": rank}},
+                upsert=True
+            )
+    
+    def _add_to_seen_filter(self, user_id, item_id):
+        """Add `item_id` to the stored filter with one conditional write; repeat items need none.
+
+        The filter comes from seen_cache, or on a miss from one
+        find_one_and_update that also creates the user document. A write
+        that matches nothing lost a race with another writer (or the cache
+        was stale), so the filter is re-read and the add retried.
+        """
+        field = SeenFilter.field()
+        seen = self.seen_cache.get(user_id)
+        for _ in range(SEEN_WRITE_ATTEMPTS):
+            if seen is None:
+                doc = self.users.find_one_and_update(
+                    {"user_id": user_id}, {"$setOnInsert": {"user_id": user_id}},
+                    projection={field: 1}, upsert=True, return_document=ReturnDocument.AFTER
+                )
+                seen = SeenFilter.from_document(doc.get(field))
+            seen = seen.copy()
+            change = seen.update_for(item_id)
+            if change is None:
+                self.seen_cache.set(user_id, seen)
+                return
+            condition, update = change
+            if self.users.update_one({"user_id": user_id, **condition}, update).matched_count:
+                self.seen_cache.set(user_id, seen)
+                return
+            seen = None
+        log.warning("Seen filter write kept losing races; rebuild_seen_filters() restores it",
+                    user_id=user_id, item_id=item_id)
+    
+    def bulk_upsert_users(self, users):
+        """Insert or update many user documents (as built by add_user) in one round trip; created_at is kept"""
+        if self.use_memory:
+            for user in users:
+                existing = self.memory_users.get(user["user_id"])
+                self.memory_users[user["user_id"]] = dict(user, created_at=existing.get("created_at", user.get("created_at"))) if existing else user
+            return len(users)
+        if users:
+            self.users.bulk_write([_upsert_keeping_created("user_id", user) for user in users], ordered=False)
+        return len(users)
+    
+    def bulk_upsert_items(self, items):
+        """Insert or update many item documents (as built by add_item) in one round trip; created_at is kept"""
+        if self.use_memory:
+            for item in items:
+                existing = self.memory_items.get(item["item_id"])
+                self.memory_items[item["item_id"]] = dict(item, created_at=existing.get("created_at", item.get("created_at"))) if existing else item
+            return len(items)
+        if items:
+            self.items.bulk_write([_upsert_keeping_created("item_id", item) for item in items], ordered=False)
+        return len(items)
+    
+    def bulk_insert_interactions(self, interactions):
+        """Insert many interactions that carry their own `_id`; in MongoDB, re-inserting one is a no-op.
+
+        Hourly buckets and seen filters are not touched: rebuild them
+        afterwards with backfill_interaction_buckets() and rebuild_seen_filters().
+        """
+        if self.use_memory:
+            events = self.memory_interactions
+            in_order = all(a["timestamp"] <= b["timestamp"] for a, b in zip(interactions, interactions[1:]))
+            events.extend(interactions)
+            if not in_order or (interactions and len(events) > len(interactions)
+                                and events[-len(interactions) - 1]["timestamp"] > interactions[0]["timestamp"]):
+                # Keep the time order the retention roll-up relies on
+                events.sort(key=lambda interaction: interaction["timestamp"])
+            for interaction in interactions:
+                self.memory_seen.setdefault(interaction["user_id"], SeenFilter()).add(interaction["item_id"])
+            return len(interactions)
+        if not interactions:
+            return 0
+        result = self.interactions.bulk_write([
+            UpdateOne(
+                {"_id": interaction["_id"]},
+                {"$setOnInsert": {key: value for key, value in interaction.items() if key != "_id"}},
+                upsert=True
+            )
+            for interaction in interactions
+        ], ordered=False)
+        return result.upserted_count
     
     def get_user_recommendations(self, user_id, limit=10):
         if self.use_memory:
-            user_interactions = [i for i in self.memory_interactions if i["user_id"] == user_id][-50:]
-            if not user_interactions:
-                return list(self.memory_items.values())[:limit]
-            interacted_items = [i["item_id"] for i in user_interactions]
-            candidates = [item for item_id, item in self.memory_items.items() if item_id not in interacted_items]
-            return candidates[:limit]
+            with stage('memory_scan'):
+                # The seen filter covers the full history, so no interaction scan is needed
+                seen = self.memory_seen.get(user_id)
+                if not seen:
+                    return list(self.memory_items.values())[:limit]
+                candidates = (item for item_id, item in list(self.memory_items.items()) if item_id not in seen)
+                return list(islice(candidates, limit))
         else:
-            user_interactions = list(self.interactions.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(50))
+            with stage('mongo_query'):
+                user_interactions = list(self.interactions.find(
+                    {"user_id": user_id}
+                ).sort("timestamp", -1).limit(50).max_time_ms(max_time_ms()))
+                if len(user_interactions) < 50:
+                    # Older history only survives as daily aggregates
+                    user_interactions += list(self.interaction_daily.find(
+                        {"user_id": user_id}, {"_id": 0, "item_id": 1}
+                    ).sort("last_seen", -1).limit(50 - len(user_interactions)).max_time_ms(max_time_ms()))
             
             if not user_interactions:
                 return self._get_popular_items(limit)
             
-            interacted_items = [i["item_id"] for i in user_interactions]
+            # Full-history exclusion; recent items are added in case the filter predates them
+            seen = self._load_seen_filters([user_id]).get(user_id) or SeenFilter()
+            for interaction in user_interactions:
+                seen.add(interaction["item_id"])
             
             pipeline = [
-                {"$match": {"item_id": {"$nin": interacted_items}}},
-                {"$lookup": {
-                    "from": "interactions",
-                    "localField": "item_id",
-                    "foreignField": "item_id",
-                    "as": "item_interactions"
-                }},
-                {"$addFields": {
-                    "popularity_score": {"$size": "$item_interactions"}
-                }},
+                *self._popularity_stages("popularity_score"),
                 {"$sort": {"popularity_score": -1}},
-                {"$limit": limit * 2}
+                # At most `seen.count` of the top items can be filtered out below; like the pool
+                # path, users who filter out more than SEEN_POOL_MARGIN rerank fewer than limit*2
+                {"$limit": limit * 2 + min(seen.count, SEEN_POOL_MARGIN)}
             ]
             
-            candidates = list(self.items.aggregate(pipeline))
+            with stage('aggregation'):
+                candidates = [item for item in self.items.aggregate(pipeline, **deadline_options()) if item["item_id"] not in seen][:limit * 2]
             
             if len(candidates) > limit:
-                candidates = self._rank_by_similarity(user_interactions, candidates)
+                with stage('rerank'):
+                    candidates = self._rank_by_similarity(user_interactions, candidates)
             
             return candidates[:limit]
     
     def _rank_by_similarity(self, user_interactions, candidates):
         # Get user's preferred items
         user_item_ids = [i["item_id"] for i in user_interactions[-10:]]
-        user_items = list(self.items.find({"item_id": {"$in": user_item_ids}}))
+        user_items = list(self.items.find(
+            {"item_id": {"$in": user_item_ids}}, {"_id": 0, "description": 1}
+        ).max_time_ms(max_time_ms()))
         
         if not user_items:
             return candidates
@@ -130,6 +291,7 @@ class RecommendationEngine:
         all_items = user_items + candidates
         descriptions = [item.get("description", "") for item in all_items]
         
+        np, TfidfVectorizer, cosine_similarity = similarity_backend()
         vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
         vectors = vectorizer.fit_transform(descriptions)
         
@@ -150,55 +312,403 @@ class RecommendationEngine:
             return list(self.memory_items.values())[:limit]
         else:
             pipeline = [
-                {"$lookup": {
-                    "from": "interactions",
-                    "localField": "item_id",
-                    "foreignField": "item_id",
-                    "as": "interactions"
-                }},
-                {"$addFields": {
-                    "popularity": {"$size": "$interactions"}
-                }},
+                *self._popularity_stages("popularity"),
                 {"$sort": {"popularity": -1}},
                 {"$limit": limit}
             ]
+            with stage('aggregation'):
+                return list(self.items.aggregate(pipeline, **deadline_options()))
+    
+    def _popularity_stages(self, field):
+        """Stages that score each item by its raw plus rolled-up interaction count.
+
+        Raw events already folded into interaction_daily keep their
+        rolled_up_at mark until the TTL monitor deletes them, so they are
+        left out of the raw count.
+        """
+        return [
+            {"$lookup": {
+                "from": "interactions",
+                "localField": "item_id",
+                "foreignField": "item_id",
+                "as": "item_interactions"
+            }},
+            {"$lookup": {
+                "from": "interaction_daily",
+                "localField": "item_id",
+                "foreignField": "item_id",
+                "as": "item_daily"
+            }},
+            {"$addFields": {
+                field: {"$add": [
+                    {"$size": {"$filter": {
+                        "input": "$item_interactions",
+                        "cond": {"$eq": [{"$ifNull": ["$$this.rolled_up_at", None]}, None]}
+                    }}},
+                    {"$sum": "$item_daily.count"}
+                ]}
+            }},
+            {"$project": {"_id": 0, "item_interactions": 0, "item_daily": 0}}
+        ]
+    
+    def iter_user_recommendations_bulk(self, user_ids, limit=10, chunk_size=1000):
+        """Yield (user_id, recommendations) for many users with shared candidate pools and scoring"""
+        # Users whose seen filters remove more than SEEN_POOL_MARGIN pool items rerank fewer than limit*2
+        pool = None if self.use_memory else self._get_candidate_pool(limit * 2 + SEEN_POOL_MARGIN)
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            if self.use_memory:
+                for user_id in chunk:
+                    yield user_id, self._memory_bulk_candidates(self.memory_seen.get(user_id), limit)
+                continue
+            histories = self._load_recent_item_ids(chunk)
+            filters = self._load_seen_filters(chunk)
+            with stage('rerank'):
+                similarities, profile_rows = self._bulk_similarity(chunk, histories, pool)
+            for user_id in chunk:
+                history = histories.get(user_id)
+                if not history:
+                    yield user_id, [dict(item) for item in pool[:limit]]
+                    continue
+                seen = filters.get(user_id) or SeenFilter()
+                for item_id in history:
+                    seen.add(item_id)
+                candidates = [i for i, item in enumerate(pool) if item["item_id"] not in seen][:limit * 2]
+                row = profile_rows.get(user_id)
+                if len(candidates) > limit and row is not None:
+                    candidates.sort(key=lambda i: similarities[row, i], reverse=True)
+                    yield user_id, [
+                        dict(pool[i], similarity_score=float(similarities[row, i]))
+                        for i in candidates[:limit]
+                    ]
+                else:
+                    yield user_id, [dict(pool[i]) for i in candidates[:limit]]
+    
+    def _load_recent_item_ids(self, user_ids, per_user=50):
+        """Most recent interacted item ids per user, loaded with one grouped query"""
+        pipeline = [
+            {"$match": {"user_id": {"$in": list(user_ids)}}},
+            {"$sort": {"user_id": 1, "timestamp": -1}},
+            {"$group": {"_id": "$user_id", "item_ids": {"$push": "$item_id"}}},
+            {"$project": {"item_ids": {"$slice": ["$item_ids", per_user]}}}
+        ]
+        with stage('mongo_query'):
+            histories = {doc["_id"]: doc["item_ids"] for doc in self.interactions.aggregate(pipeline, allowDiskUse=True)}
+            short = [user_id for user_id in user_ids if len(histories.get(user_id, ())) < per_user]
+            if short:
+                rolled_pipeline = [
+                    {"$match": {"user_id": {"$in": short}}},
+                    {"$sort": {"user_id": 1, "last_seen": -1}},
+                    {"$group": {"_id": "$user_id", "item_ids": {"$push": "$item_id"}}},
+                    {"$project": {"item_ids": {"$slice": ["$item_ids", per_user]}}}
+                ]
+                for doc in self.interaction_daily.aggregate(rolled_pipeline, allowDiskUse=True):
+                    ids = histories.get(doc["_id"], [])
+                    histories[doc["_id"]] = ids + doc["item_ids"][:per_user - len(ids)]
+        return histories
+    
+    def _get_candidate_pool(self, size):
+        """Popularity-ranked candidates shared by every user in a bulk request"""
+        pipeline = [
+            *self._popularity_stages("popularity_score"),
+            {"$sort": {"popularity_score": -1}},
+            {"$limit": size}
+        ]
+        with stage('aggregation'):
             return list(self.items.aggregate(pipeline))
     
+    def _memory_bulk_candidates(self, seen, limit):
+        seen = seen or SeenFilter()
+        candidates = (item for item in list(self.memory_items.values()) if item["item_id"] not in seen)
+        return [dict(item) for item in islice(candidates, max(limit, 0))]
+    
+    def _load_seen_filters(self, user_ids):
+        """Stored seen filters for `user_ids`, loaded with one query"""
+        if self.use_memory:
+            return {user_id: self.memory_seen[user_id] for user_id in user_ids if user_id in self.memory_seen}
+        field = SeenFilter.field()
+        docs = self.users.find(
+            {"user_id": {"$in": list(user_ids)}, field: {"$exists": True}}, {"_id": 0, "user_id": 1, field: 1}
+        ).max_time_ms(max_time_ms())
+        return {doc["user_id"]: SeenFilter.from_document(doc[field]) for doc in docs}
+    
+    def rebuild_seen_filters(self, batch_size=1000):
+        """Recompute every user's seen filter from raw and rolled-up history; returns users written"""
+        if self.use_memory:
+            filters = {}
+            for interaction in list(self.memory_interactions):
+                filters.setdefault(interaction["user_id"], SeenFilter()).add(interaction["item_id"])
+            for user_id, item_id, _day in list(self.memory_daily):
+                filters.setdefault(user_id, SeenFilter()).add(item_id)
+            self.memory_seen.update(filters)
+            return len(filters)
+        
+        self.seen_cache.clear()
+        done = set()
+        for collection in (self.interactions, self.interaction_daily):
+            pipeline = [{"$group": {"_id": "$user_id", "item_ids": {"$addToSet": "$item_id"}}}]
+            batch = []
+            for doc in collection.aggregate(pipeline, allowDiskUse=True):
+                if doc["_id"] in done:
+                    continue
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    self._write_seen_filters(batch, done)
+                    batch = []
+            self._write_seen_filters(batch, done)
+        return len(done)
+    
+    def _write_seen_filters(self, docs, done):
+        if not docs:
+            return
+        item_ids = {doc["_id"]: set(doc["item_ids"]) for doc in docs}
+        pipeline = [
+            {"$match": {"user_id": {"$in": list(item_ids)}}},
+            {"$group": {"_id": "$user_id", "item_ids": {"$addToSet": "$item_id"}}}
+        ]
+        for doc in self.interaction_daily.aggregate(pipeline):
+            item_ids[doc["_id"]].update(doc["item_ids"])
+        field = SeenFilter.field()
+        requests = []
+        for user_id, ids in item_ids.items():
+            seen = SeenFilter()
+            for item_id in ids:
+                seen.add(item_id)
+            requests.append(UpdateOne({"user_id": user_id}, {"$set": {field: seen.to_document()}}, upsert=True))
+            done.add(user_id)
+        self.users.bulk_write(requests, ordered=False)
+    
+    def _bulk_similarity(self, user_ids, histories, pool):
+        """Score every user profile against the shared pool with one TF-IDF fit"""
+        # Mirrors _rank_by_similarity, which profiles users from user_interactions[-10:]
+        profiles = {
+            user_id: histories[user_id][-10:]
+            for user_id in user_ids if histories.get(user_id)
+        }
+        profile_item_ids = sorted({item_id for ids in profiles.values() for item_id in ids})
+        if not profile_item_ids or not pool:
+            return None, {}
+        descriptions = {
+            doc["item_id"]: doc.get("description", "")
+            for doc in self.items.find({"item_id": {"$in": profile_item_ids}}, {"_id": 0, "item_id": 1, "description": 1})
+        }
+        known_ids = [item_id for item_id in profile_item_ids if item_id in descriptions]
+        if not known_ids:
+            return None, {}
+        texts = [descriptions[item_id] for item_id in known_ids] + [item.get("description", "") for item in pool]
+        np, TfidfVectorizer, cosine_similarity = similarity_backend()
+        try:
+            vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
+            vectors = vectorizer.fit_transform(texts).toarray()
+        except ValueError:
+            # Empty vocabulary: keep popularity order
+            return None, {}
+        
+        item_rows = {item_id: row for row, item_id in enumerate(known_ids)}
+        profile_rows = {}
+        user_vectors = []
+        for user_id, item_ids in profiles.items():
+            rows = [item_rows[item_id] for item_id in item_ids if item_id in item_rows]
+            if rows:
+                profile_rows[user_id] = len(user_vectors)
+                user_vectors.append(np.mean(vectors[rows], axis=0))
+        if not user_vectors:
+            return None, {}
+        
+        similarities = cosine_similarity(np.vstack(user_vectors), vectors[len(known_ids):])
+        return similarities, profile_rows
+    
+    def has_interactions(self, user_id):
+        if self.use_memory:
+            # The seen filter covers raw and rolled-up history alike
+            return bool(self.memory_seen.get(user_id))
+        return (self.interactions.find_one({"user_id": user_id}, {"_id": 1}, max_time_ms=max_time_ms()) is not None
+                or self.interaction_daily.find_one({"user_id": user_id}, {"_id": 1}, max_time_ms=max_time_ms()) is not None)
+    
+    def count_users(self):
+        if self.use_memory:
+            return len(set(self.memory_users)
+                       | {i["user_id"] for i in self.memory_interactions}
+                       | {key[0] for key in list(self.memory_daily)})
+        return self.users.count_documents({})
+    
+    def get_active_user_ids(self, days=30):
+        """Users with at least one interaction in the last `days` days"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        if self.use_memory:
+            user_ids = dict.fromkeys(i["user_id"] for i in self.memory_interactions if i["timestamp"] >= cutoff)
+            user_ids.update(dict.fromkeys(
+                key[0] for key, entry in list(self.memory_daily.items()) if entry["last_seen"] >= cutoff
+            ))
+            return list(user_ids)
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": cutoff}}},
+            {"$group": {"_id": "$user_id"}}
+        ]
+        user_ids = dict.fromkeys(doc["_id"] for doc in self.interactions.aggregate(pipeline, allowDiskUse=True))
+        # Usually empty: rolled-up events are older than the retention window
+        rolled_pipeline = [
+            {"$match": {"last_seen": {"$gte": cutoff}}},
+            {"$group": {"_id": "$user_id"}}
+        ]
+        user_ids.update(dict.fromkeys(
+            doc["_id"] for doc in self.interaction_daily.aggregate(rolled_pipeline, allowDiskUse=True)
+        ))
+        return list(user_ids)
+    
+    def _memory_item_counts(self):
+        counts = {}
+        for interaction in self.memory_interactions:
+            counts[interaction["item_id"]] = counts.get(interaction["item_id"], 0) + 1
+        for (_user_id, item_id, _day), entry in list(self.memory_daily.items()):
+            counts[item_id] = counts.get(item_id, 0) + entry["count"]
+        return counts
+    
+    def _memory_popularity(self):
+        counts = self._memory_item_counts()
+        ranked = sorted(
+            (item for item in self.memory_items.values()),
+            key=lambda item: counts.get(item["item_id"], 0),
+            reverse=True
+        )
+        return [dict(item, popularity=counts.get(item["item_id"], 0)) for item in ranked]
+    
+    def _item_interaction_counts(self):
+        """Total interactions per item id, raw plus rolled up"""
+        counts = {}
+        # Rolled-up raw events are already in interaction_daily until the TTL monitor deletes them
+        sources = (
+            (self.interactions, [{"$match": {"rolled_up_at": {"$exists": False}}}], 1),
+            (self.interaction_daily, [], "$count")
+        )
+        for collection, stages, amount in sources:
+            pipeline = stages + [{"$group": {"_id": "$item_id", "popularity": {"$sum": amount}}}]
+            for doc in collection.aggregate(pipeline, allowDiskUse=True):
+                counts[doc["_id"]] = counts.get(doc["_id"], 0) + doc["popularity"]
+        return counts
+    
+    def get_item_popularity(self):
+        """Total interactions per item id"""
+        if self.use_memory:
+            return self._memory_item_counts()
+        with stage('aggregation'):
+            return self._item_interaction_counts()
+    
+    def get_item_catalog(self):
+        """item_id, category and created_at for every item"""
+        if self.use_memory:
+            return [
+                {"item_id": item["item_id"], "category": item.get("category"), "created_at": item.get("created_at")}
+                for item in list(self.memory_items.values())
+            ]
+        return self.items.find({}, {"_id": 0, "item_id": 1, "category": 1, "created_at": 1})
+    
+    def iter_interaction_sequences(self):
+        """(user_id, item_id, timestamp) for raw interactions, grouped by user in time order"""
+        if self.use_memory:
+            events = sorted(list(self.memory_interactions), key=lambda i: (str(i["user_id"]), i["timestamp"]))
+            return ((i["user_id"], i["item_id"], i["timestamp"]) for i in events)
+        # Descending user_id walks the (user_id, timestamp desc) index backwards, giving ascending timestamps
+        cursor = self.interactions.find(
+            {}, {"_id": 0, "user_id": 1, "item_id": 1, "timestamp": 1}
+        ).sort([("user_id", -1), ("timestamp", 1)]).batch_size(10000)
+        return ((doc["user_id"], doc["item_id"], doc["timestamp"]) for doc in cursor)
+    
+    def get_items_by_ids(self, item_ids):
+        if self.use_memory:
+            return {item_id: self.memory_items[item_id] for item_id in item_ids if item_id in self.memory_items}
+        docs = self.items.find({"item_id": {"$in": list(item_ids)}}, {"_id": 0}).max_time_ms(max_time_ms())
+        return {doc["item_id"]: doc for doc in docs}
+    
+    def get_popular_items_ranked(self, limit=10):
+        """Items ranked by total interaction count"""
+        if self.use_memory:
+            return self._memory_popularity()[:limit]
+        with stage('aggregation'):
+            counts = self._item_interaction_counts()
+        top = heapq.nlargest(limit, counts.items(), key=lambda entry: entry[1])
+        items = {
+            doc["item_id"]: doc
+            for doc in self.items.find({"item_id": {"$in": [item_id for item_id, _ in top]}}, {"_id": 0})
+        }
+        return [dict(items[item_id], popularity=count) for item_id, count in top if item_id in items]
+    
+    def get_popular_items_by_category(self, limit=10):
+        """Top `limit` items per category, ranked by total interaction count"""
+        if self.use_memory:
+            by_category = {}
+            for item in self._memory_popularity():
+                items = by_category.setdefault(item.get("category", "general"), [])
+                if len(items) < limit:
+                    items.append(item)
+            return by_category
+        with stage('aggregation'):
+            counts = self._item_interaction_counts()
+        items = self.items.find({"item_id": {"$in": list(counts)}}, {"_id": 0})
+        by_category = {}
+        for item in sorted(items, key=lambda item: counts[item["item_id"]], reverse=True):
+            ranked = by_category.setdefault(item.get("category"), [])
+            if len(ranked) < limit:
+                ranked.append(dict(item, popularity=counts[item["item_id"]]))
+        return by_category
+    
     def get_trending_items(self, hours=24, limit=10):
-        from datetime import timedelta
         cutoff = datetime.utcnow() - timedelta(hours=hours)
         
         if self.use_memory:
-            recent_interactions = [i for i in self.memory_interactions if i["timestamp"] >= cutoff]
-            item_counts = {}
-            for interaction in recent_interactions:
-                item_id = interaction["item_id"]
-                if item_id not in item_counts:
-                    item_counts[item_id] = {"count": 0, "users": set()}
-                item_counts[item_id]["count"] += 1
-                item_counts[item_id]["users"].add(interaction["user_id"])
-            
-            trending = []
-            for item_id, data in item_counts.items():
-                if item_id in self.memory_items:
-                    trending.append({
-                        "_id": item_id,
-                        "trend_score": data["count"] * len(data["users"]),
-                        "item_details": self.memory_items[item_id]
-                    })
-            
-            return sorted(trending, key=lambda x: x["trend_score"], reverse=True)[:limit]
+            with stage('memory_scan'):
+                recent_interactions = [i for i in self.memory_interactions if i["timestamp"] >= cutoff]
+                item_counts = {}
+                for interaction in recent_interactions:
+                    item_id = interaction["item_id"]
+                    if item_id not in item_counts:
+                        item_counts[item_id] = {"count": 0, "users": set()}
+                    item_counts[item_id]["count"] += 1
+                    item_counts[item_id]["users"].add(interaction["user_id"])
+                
+                trending = []
+                for item_id, data in item_counts.items():
+                    if item_id in self.memory_items:
+                        trending.append({
+                            "_id": item_id,
+                            "trend_score": data["count"] * len(data["users"]),
+                            "item_details": self.memory_items[item_id]
+                        })
+                
+                return sorted(trending, key=lambda x: x["trend_score"], reverse=True)[:limit]
         else:
+            # Sum at most `hours` hourly buckets per item (the current, partial hour included)
+            # instead of scanning every raw interaction in the window
+            first_hour = bucket_hour(datetime.utcnow()) - timedelta(hours=max(hours, 1) - 1)
             pipeline = [
-                {"$match": {"timestamp": {"$gte": cutoff}}},
+                {"$match": {"hour": {"$gte": first_hour}}},
                 {"$group": {
                     "_id": "$item_id",
-                    "interaction_count": {"$sum": 1},
-                    "unique_users": {"$addToSet": "$user_id"}
+                    "interaction_count": {"$sum": "$count"},
+                    "sketches": {"$push": {"$objectToArray": {"$ifNull": ["$hll", {}]}}}
+                }},
+                # Distinct users across the window: register-wise max of the hourly HyperLogLog
+                # sketches, at most hours x HLL_REGISTERS entries per item however many users
+                {"$unwind": "$sketches"},
+                {"$unwind": {"path": "$sketches", "preserveNullAndEmptyArrays": True}},
+                {"$group": {
+                    "_id": {"item_id": "$_id", "register": "$sketches.k"},
+                    "interaction_count": {"$first": "$interaction_count"},
+                    "rank": {"$max": "$sketches.v"}
                 }},
+                {"$group": {
+                    "_id": "$_id.item_id",
+                    "interaction_count": {"$first": "$interaction_count"},
+                    "unique_users": {"$push": {"k": "$_id.register", "v": "$rank"}}
+                }},
+                {"$addFields": {"unique_users": {"$arrayToObject": {
+                    "$filter": {"input": "$unique_users", "cond": {"$ne": [{"$ifNull": ["$$this.k", None]}, None]}}
+                }}}},
+                *hll_estimate_stages("unique_users"),
                 {"$addFields": {
-                    "trend_score": {"$multiply": ["$interaction_count", {"$size": "$unique_users"}]}
+                    "trend_score": {"$multiply": ["$interaction_count", "$unique_users"]}
                 }},
+                {"$project": {"unique_users": 0}},
                 {"$sort": {"trend_score": -1}},
                 {"$limit": limit},
                 {"$lookup": {
@@ -207,7 +717,113 @@ class RecommendationEngine:
                     "foreignField": "item_id",
                     "as": "item_details"
                 }},
-                {"$unwind": "$item_details"}
+                {"$unwind": "$item_details"},
+                {"$project": {"item_details._id": 0}}
             ]
             
-            return list(self.interactions.aggregate(pipeline))
+            with stage('aggregation'):
+                return list(self.interaction_buckets.aggregate(pipeline, **deadline_options()))
+
+    def backfill_interaction_buckets(self, hours=None, batch_size=1000):
+        """Rebuild hourly buckets from raw interactions (all of them, or the last `hours`)"""
+        if self.use_memory:
+            return 0
+        pipeline = []
+        if hours is not None:
+            pipeline.append({"$match": {"timestamp": {"$gte": bucket_hour(datetime.utcnow()) - timedelta(hours=hours)}}})
+        # One row per (item, hour, user), in bucket order, so each bucket's sketch is folded here
+        # from its users without ever holding them in one document
+        pipeline.append({"$group": {
+            "_id": {
+                "item_id": "$item_id",
+                "year": {"$year": "$timestamp"},
+                "month": {"$month": "$timestamp"},
+                "day": {"$dayOfMonth": "$timestamp"},
+                "hour": {"$hour": "$timestamp"},
+                "user_id": "$user_id"
+            },
+            "count": {"$sum": 1}
+        }})
+        pipeline.append({"$sort": {"_id.item_id": 1, "_id.year": 1, "_id.month": 1, "_id.day": 1, "_id.hour": 1}})
+        written = 0
+        batch = []
+        bucket = None
+
+        def flush():
+            # Replace rather than $inc so re-running the backfill is idempotent
+            batch.append(ReplaceOne({"item_id": bucket["item_id"], "hour": bucket["hour"]}, bucket, upsert=True))
+
+        for doc in self.interactions.aggregate(pipeline, allowDiskUse=True):
+            key = doc["_id"]
+            hour = datetime(key["year"], key["month"], key["day"], key["hour"])
+            if bucket is None or (bucket["item_id"], bucket["hour"]) != (key["item_id"], hour):
+                if bucket is not None:
+                    flush()
+                bucket = {"item_id": key["item_id"], "hour": hour, "count": 0, "hll": {}}
+            bucket["count"] += doc["count"]
+            hll_add(bucket["hll"], key["user_id"])
+            if len(batch) >= batch_size:
+                self.interaction_buckets.bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if bucket is not None:
+            flush()
+        if batch:
+            self.interaction_buckets.bulk_write(batch, ordered=False)
+            written += len(batch)
+        return written
+    
+    def rollup_interactions(self, cutoff, batch_size=1000):
+        """Fold one batch of raw interactions older than `cutoff` into daily aggregates.
+
+        Returns the number of events folded; fewer than `batch_size` means the
+        backlog is drained.
+        """
+        if self.use_memory:
+            return self._memory_rollup(cutoff, batch_size)
+        batch = list(self.interactions.find(
+            {"timestamp": {"$lt": cutoff}, "rolled_up_at": {"$exists": False}},
+            {"user_id": 1, "item_id": 1, "timestamp": 1}
+        ).sort("timestamp", 1).limit(batch_size))
+        if not batch:
+            return 0
+        totals = {}
+        for interaction in batch:
+            key = (interaction["user_id"], interaction["item_id"], day_start(interaction["timestamp"]))
+            entry = totals.setdefault(key, {"count": 0, "last_seen": interaction["timestamp"]})
+            entry["count"] += 1
+            entry["last_seen"] = max(entry["last_seen"], interaction["timestamp"])
+        self.interaction_daily.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "item_id": item_id, "day": day},
+                {"$inc": {"count": entry["count"]}, "$max": {"last_seen": entry["last_seen"]}},
+                upsert=True
+            )
+            for (user_id, item_id, day), entry in totals.items()
+        ], ordered=False)
+        # Marked only after the aggregates are written, so a crash re-folds rather than loses
+        # events; the TTL index on rolled_up_at then deletes them in the background
+        self.interactions.update_many(
+            {"_id": {"$in": [interaction["_id"] for interaction in batch]}},
+            {"$set": {"rolled_up_at": datetime.utcnow()}}
+        )
+        return len(batch)
+    
+    def _memory_rollup(self, cutoff, batch_size):
+        interactions = self.memory_interactions
+        folded = 0
+        # Events are appended in time order, so everything past the cutoff is at the front
+        for interaction in islice(interactions, batch_size):
+            if interaction["timestamp"] >= cutoff:
+                break
+            key = (interaction["user_id"], interaction["item_id"], day_start(interaction["timestamp"]))
+            entry = self.memory_daily.get(key)
+            if entry is None:
+                self.memory_daily[key] = {"count": 1, "last_seen": interaction["timestamp"]}
+            else:
+                entry["count"] += 1
+                entry["last_seen"] = max(entry["last_seen"], interaction["timestamp"])
+            folded += 1
+        if folded:
+            del interactions[:folded]
+        return folded
@@ -0,0 +1,96 @@
+import base64
+import os
+import secrets
+from cache import TTLCache
+from metrics import registry
+from precompute import PRECOMPUTE_DEPTH
+from serialization import encode_each, join_encoded
+
+PAGES_SERVED = registry.counter(
+    'paginated_pages_served_total',
+    'Result pages served, by whether the ranking was computed or read from a stored list',
+    labels=('source',)
+)
+
+class CursorError(Exception):
+    """Malformed cursor, or one issued for a different result list"""
+
+class CursorExpired(CursorError):
+    """The ranked list behind a cursor is no longer stored"""
+
+class RankedListStore:
+    """Deep ranked lists kept briefly so "load more" is a slice, not a recomputation.
+
+    The first page of a paginated request computes `depth` results once;
+    they are de-duplicated by item_id, encoded item by item and stored for
+    `ttl` seconds under a random token. Cursors are opaque base64 of token
+    and offset, tied to the scope (route and parameters) they were issued
+    for, so later pages keep the first page's order and never repeat an
+    item. Lists live in process memory; a cursor presented to another
+    worker, or after the ttl, is reported as expired.
+    """
+    def __init__(self, ttl=300, max_entries=10000, depth=PRECOMPUTE_DEPTH, max_page_size=50):
+        self.lists = TTLCache(ttl=ttl, max_entries=max_entries)
+        self.depth = depth
+        self.max_page_size = max_page_size
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=float(os.getenv('PAGINATION_TTL', 300)),
+            max_entries=int(os.getenv('PAGINATION_MAX_ENTRIES', 10000)),
+            depth=int(os.getenv('PAGINATION_DEPTH', PRECOMPUTE_DEPTH)),
+            max_page_size=int(os.getenv('PAGINATION_MAX_PAGE_SIZE', 50))
+        )
+
+    def page_size(self, requested):
+        return min(max(requested, 1), self.max_page_size)
+
+    def first_page(self, scope, items, page_size):
+        """Store `items` and return (body, next_cursor) for the first page"""
+        seen = set()
+        unique = []
+        for item in items:
+            item_id = item.get('item_id')
+            if item_id is not None and item_id in seen:
+                continue
+            seen.add(item_id)
+            unique.append(item)
+        token = secrets.token_urlsafe(12)
+        parts = encode_each(unique)
+        self.lists.set(token, (scope, parts))
+        PAGES_SERVED.labels('computed').inc()
+        return self._slice(token, parts, 0, page_size)
+
+    def page(self, scope, cursor, page_size):
+        """(body, next_cursor) for the page a cursor points at; next_cursor is None on the last page"""
+        token, offset = self._decode(cursor)
+        entry = self.lists.get(token)
+        if entry is None:
+            raise CursorExpired("cursor expired")
+        stored_scope, parts = entry
+        if stored_scope != scope:
+            raise CursorError("cursor was issued for a different request")
+        PAGES_SERVED.labels('stored').inc()
+        return self._slice(token, parts, offset, page_size)
+
+    def _slice(self, token, parts, offset, page_size):
+        end = offset + self.page_size(page_size)
+        next_cursor = self._encode(token, end) if end < len(parts) else None
+        return join_encoded(parts[offset:end]), next_cursor
+
+    @staticmethod
+    def _encode(token, offset):
+        return base64.urlsafe_b64encode(f"{token}:{offset}".encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            token, offset = raw.rsplit(':', 1)
+            offset = int(offset)
+        except (ValueError, UnicodeDecodeError):
+            raise CursorError("malformed cursor")
+        if offset < 0:
+            raise CursorError("malformed cursor")
+        return token, offset
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pymongo import ReplaceOne
+from serialization import encode, project_items
+from applog import get_logger
+
+log = get_logger('precompute')
+
+MODEL_VERSION = os.getenv('RECOMMENDATION_MODEL_VERSION', 'popularity-tfidf-1')
+PRECOMPUTED_MAX_AGE = float(os.getenv('PRECOMPUTED_MAX_AGE', 6 * 3600))
+PRECOMPUTED_PATH = os.getenv('PRECOMPUTED_PATH', 'precomputed_recommendations.json')
+# Items stored per list; paginated first pages rank this many by default so they can be served from the tables
+PRECOMPUTE_DEPTH = int(os.getenv('PRECOMPUTE_DEPTH', 50))
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+def category_key(category):
+    return f"category:{category}"
+
+POPULAR_KEY = "popular"
+
+def make_entry(key, recommendations, depth):
+    return {
+        "_id": key,
+        "recommendations": project_items(recommendations),
+        "depth": depth,
+        "model_version": MODEL_VERSION,
+        "computed_at": datetime.utcnow()
+    }
+
+def is_fresh(entry, limit, max_age=None):
+    """True if a stored entry can answer a request for `limit` items"""
+    if entry is None or entry.get("model_version") != MODEL_VERSION:
+        return False
+    if limit > entry.get("depth", 0) and len(entry["recommendations"]) >= entry.get("depth", 0):
+        # Entry was cut at `depth` items; a deeper request needs the live path
+        return False
+    age = (datetime.utcnow() - entry["computed_at"]).total_seconds()
+    return age <= (PRECOMPUTED_MAX_AGE if max_age is None else max_age)
+
+class MongoPrecomputedStore:
+    """Precomputed top-N lists in the precomputed_recommendations collection"""
+    def __init__(self, db):
+        self.collection = db.precomputed_recommendations
+        try:
+            self.collection.create_index("model_version")
+        except Exception as e:
+            log.warning("Index creation warning", error=str(e))
+
+    def get(self, key):
+        return self.collection.find_one({"_id": key})
+
+    def put_many(self, entries):
+        if entries:
+            self.collection.bulk_write(
+                [ReplaceOne({"_id": entry["_id"]}, entry, upsert=True) for entry in entries],
+                ordered=False
+            )
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+    def count(self):
+        return self.collection.count_documents({})
+
+class FilePrecomputedStore:
+    """Precomputed top-N lists in a local JSON file, reloaded when the file changes.
+
+    Deletions are appended to a `<path>.deleted` log instead of rewriting
+    the whole file per interaction. Loading drops entries computed before
+    their key was deleted, and the next put_many() folds the log into the
+    file.
+    """
+    RELOAD_CHECK_SECONDS = 5
+
+    def __init__(self, path=PRECOMPUTED_PATH):
+        self.path = path
+        self.deleted_path = f"{path}.deleted"
+        self._entries = {}
+        self._mtime = None
+        self._deleted_offset = 0
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    def get(self, key):
+        self._maybe_reload()
+        return self._entries.get(key)
+
+    def put_many(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._entries[entry["_id"]] = entry
+            self._write()
+
+    def delete(self, key):
+        line = json.dumps({"_id": key, "deleted_at": datetime.utcnow().isoformat()}) + "\n"
+        with self._lock:
+            self._entries.pop(key, None)
+            with open(self.deleted_path, 'a') as f:
+                f.write(line)
+
+    def count(self):
+        return len(self._entries)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.RELOAD_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            # Only deletions can have changed; read the log lines appended since the last check
+            with self._lock:
+                self._apply_deletions()
+            return
+        try:
+            with open(self.path) as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("Precomputed store load error", path=self.path, error=str(e))
+            return
+        for entry in raw.values():
+            entry["computed_at"] = datetime.fromisoformat(entry["computed_at"])
+        with self._lock:
+            self._entries = raw
+            self._mtime = mtime
+            self._deleted_offset = 0
+            self._apply_deletions()
+
+    def _apply_deletions(self, path=None):
+        """Drop entries computed before a deletion logged in `path` after the last read offset"""
+        try:
+            with open(path or self.deleted_path, 'rb') as f:
+                f.seek(0 if path else self._deleted_offset)
+                data = f.read()
+        except OSError:
+            return
+        # A line still being appended by another process is read on the next check
+        complete = data[:data.rfind(b"\n") + 1]
+        if not path:
+            self._deleted_offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+                deleted_at = datetime.fromisoformat(record["deleted_at"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            entry = self._entries.get(record["_id"])
+            if entry is not None and entry["computed_at"] <= deleted_at:
+                del self._entries[record["_id"]]
+
+    def _write(self):
+        # Claim the deletion log, so deletions logged while writing start a new one
+        claimed = f"{self.deleted_path}.{os.getpid()}"
+        try:
+            os.replace(self.deleted_path, claimed)
+        except OSError:
+            claimed = None
+        else:
+            self._apply_deletions(claimed)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encode(self._entries))
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+        self._deleted_offset = 0
+        if claimed:
+            os.remove(claimed)
+
+def create_store(base_engine):
+    if base_engine.use_memory:
+        return FilePrecomputedStore()
+    return MongoPrecomputedStore(base_engine.db)
+
+def run_precompute(engine, store, limit=PRECOMPUTE_DEPTH, active_days=30, batch_size=1000):
+    """Precompute top-N lists for active users plus per-category cold-start lists"""
+    started = time.perf_counter()
+    base = engine.base_engine
+    user_ids = base.get_active_user_ids(active_days)
+
+    written = 0
+    batch = []
+    for user_id, recommendations in engine.iter_recommendations_bulk(user_ids, limit):
+        batch.append(make_entry(user_key(user_id), recommendations, limit))
+        if len(batch) >= batch_size:
+            store.put_many(batch)
+            written += len(batch)
+            batch = []
+    store.put_many(batch)
+    written += len(batch)
+    users_seconds = time.perf_counter() - started
+
+    by_category = base.get_popular_items_by_category(limit)
+    category_entries = [
+        make_entry(category_key(category), items, limit)
+        for category, items in by_category.items()
+    ]
+    category_entries.append(make_entry(POPULAR_KEY, base.get_popular_items_ranked(limit), limit))
+    store.put_many(category_entries)
+
+    elapsed = time.perf_counter() - started
+    total_users = base.count_users()
+    return {
+        "model_version": MODEL_VERSION,
+        "active_days": active_days,
+        "active_users": len(user_ids),
+        "users_written": written,
+        "categories_written": len(by_category),
+        "total_users": total_users,
+        "coverage": round(written / total_users, 4) if total_users else 0.0,
+        "users_per_second": round(written / users_seconds, 1) if users_seconds > 0 else None,
+        "elapsed_seconds": round(elapsed, 3),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendation tables")
+    parser.add_argument('--limit', type=int, default=PRECOMPUTE_DEPTH, help="items stored per user/category")
+    parser.add_argument('--active-days', type=int, default=30, help="users with interactions in this window are precomputed")
+    parser.add_argument('--batch-size', type=int, default=1000, help="entries per bulk write")
+    args = parser.parse_args()
+
+    from engine import EnhancedRecommendationEngine
+    engine = EnhancedRecommendationEngine()
+    report = run_precompute(engine, engine.precomputed, args.limit, args.active_days, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
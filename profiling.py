@@ -0,0 +1,192 @@
+import cProfile
+import hmac
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+def is_admin(token):
+    """Constant-time admin token check; admin endpoints are disabled when ADMIN_TOKEN is unset"""
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def _function_label(key):
+    filename, line, name = key
+    if filename == '~':
+        return name  # built-in
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+class RequestProfiler:
+    """Runs single requests under cProfile and keeps recent results in a ring buffer"""
+    def __init__(self, capacity=50, top_n=30):
+        self.top_n = top_n
+        self._results = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        # cProfile cannot run two profilers at once, so one profiled request at a time
+        self._active = threading.Lock()
+
+    def start(self):
+        """Return a running profiler, or None if another request is being profiled"""
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._active.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, method, path, status, elapsed):
+        profiler.disable()
+        self._active.release()
+        stats = pstats.Stats(profiler)
+        rows = []
+        for key, (cc, nc, tottime, cumtime, _callers) in stats.stats.items():
+            rows.append({
+                "function": _function_label(key),
+                "calls": nc,
+                "primitive_calls": cc,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3)
+            })
+        result = {
+            "id": next(self._ids),
+            "method": method,
+            "path": path,
+            "status": status,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "captured_at": datetime.utcnow().isoformat(),
+            "total_calls": stats.total_calls,
+            "by_cumulative": sorted(rows, key=lambda r: r["cumtime_ms"], reverse=True)[:self.top_n],
+            "by_self_time": sorted(rows, key=lambda r: r["tottime_ms"], reverse=True)[:self.top_n]
+        }
+        self._results.append(result)
+        return result
+
+    def list(self):
+        return [
+            {k: r[k] for k in ("id", "method", "path", "status", "elapsed_ms", "captured_at")}
+            for r in list(self._results)
+        ]
+
+    def get(self, result_id):
+        for result in list(self._results):
+            if result["id"] == result_id:
+                return result
+        return None
+
+class SamplingProfiler:
+    """Low-rate stack sampler over live traffic.
+
+    A daemon thread snapshots every other thread's stack with
+    sys._current_frames() each `interval` seconds and counts folded stacks.
+    The number of distinct stacks is capped, and the time spent sampling is
+    tracked so overhead can be checked against wall time.
+    """
+    def __init__(self, interval=0.05, max_stacks=5000, max_depth=64):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.dropped = 0
+        self.sampling_seconds = 0.0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if interval:
+            self.interval = interval
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = self.dropped = 0
+            self.sampling_seconds = 0.0
+            self.started_at = time.monotonic() if self.running else None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            folded = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                folded.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                for key in folded:
+                    if key in self._stacks:
+                        self._stacks[key] += 1
+                    elif len(self._stacks) < self.max_stacks:
+                        self._stacks[key] = 1
+                    else:
+                        self.dropped += 1
+                self.samples += 1
+                self.sampling_seconds += time.perf_counter() - started
+
+    def report(self, top_n=30):
+        with self._lock:
+            stacks = dict(self._stacks)
+            samples = self.samples
+            sampling_seconds = self.sampling_seconds
+            dropped = self.dropped
+        leaf_counts = {}
+        for key, count in stacks.items():
+            leaf = key.rsplit(';', 1)[-1]
+            leaf_counts[leaf] = leaf_counts.get(leaf, 0) + count
+        wall = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "samples": samples,
+            "distinct_stacks": len(stacks),
+            "dropped_stacks": dropped,
+            "overhead_ratio": round(sampling_seconds / wall, 6) if wall else 0.0,
+            "hot_functions": sorted(leaf_counts.items(), key=lambda x: x[1], reverse=True)[:top_n],
+            "top_stacks": sorted(stacks.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        }
+
+    def folded(self):
+        """Stacks in the folded format consumed by flamegraph tools"""
+        with self._lock:
+            return ''.join(f"{key} {count}\n" for key, count in sorted(self._stacks.items()))
+
+request_profiler = RequestProfiler(
+    capacity=int(os.getenv('PROFILE_RING_SIZE', 50))
+)
+
+sampling_profiler = SamplingProfiler(
+    interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.05))
+)
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from metrics import registry, stage
+from applog import get_logger
+
+log = get_logger('retention')
+
+RETENTION_DAYS = float(os.getenv('INTERACTION_RETENTION_DAYS', 90))
+
+INTERACTIONS_ROLLED_UP = registry.counter(
+    'interactions_rolled_up_total',
+    'Raw interactions folded into daily aggregates'
+)
+
+def day_start(timestamp):
+    """Start of the daily aggregate that `timestamp` falls in"""
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class RetentionWorker:
+    """Rolls raw interactions older than the retention window into daily aggregates.
+
+    Every `interval` seconds the worker folds events in batches of at most
+    `batch_size`, sleeping `pause` seconds between batches so storage and the
+    GIL are never held for long. In MongoDB the folded events are marked and
+    removed by a TTL index; in memory they are pruned from the front of the
+    event list.
+    """
+    def __init__(self, base_engine, retention_days=RETENTION_DAYS, batch_size=1000, interval=300, pause=0.05):
+        self.base_engine = base_engine
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_run = None
+
+    @classmethod
+    def from_env(cls, base_engine):
+        return cls(
+            base_engine,
+            batch_size=int(os.getenv('ROLLUP_BATCH_SIZE', 1000)),
+            interval=float(os.getenv('ROLLUP_INTERVAL', 300)),
+            pause=float(os.getenv('ROLLUP_PAUSE', 0.05))
+        )
+
+    @property
+    def enabled(self):
+        return self.retention_days > 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="retention")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def run_once(self, max_batches=None):
+        """Fold batches until the backlog is drained (or `max_batches` ran); returns a report"""
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        folded = batches = 0
+        while not self._stop.is_set() and (max_batches is None or batches < max_batches):
+            with stage('rollup'):
+                count = self.base_engine.rollup_interactions(cutoff, self.batch_size)
+            if count:
+                INTERACTIONS_ROLLED_UP.inc(count)
+                folded += count
+                batches += 1
+            if count < self.batch_size:
+                break
+            self._stop.wait(self.pause)
+        self.last_run = {
+            "cutoff": cutoff.isoformat(),
+            "interactions_rolled_up": folded,
+            "batches": batches,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        return self.last_run
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                report = self.run_once()
+                if report["interactions_rolled_up"]:
+                    log.info("Interactions rolled up", **report)
+            except Exception as e:
+                log.error("Retention roll-up error", error=str(e))
+            self._stop.wait(self.interval)
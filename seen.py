@@ -0,0 +1,168 @@
+import hashlib
+import math
+import os
+import secrets
+from functools import lru_cache
+from bson.int64 import Int64
+
+# Distinct items the first slice holds, and the false-positive rate the whole filter stays under
+SEEN_FILTER_CAPACITY = int(os.getenv('SEEN_FILTER_CAPACITY', 200))
+SEEN_FILTER_ERROR = float(os.getenv('SEEN_FILTER_ERROR', 0.01))
+
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+@lru_cache(maxsize=65536)
+def _hashes(item_id):
+    digest = hashlib.blake2b(str(item_id).encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+@lru_cache(maxsize=64)
+def slice_shape(index):
+    """(bits, hashes, capacity) of slice `index`.
+
+    Each slice holds twice the items of the one before at half its error
+    rate, so the rates sum to less than SEEN_FILTER_ERROR however many
+    slices a user grows.
+    """
+    capacity = SEEN_FILTER_CAPACITY << index
+    error = SEEN_FILTER_ERROR / 2 ** (index + 1)
+    hashes = max(1, math.ceil(-math.log2(error)))
+    bits = math.ceil(capacity * -math.log(error) / math.log(2) ** 2)
+    return -(-bits // _WORD_BITS) * _WORD_BITS, hashes, capacity
+
+def _positions(item_id, index):
+    bits, hashes, _ = slice_shape(index)
+    h1, h2 = _hashes(item_id)
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+class SeenFilter:
+    """Per-user scalable Bloom filter of interacted item ids.
+
+    A filter is a list of slices, each a Bloom filter sized for a number
+    of distinct items; once the newest slice is full, the next add opens
+    a larger one, so heavy users keep the same false-positive bound as
+    light ones. Bits live in sparse 64-bit words keyed by word index
+    ("0", "1", ...), so an add rewrites only the few words it touches.
+
+    Every stored write sets a new `version` token, and update_for() makes
+    its update conditional on the token it read, so writers that raced
+    each other never overwrite one another's bits: the loser matches
+    nothing, re-reads and retries.
+
+    Only items not already reported as members are added and counted, so
+    `count` is the number of distinct items (less the rare false
+    positives), an upper bound on how many candidates the filter can
+    remove. Membership may report false positives (an unseen item
+    skipped) but never false negatives.
+    """
+    __slots__ = ('slices', 'version')
+
+    def __init__(self, slices=None, version=None):
+        # [words, count] per slice, oldest first
+        self.slices = slices or []
+        # Token of the stored copy this filter was read from; None if nothing is stored
+        self.version = version
+
+    @classmethod
+    def from_document(cls, document):
+        stored = (document or {}).get("slices", {})
+        slices = [[{}, 0] for _ in range(max(map(int, stored), default=-1) + 1)]
+        for index, entry in stored.items():
+            slices[int(index)] = [
+                {key: value & _WORD_MASK for key, value in entry.get("words", {}).items()},
+                entry.get("count", 0)
+            ]
+        return cls(slices, (document or {}).get("version"))
+
+    def copy(self):
+        return SeenFilter([[dict(words), count] for words, count in self.slices], self.version)
+
+    @classmethod
+    def field(cls):
+        """Storage field name; named by configuration so a change starts from a clean filter"""
+        return f"seen_filter_{SEEN_FILTER_CAPACITY}x{round(SEEN_FILTER_ERROR * 10000)}"
+
+    @property
+    def count(self):
+        return sum(count for _, count in self.slices)
+
+    def _masks(self, item_id, index):
+        """Word key -> OR mask for the bits of `item_id` in slice `index`"""
+        masks = {}
+        for position in _positions(item_id, index):
+            key = str(position // _WORD_BITS)
+            masks[key] = masks.get(key, 0) | (1 << (position % _WORD_BITS))
+        return masks
+
+    def _open_slice(self):
+        """Index of the slice new items go into, appending one when the newest is full"""
+        if not self.slices or self.slices[-1][1] >= slice_shape(len(self.slices) - 1)[2]:
+            self.slices.append([{}, 0])
+        return len(self.slices) - 1
+
+    def _add(self, item_id):
+        """Add a new item; returns (slice index, masks), or None if it is already a member"""
+        if item_id in self:
+            return None
+        index = self._open_slice()
+        words, _ = self.slices[index]
+        masks = self._masks(item_id, index)
+        for key, mask in masks.items():
+            words[key] = words.get(key, 0) | mask
+        self.slices[index][1] += 1
+        return index, masks
+
+    def add(self, item_id):
+        return self._add(item_id) is not None
+
+    def __contains__(self, item_id):
+        for index, (words, _) in enumerate(self.slices):
+            for position in _positions(item_id, index):
+                if not words.get(str(position // _WORD_BITS), 0) >> (position % _WORD_BITS) & 1:
+                    break
+            else:
+                return True
+        return False
+
+    def __bool__(self):
+        return any(count for _, count in self.slices)
+
+    def to_document(self):
+        """Stored form; writing it replaces the stored filter, so it carries a new version"""
+        self.version = _new_version()
+        # Words are stored as signed Int64, the only 64-bit integer BSON has
+        return {"version": self.version, "slices": {
+            str(index): {
+                "words": {key: Int64(_signed(value)) for key, value in words.items()},
+                "count": count
+            }
+            for index, (words, count) in enumerate(self.slices)
+        }}
+
+    def update_for(self, item_id):
+        """Add `item_id`; returns (condition, update) applying the add to the stored copy, or None if already present.
+
+        The condition matches only while the stored filter is still the
+        version this one was read from; the update sets the touched words,
+        the slice count and a new version.
+        """
+        added = self._add(item_id)
+        if added is None:
+            return None
+        index, masks = added
+        field = self.field()
+        prefix = f"{field}.slices.{index}"
+        words, count = self.slices[index]
+        condition = {f"{field}.version": self.version} if self.version else {f"{field}.version": {"$exists": False}}
+        self.version = _new_version()
+        update = {f"{prefix}.words.{key}": Int64(_signed(words[key])) for key in masks}
+        update[f"{prefix}.count"] = count
+        update[f"{field}.version"] = self.version
+        return condition, {"$set": update}
+
+def _new_version():
+    return secrets.token_hex(8)
+
+def _signed(value):
+    return value - (1 << _WORD_BITS) if value >> (_WORD_BITS - 1) else value
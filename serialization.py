@@ -0,0 +1,85 @@
+import json
+from datetime import date, datetime
+from bson import ObjectId
+
+# Fields rendered by dynamic_index.html; everything else is dropped from API responses
+RESPONSE_FIELDS = (
+    'item_id',
+    'title',
+    'category',
+    'description',
+    'source',
+    'source_name',
+    'url',
+    'page_title',
+    'page_description',
+    'trend_score',
+    'search_relevance_score',
+    'similarity_score',
+    'session_score'
+)
+
+class ResponseEncoder(json.JSONEncoder):
+    """JSON encoder for engine results (datetimes, ObjectIds, numpy scalars)"""
+    def default(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, ObjectId):
+            return str(value)
+        if hasattr(value, 'item'):
+            # numpy scalar types such as float32 from the similarity ranking
+            return value.item()
+        if isinstance(value, (set, frozenset, tuple)):
+            return list(value)
+        return str(value)
+
+_encoder = ResponseEncoder(separators=(',', ':'), ensure_ascii=False)
+
+def project_item(item):
+    """Keep only the fields the UI uses"""
+    return {key: item[key] for key in RESPONSE_FIELDS if key in item}
+
+def project_items(items):
+    return [project_item(item) for item in items]
+
+def encode(payload):
+    """Encode any payload to UTF-8 JSON bytes"""
+    return _encoder.encode(payload).encode('utf-8')
+
+def encode_items(items):
+    """Project and encode a result list, reusing pre-encoded static payloads"""
+    encoded = getattr(items, 'encoded', None)
+    if encoded is not None:
+        return encoded
+    return encode(project_items(items))
+
+def encode_each(items):
+    """Project and encode items one by one, for bodies assembled from slices"""
+    return [encode(project_item(item)) for item in items]
+
+def join_encoded(parts):
+    """JSON array body from already-encoded items"""
+    return b'[' + b','.join(parts) + b']'
+
+class StaticPayload(list):
+    """A constant result list whose JSON encoding is computed once.
+
+    Callers must treat the items as read-only; slices returned by head()
+    are cached so default lists never get re-encoded per request.
+    """
+    def __init__(self, items):
+        super().__init__(items)
+        self.encoded = encode(project_items(self))
+        self._heads = {}
+
+    def head(self, limit):
+        """Return the first `limit` items as a (cached) StaticPayload"""
+        if limit < 0:
+            limit = max(len(self) + limit, 0)
+        if limit >= len(self):
+            return self
+        payload = self._heads.get(limit)
+        if payload is None:
+            payload = StaticPayload(self[:limit])
+            self._heads[limit] = payload
+        return payload
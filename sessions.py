@@ -0,0 +1,172 @@
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from metrics import registry
+from applog import get_logger
+
+log = get_logger('sessions')
+
+SESSION_TRANSITIONS_RECORDED = registry.counter(
+    'session_transitions_recorded_total',
+    'Item-to-next-item transitions added to the session model'
+)
+
+class SessionModel:
+    """Next-item recommender built from the order of each user's interactions.
+
+    A user's events form one session until they pause for longer than
+    `gap`. Every consecutive pair of distinct items within a session adds
+    one to a sparse item -> next-item count; each row keeps its
+    `max_successors` strongest entries once it grows to twice that. The
+    model is updated per interaction, and next_items() scores the
+    successors of the last few items of the user's live session, which
+    touches only a handful of small dicts.
+
+    Only the most recent `max_sessions` users' live sessions are kept.
+    """
+    def __init__(self, gap=1800, max_successors=50, context=3, session_items=20, max_sessions=100000):
+        self.gap = timedelta(seconds=gap)
+        self.max_successors = max_successors
+        self.context = context
+        self.session_items = session_items
+        self.max_sessions = max_sessions
+        self._transitions = {}  # item_id -> {next_item_id: count}
+        self._totals = {}       # item_id -> transitions out of item_id, including pruned ones
+        self._sessions = OrderedDict()  # user_id -> (last_seen, [item_id, ...])
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            gap=float(os.getenv('SESSION_GAP_SECONDS', 1800)),
+            max_successors=int(os.getenv('SESSION_MAX_SUCCESSORS', 50)),
+            context=int(os.getenv('SESSION_CONTEXT_ITEMS', 3)),
+            max_sessions=int(os.getenv('SESSION_MAX_USERS', 100000))
+        )
+
+    def observe(self, user_id, item_id, timestamp=None):
+        """Add one interaction; events must arrive in time order per user"""
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            self._observe(user_id, item_id, timestamp)
+
+    def _observe(self, user_id, item_id, timestamp):
+        session = self._sessions.pop(user_id, None)
+        if session is None or timestamp - session[0] > self.gap:
+            items = []
+        else:
+            items = session[1]
+            if items and items[-1] != item_id:
+                self._add_transition(items[-1], item_id)
+        if not items or items[-1] != item_id:
+            items.append(item_id)
+            del items[:-self.session_items]
+        self._sessions[user_id] = (timestamp, items)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _add_transition(self, item_id, next_item_id):
+        row = self._transitions.setdefault(item_id, {})
+        row[next_item_id] = row.get(next_item_id, 0) + 1
+        self._totals[item_id] = self._totals.get(item_id, 0) + 1
+        self._prune(item_id)
+        SESSION_TRANSITIONS_RECORDED.inc()
+
+    def _prune(self, item_id):
+        row = self._transitions[item_id]
+        if len(row) >= 2 * self.max_successors:
+            kept = heapq.nlargest(self.max_successors, row.items(), key=lambda entry: entry[1])
+            self._transitions[item_id] = dict(kept)
+
+    def current_session(self, user_id, now=None):
+        """Items of the user's live session, oldest first ([] when the session has lapsed)"""
+        now = now or datetime.utcnow()
+        session = self._sessions.get(user_id)
+        if session is None or now - session[0] > self.gap:
+            return []
+        return list(session[1])
+
+    def next_items(self, user_id, limit=10, now=None):
+        """[(item_id, score)] likely to follow the user's live session, best first.
+
+        Successors of the last `context` session items are blended with
+        weights 1, 1/2, 1/3, ... by recency, each as its share of that
+        item's outgoing transitions. Items already in the session are skipped.
+        """
+        with self._lock:
+            items = self.current_session(user_id, now)
+            if not items:
+                return []
+            scores = {}
+            for distance, item_id in enumerate(reversed(items[-self.context:]), start=1):
+                row = self._transitions.get(item_id)
+                if not row:
+                    continue
+                weight = 1.0 / (distance * self._totals[item_id])
+                for next_item_id, count in row.items():
+                    scores[next_item_id] = scores.get(next_item_id, 0) + weight * count
+        for item_id in items:
+            scores.pop(item_id, None)
+        return heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+
+    def load(self, events, until=None):
+        """Build the model from (user_id, item_id, timestamp) history grouped by user in time order.
+
+        Events at or after `until` are skipped, since observe() has already
+        counted them live; everything observed so far is kept on top of the
+        loaded history.
+        """
+        loaded = SessionModel(self.gap.total_seconds(), self.max_successors, self.context,
+                              self.session_items, self.max_sessions)
+        count = 0
+        for user_id, item_id, timestamp in events:
+            if until is not None and timestamp >= until:
+                continue
+            loaded._observe(user_id, item_id, timestamp)
+            count += 1
+        with self._lock:
+            for item_id, row in self._transitions.items():
+                merged = loaded._transitions.setdefault(item_id, {})
+                for next_item_id, n in row.items():
+                    merged[next_item_id] = merged.get(next_item_id, 0) + n
+                loaded._totals[item_id] = loaded._totals.get(item_id, 0) + self._totals[item_id]
+                # Both sides were bounded separately; the merged row can hold up to twice as many
+                loaded._prune(item_id)
+            # Live sessions are newer than anything in the history, so they go last and are evicted last
+            for user_id, session in self._sessions.items():
+                loaded._sessions.pop(user_id, None)
+                loaded._sessions[user_id] = session
+            while len(loaded._sessions) > self.max_sessions:
+                loaded._sessions.popitem(last=False)
+            self._transitions = loaded._transitions
+            self._totals = loaded._totals
+            self._sessions = loaded._sessions
+            self.loaded = True
+        return count
+
+    def load_async(self, base_engine):
+        """Load history from storage on a background thread"""
+        def job():
+            started = datetime.utcnow()
+            try:
+                count = self.load(base_engine.iter_interaction_sequences(), until=started)
+                log.info("Session model loaded", interactions=count, items=len(self._transitions))
+            except Exception as e:
+                log.error("Session model load error", error=str(e))
+        threading.Thread(target=job, daemon=True, name="session-load").start()
+
+    def clear(self):
+        with self._lock:
+            self._transitions = {}
+            self._totals = {}
+            self._sessions = OrderedDict()
+
+    def stats(self):
+        return {
+            'items': len(self._transitions),
+            'transitions': sum(len(row) for row in list(self._transitions.values())),
+            'sessions': len(self._sessions)
+        }
@@ -0,0 +1,56 @@
+import hashlib
+import math
+from functools import lru_cache
+
+# HyperLogLog registers per sketch: about 1.04 / sqrt(128) = 9% standard error, at most 128 small ints
+HLL_PRECISION = 7
+HLL_REGISTERS = 1 << HLL_PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+@lru_cache(maxsize=65536)
+def hll_register(value):
+    """(register, rank) that `value` sets in a HyperLogLog sketch; registers keep the max rank"""
+    h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little')
+    register = h & (HLL_REGISTERS - 1)
+    rest = h >> HLL_PRECISION
+    rank = 1
+    while rest & 1 == 0 and rank <= 64 - HLL_PRECISION:
+        rest >>= 1
+        rank += 1
+    return register, rank
+
+def hll_add(registers, value):
+    """Add `value` to a sketch held as {register (str): rank}, MongoDB's stored form"""
+    register, rank = hll_register(value)
+    key = str(register)
+    if registers.get(key, 0) < rank:
+        registers[key] = rank
+
+def hll_estimate(registers):
+    """Approximate number of distinct values added to the sketch"""
+    zeros = HLL_REGISTERS - len(registers)
+    harmonic = zeros + sum(2.0 ** -rank for rank in registers.values())
+    estimate = _ALPHA * HLL_REGISTERS * HLL_REGISTERS / harmonic
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        return HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+    return estimate
+
+def hll_estimate_stages(field):
+    """Aggregation stages that turn {register: rank} documents in `field` into an estimate in `field`"""
+    m = HLL_REGISTERS
+    return [
+        {"$addFields": {field: {"$objectToArray": {"$ifNull": [f"${field}", {}]}}}},
+        {"$addFields": {
+            "_hll_zeros": {"$subtract": [m, {"$size": f"${field}"}]},
+            "_hll_sum": {"$sum": {"$map": {"input": f"${field}", "in": {"$pow": [2, {"$multiply": [-1, "$$this.v"]}]}}}}
+        }},
+        {"$addFields": {
+            "_hll_raw": {"$divide": [_ALPHA * m * m, {"$add": ["$_hll_zeros", "$_hll_sum"]}]}
+        }},
+        {"$addFields": {field: {"$cond": [
+            {"$and": [{"$lte": ["$_hll_raw", 2.5 * m]}, {"$gt": ["$_hll_zeros", 0]}]},
+            {"$multiply": [m, {"$ln": {"$divide": [m, "$_hll_zeros"]}}]},
+            "$_hll_raw"
+        ]}}},
+        {"$project": {"_hll_zeros": 0, "_hll_sum": 0, "_hll_raw": 0}}
+    ]
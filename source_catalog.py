@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from applog import get_logger
+
+log = get_logger('source_catalog')
+
+CONTENT_SOURCES_PATH = os.getenv(
+    'CONTENT_SOURCES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content_sources.json')
+)
+
+DEFAULT_CATEGORY = 'technology'
+
+def _word_prefixes(text):
+    """Every prefix of `text` that starts at a word boundary"""
+    words = text.split()
+    for start in range(len(words)):
+        suffix = ' '.join(words[start:])
+        for end in range(1, len(suffix) + 1):
+            yield suffix[:end]
+
+class _CatalogIndex:
+    """Immutable lookup structures built from one version of the catalog file"""
+    def __init__(self, data):
+        self.trending = {category.lower(): list(topics) for category, topics in data.get('trending', {}).items()}
+        # Mix of popular topics when no category matches: two from each, five overall
+        self.mixed_trending = [topic for topics in self.trending.values() for topic in topics[:2]][:5]
+        self.templates = dict(data.get('templates', {}))
+
+        self.urls = {}          # (category, keyword) -> url
+        self.defaults = {}      # category -> default url
+        self.order = {}         # (category, keyword) -> catalog position, for first-match-wins
+        self.tokens = {}        # (category, token) -> keywords containing that word
+        self.prefixes = {}      # (category, word-boundary prefix) -> keywords starting with it there
+        self.categories_by_prefix = {}  # word-boundary prefix -> first category with a matching keyword
+        for category, keywords in data.get('keyword_urls', {}).items():
+            for position, (keyword, url) in enumerate(keywords.items()):
+                keyword = keyword.lower()
+                if keyword == 'default':
+                    self.defaults[category] = url
+                self.urls[(category, keyword)] = url
+                self.order[(category, keyword)] = position
+                for token in set(keyword.split()):
+                    self.tokens.setdefault((category, token), []).append(keyword)
+                for prefix in set(_word_prefixes(keyword)):
+                    self.prefixes.setdefault((category, prefix), []).append(keyword)
+                    self.categories_by_prefix.setdefault(prefix, category)
+        self.url_categories = {category for category, _ in self.urls}
+
+    def url_for_keyword(self, category, keyword):
+        if category not in self.url_categories:
+            category = DEFAULT_CATEGORY
+        keyword_lower = keyword.lower()
+
+        # Try exact match first
+        url = self.urls.get((category, keyword_lower))
+        if url is not None:
+            return url
+
+        # Partial match: catalog keywords inside the query, or the query at the start of a catalog word
+        matches = [
+            key for token in set(keyword_lower.split())
+            for key in self.tokens.get((category, token), ())
+            if key in keyword_lower
+        ]
+        matches.extend(self.prefixes.get((category, keyword_lower), ()))
+        if matches:
+            return self.urls[(category, min(matches, key=lambda key: self.order[(category, key)]))]
+
+        # Return default for category
+        return self.defaults.get(category, 'https://www.google.com/search?q=' + keyword.replace(' ', '+'))
+
+    def category_for_keyword(self, keyword):
+        return self.categories_by_prefix.get(keyword.lower(), DEFAULT_CATEGORY)
+
+class SourceCatalog:
+    """Content source catalog loaded from a JSON file and indexed once.
+
+    The file is re-checked at most every RELOAD_CHECK_SECONDS; when its
+    mtime changes the index is rebuilt off to the side and swapped in, so
+    readers always see one complete version. A file that fails to parse
+    leaves the previous version in place.
+    """
+    RELOAD_CHECK_SECONDS = 5
+
+    def __init__(self, path=CONTENT_SOURCES_PATH):
+        self.path = path
+        self._index = _CatalogIndex({})
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    @property
+    def index(self):
+        self._maybe_reload()
+        return self._index
+
+    def trending_topics(self, category):
+        index = self.index
+        return index.trending.get(category.lower()) or index.mixed_trending
+
+    def templates(self, category):
+        templates = self.index.templates
+        return templates.get(category) or templates.get(DEFAULT_CATEGORY, [])
+
+    def url_for_keyword(self, category, keyword):
+        return self.index.url_for_keyword(category, keyword)
+
+    def vocabulary(self):
+        """Every catalog keyword and trending topic, for query suggestions"""
+        index = self.index
+        keywords = [keyword for _, keyword in index.urls if keyword != 'default']
+        return keywords + [topic['topic'] for topics in index.trending.values() for topic in topics]
+
+    def category_for_keyword(self, keyword):
+        return self.index.category_for_keyword(keyword)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.RELOAD_CHECK_SECONDS:
+            return
+        if not self._lock.acquire(blocking=force):
+            return  # another thread is already checking
+        try:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                if force:
+                    log.error("Content source catalog missing", path=self.path, error=str(e))
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as f:
+                    index = _CatalogIndex(json.load(f))
+            except (OSError, ValueError, AttributeError) as e:
+                # Remember the broken version so it is not re-parsed until the file changes again
+                self._mtime = mtime
+                log.error("Content source catalog load error", path=self.path, error=str(e))
+                return
+            self._index = index
+            self._mtime = mtime
+            log.info("Content source catalog loaded", path=self.path, categories=len(index.trending))
+        finally:
+            self._lock.release()
+
+catalog = SourceCatalog()
@@ -0,0 +1,226 @@
+import heapq
+import os
+import re
+import threading
+import time
+from metrics import registry
+
+SUGGEST_BUDGET_MS = float(os.getenv('SUGGEST_BUDGET_MS', 5))
+
+SUGGESTION_LOOKUPS = registry.counter(
+    'suggestion_lookups_total',
+    'Autocomplete lookups by how they ended',
+    labels=('result',)
+)
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def words_of(text):
+    return _WORD.findall(text.lower())
+
+def _deletes(word, max_distance):
+    """All strings reachable from `word` by deleting up to `max_distance` characters"""
+    found = {word}
+    frontier = [word]
+    for _ in range(max_distance):
+        next_frontier = []
+        for text in frontier:
+            for i in range(len(text)):
+                shorter = text[:i] + text[i + 1:]
+                if shorter not in found:
+                    found.add(shorter)
+                    next_frontier.append(shorter)
+        frontier = next_frontier
+    return found
+
+def edit_distance(a, b, max_distance, prefix=False):
+    """Damerau-Levenshtein (optimal string alignment) distance, or max_distance + 1 once exceeded.
+
+    With prefix=True, the distance from `a` to the closest prefix of `b`.
+    Only the diagonal band of width 2 * max_distance + 1 is computed.
+    """
+    if prefix:
+        b = b[:len(a) + max_distance]
+    elif abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    over = max_distance + 1
+    previous2 = None
+    previous = [j if j <= max_distance else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return over
+        previous2, previous = previous, current
+    distance = min(previous) if prefix else previous[-1]
+    return min(distance, over)
+
+def allowed_distance(token):
+    """Typos tolerated in a token: none below 3 characters, one up to 4, two beyond"""
+    if len(token) < 3:
+        return 0
+    return 1 if len(token) <= 4 else 2
+
+class QuerySuggester:
+    """Typo-tolerant autocomplete over known queries, using a symmetric-delete index.
+
+    Every vocabulary word is indexed under the deletions (up to
+    `max_distance`) of its prefixes of `min_prefix`..`prefix_length`
+    characters. A typed token is matched by generating its own deletions
+    and probing the index, so the work depends on the token length and the
+    number of candidates found, never on the vocabulary size; candidates
+    are then verified with a bounded edit distance. Completed tokens must
+    match whole words, the token being typed only a word prefix.
+
+    Words are corrected to the most frequent close match, and suggestions
+    are the most frequent known queries containing the corrected words.
+    add_query() updates the index incrementally; past `max_queries`, the
+    least frequent tenth of the queries is evicted to make room.
+    """
+    def __init__(self, max_distance=2, min_prefix=3, prefix_length=7, max_queries=50000, budget_ms=SUGGEST_BUDGET_MS):
+        self.max_distance = max_distance
+        self.min_prefix = min_prefix
+        self.prefix_length = prefix_length
+        self.max_queries = max_queries
+        self.budget = budget_ms / 1000.0
+        self._word_freq = {}     # word -> total frequency of the queries containing it
+        self._deletes = {}       # deletion of a word prefix -> words
+        self._query_freq = {}    # normalized query -> frequency
+        self._queries_by_word = {}  # word -> queries containing it
+        self._lock = threading.Lock()
+
+    def add_query(self, query, count=1):
+        """Record a query (or vocabulary phrase) `count` more times"""
+        words = words_of(query)
+        if not words:
+            return
+        query = ' '.join(words)
+        with self._lock:
+            if query not in self._query_freq and len(self._query_freq) >= self.max_queries:
+                self._evict(max(1, self.max_queries // 10))
+            self._query_freq[query] = self._query_freq.get(query, 0) + count
+            for word in set(words):
+                if word not in self._word_freq:
+                    self._index_word(word)
+                self._word_freq[word] = self._word_freq.get(word, 0) + count
+                self._queries_by_word.setdefault(word, set()).add(query)
+
+    def _evict(self, count):
+        """Forget the `count` least frequent queries, and the words no remaining query contains"""
+        for query, freq in heapq.nsmallest(count, self._query_freq.items(), key=lambda entry: entry[1]):
+            del self._query_freq[query]
+            for word in set(query.split()):
+                queries = self._queries_by_word[word]
+                queries.discard(query)
+                if queries:
+                    self._word_freq[word] -= freq
+                    continue
+                del self._queries_by_word[word]
+                del self._word_freq[word]
+                for deleted in self._index_keys(word):
+                    words = self._deletes[deleted]
+                    words.discard(word)
+                    if not words:
+                        del self._deletes[deleted]
+
+    def _index_keys(self, word):
+        """Index keys of a word: deletions of its prefixes"""
+        keys = {word[:length] for length in range(self.min_prefix, min(len(word), self.prefix_length) + 1)}
+        keys.add(word[:self.prefix_length])
+        found = set()
+        for key in keys:
+            found |= _deletes(key, min(allowed_distance(key), self.max_distance))
+        return found
+
+    def _index_word(self, word):
+        for deleted in self._index_keys(word):
+            self._deletes.setdefault(deleted, set()).add(word)
+
+    def candidates(self, token, prefix=False, deadline=None):
+        """[(distance, -frequency, word)] for vocabulary words matching `token`, best first.
+
+        Verification stops early once `deadline` (a perf_counter value) passes.
+        """
+        max_distance = min(allowed_distance(token), self.max_distance)
+        if token in self._word_freq and not prefix:
+            return [(0, -self._word_freq[token], token)]
+        probe = token[:self.prefix_length]
+        matches = {}
+        for deleted in _deletes(probe, max_distance):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            for word in self._deletes.get(deleted, ()):
+                if word in matches:
+                    continue
+                # Typos can shift the typed prefix a character or two against the word
+                distance = edit_distance(token, word, max_distance, prefix=prefix)
+                if distance <= max_distance:
+                    matches[word] = distance
+        return sorted((distance, -self._word_freq[word], word) for word, distance in matches.items())
+
+    def correct(self, text):
+        """`text` with every whole word replaced by its best close match"""
+        corrected = []
+        with self._lock:
+            for token in words_of(text):
+                found = self.candidates(token)
+                corrected.append(found[0][2] if found else token)
+        return ' '.join(corrected)
+
+    def suggest(self, text, limit=5):
+        """Known queries matching the typed text, ranked by typos corrected then frequency"""
+        deadline = time.perf_counter() + self.budget
+        tokens = words_of(text)
+        # A word start shorter than the index keys only filters the queries found for the other words
+        short_prefix = tokens.pop() if tokens and len(tokens[-1]) < self.min_prefix else None
+        if not tokens:
+            return []
+        with self._lock:
+            # Up to three corrections per completed word, and five completions for the one being typed
+            options = [[(d, word) for d, _, word in self.candidates(token, deadline=deadline)[:3]] for token in tokens[:-1]]
+            if short_prefix is None:
+                options.append([(d, word) for d, _, word in self.candidates(tokens[-1], prefix=True, deadline=deadline)[:5]])
+            else:
+                options.append([(d, word) for d, _, word in self.candidates(tokens[-1], deadline=deadline)[:3]])
+            if any(not choices for choices in options):
+                SUGGESTION_LOOKUPS.labels('no_match').inc()
+                return []
+
+            scored = {}
+            rarest = min(options, key=lambda choices: sum(len(self._queries_by_word[w]) for _, w in choices))
+            result = 'ok'
+            for _, anchor in rarest:
+                for query in self._queries_by_word[anchor]:
+                    if query in scored:
+                        continue
+                    if time.perf_counter() > deadline:
+                        result = 'budget_exceeded'
+                        break
+                    query_words = set(query.split())
+                    if short_prefix is not None and not any(word.startswith(short_prefix) for word in query_words):
+                        continue
+                    distance = 0
+                    for choices in options:
+                        best = min((d for d, word in choices if word in query_words), default=None)
+                        if best is None:
+                            break
+                        distance += best
+                    else:
+                        scored[query] = (distance, -self._query_freq[query], query)
+                if result != 'ok':
+                    break
+        SUGGESTION_LOOKUPS.labels(result).inc()
+        return [query for _, _, query in heapq.nsmallest(limit, scored.values())]
+
+    def __len__(self):
+        return len(self._query_freq)
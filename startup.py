@@ -0,0 +1,37 @@
+import sys
+import time
+
+# Imported first by app.py, so this is as close to interpreter start as the app gets
+_started = time.perf_counter()
+_last = _started
+_phases = []
+
+# Dependencies that should only load on the code paths that need them
+HEAVY_MODULES = ('sklearn', 'scipy', 'numpy', 'bs4', 'requests', 'aiohttp', 'mongomock')
+
+def mark(phase):
+    """Close a startup phase: the time since the previous mark is attributed to `phase`"""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+def report(app, probe_path='/recommendations/startup_probe'):
+    """Startup breakdown plus the latency of a first request served in-process"""
+    ready = time.perf_counter()
+    client = app.test_client()
+    first_started = time.perf_counter()
+    response = client.get(probe_path)
+    first_request = time.perf_counter() - first_started
+    return {
+        "python": sys.version.split()[0],
+        "phases_seconds": {phase: round(seconds, 4) for phase, seconds in _phases},
+        "startup_seconds": round(ready - _started, 4),
+        "first_request": {
+            "path": probe_path,
+            "status": response.status_code,
+            "seconds": round(first_request, 4)
+        },
+        "time_to_first_response_seconds": round(time.perf_counter() - _started, 4),
+        "heavy_modules_loaded": sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    }
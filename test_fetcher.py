@@ -0,0 +1,107 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fetcher import ContentFetcher
+
+PAGE = b'<html><head><title>Local page</title><meta name="description" content="Served locally"></head></html>'
+ETAG = '"v1"'
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/slow':
+            time.sleep(0.5)
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/page' and self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that timed out close the connection before /slow answers
+        pass
+
+@pytest.fixture
+def server():
+    httpd = Server(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def make_fetcher(tmp_path):
+    fetchers = []
+
+    def make(**options):
+        fetcher = ContentFetcher(rate=0, cache_dir=str(tmp_path), **options)
+        fetchers.append(fetcher)
+        return fetcher
+    yield make
+    for fetcher in fetchers:
+        fetcher.stop()
+
+def test_revalidates_with_etag(server, make_fetcher):
+    httpd, base = server
+    fetcher = make_fetcher(fresh_for=0)
+    page = fetcher.fetch(f"{base}/page", timeout=5)
+    assert page['title'] == 'Local page'
+    assert page['description'] == 'Served locally'
+
+    # A second fetcher shares only the disk cache, so its fetch must revalidate
+    again = make_fetcher(fresh_for=0).fetch(f"{base}/page", timeout=5)
+    assert again == page
+    assert httpd.requests == [('/page', None), ('/page', ETAG)]
+
+def test_fresh_disk_entry_skips_the_request(server, make_fetcher):
+    httpd, base = server
+    make_fetcher().fetch(f"{base}/page", timeout=5)
+    assert make_fetcher().fetch(f"{base}/page", timeout=5)['title'] == 'Local page'
+    assert len(httpd.requests) == 1
+
+def test_timeout_returns_none(server, make_fetcher):
+    _, base = server
+    fetcher = make_fetcher(timeout=0.1)
+    assert fetcher.fetch(f"{base}/slow", timeout=5) is None
+
+def test_prefetch_does_not_wait_past_deadline(server, make_fetcher):
+    _, base = server
+    fetcher = make_fetcher()
+    started = time.monotonic()
+    assert fetcher.prefetch([f"{base}/slow"], deadline=0.05) == {}
+    assert time.monotonic() - started < 0.3
+
+    # The late fetch keeps running and is cached for the next caller
+    give_up_at = time.monotonic() + 5
+    while fetcher.peek(f"{base}/slow") is None and time.monotonic() < give_up_at:
+        time.sleep(0.05)
+    assert fetcher.prefetch([f"{base}/slow"])[f"{base}/slow"]['title'] == 'Local page'
+
+def test_failed_fetch_is_not_retried_until_error_ttl(server, make_fetcher):
+    httpd, base = server
+    fetcher = make_fetcher(error_ttl=0.2)
+    assert fetcher.fetch(f"{base}/missing", timeout=5) is None
+    assert fetcher.fetch(f"{base}/missing", timeout=5) is None
+    assert fetcher.prefetch([f"{base}/missing"], deadline=1) == {}
+    assert len(httpd.requests) == 1
+
+    time.sleep(0.3)
+    assert fetcher.fetch(f"{base}/missing", timeout=5) is None
+    assert len(httpd.requests) == 2
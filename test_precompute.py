@@ -0,0 +1,19 @@
+from precompute import FilePrecomputedStore, make_entry, user_key
+
+def test_file_store_deletion_survives_a_reload(tmp_path):
+    path = str(tmp_path / "precomputed.json")
+    store = FilePrecomputedStore(path)
+    store.put_many([make_entry(user_key(user_id), [{"item_id": "a"}], 10) for user_id in ("u1", "u2")])
+    store.delete(user_key("u1"))
+    assert store.get(user_key("u1")) is None
+
+    reloaded = FilePrecomputedStore(path)
+    assert reloaded.get(user_key("u1")) is None
+    assert reloaded.get(user_key("u2")) is not None
+
+    # Recomputing the list after the deletion stores it again, and the log is folded into the file
+    reloaded.put_many([make_entry(user_key("u1"), [{"item_id": "b"}], 10)])
+    assert not (tmp_path / "precomputed.json.deleted").exists()
+    again = FilePrecomputedStore(path)
+    assert again.get(user_key("u1"))["recommendations"] == [{"item_id": "b"}]
+    assert again.get(user_key("u2")) is not None
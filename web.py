@@ -1,12 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
-import json
 from datetime import datetime
-import re
-from urllib.parse import quote_plus
+from functools import lru_cache
+import os
+from source_catalog import catalog as source_catalog
+
+CONTENT_FETCH_ENABLED = os.getenv('CONTENT_FETCH_ENABLED', '0') == '1'
+# How long a request may wait for uncached pages; 0 serves only what is already fetched
+CONTENT_FETCH_DEADLINE = float(os.getenv('CONTENT_FETCH_DEADLINE', 0))
 
 class RealTimeContentFetcher:
-    def __init__(self):
+    def __init__(self, catalog=None, fetcher=None, deadline=CONTENT_FETCH_DEADLINE):
+        # Sources, keyword URLs and title templates live in content_sources.json
+        self.catalog = catalog or source_catalog
+        if fetcher is None and CONTENT_FETCH_ENABLED:
+            from fetcher import ContentFetcher
+            fetcher = ContentFetcher.from_env()
+        self.fetcher = fetcher
+        self.deadline = deadline
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
@@ -15,60 +24,8 @@ class RealTimeContentFetcher:
         """Fetch trending content from various sources with real URLs"""
         trending_items = []
         
-        # Real sources with actual URLs
-        real_sources = {
-            'technology': [
-                {'topic': 'Python Programming', 'url': 'https://www.python.org/community/workshops/', 'source': 'Python.org'},
-                {'topic': 'Artificial Intelligence', 'url': 'https://ai.google/research/', 'source': 'Google AI'},
-                {'topic': 'Machine Learning', 'url': 'https://www.tensorflow.org/learn', 'source': 'TensorFlow'},
-                {'topic': 'Web Development', 'url': 'https://developer.mozilla.org/en-US/docs/Learn', 'source': 'MDN Web Docs'},
-                {'topic': 'Cloud Computing', 'url': 'https://aws.amazon.com/getting-started/', 'source': 'AWS'}
-            ],
-            'entertainment': [
-                {'topic': 'Latest Movies', 'url': 'https://www.imdb.com/chart/moviemeter/', 'source': 'IMDb'},
-                {'topic': 'Netflix Shows', 'url': 'https://www.netflix.com/browse/genre/83', 'source': 'Netflix'},
-                {'topic': 'Streaming Content', 'url': 'https://www.rottentomatoes.com/browse/tv_series_browse/sort:popular', 'source': 'Rotten Tomatoes'},
-                {'topic': 'TV Series', 'url': 'https://www.tvguide.com/news/', 'source': 'TV Guide'},
-                {'topic': 'Movie Reviews', 'url': 'https://variety.com/c/film/', 'source': 'Variety'}
-            ],
-            'shopping': [
-                {'topic': 'Best Deals', 'url': 'https://www.amazon.com/gp/goldbox', 'source': 'Amazon'},
-                {'topic': 'Product Reviews', 'url': 'https://www.consumerreports.org/products/', 'source': 'Consumer Reports'},
-                {'topic': 'Electronics', 'url': 'https://www.bestbuy.com/site/electronics/top-deals/pcmcat1563299784494.c', 'source': 'Best Buy'},
-                {'topic': 'Gadgets', 'url': 'https://www.theverge.com/tech', 'source': 'The Verge'},
-                {'topic': 'Tech Reviews', 'url': 'https://www.cnet.com/reviews/', 'source': 'CNET'}
-            ],
-            'education': [
-                {'topic': 'Online Courses', 'url': 'https://www.coursera.org/browse', 'source': 'Coursera'},
-                {'topic': 'Tutorials', 'url': 'https://www.khanacademy.org/', 'source': 'Khan Academy'},
-                {'topic': 'Learning Resources', 'url': 'https://www.edx.org/learn', 'source': 'edX'},
-                {'topic': 'Certification', 'url': 'https://www.udemy.com/courses/it-and-software/', 'source': 'Udemy'},
-                {'topic': 'Programming', 'url': 'https://www.codecademy.com/catalog', 'source': 'Codecademy'}
-            ],
-            'health': [
-                {'topic': 'Fitness Tips', 'url': 'https://www.mayoclinic.org/healthy-lifestyle/fitness', 'source': 'Mayo Clinic'},
-                {'topic': 'Nutrition', 'url': 'https://www.nutrition.gov/', 'source': 'Nutrition.gov'},
-                {'topic': 'Wellness', 'url': 'https://www.webmd.com/fitness-exercise', 'source': 'WebMD'},
-                {'topic': 'Exercise', 'url': 'https://www.acefitness.org/resources/', 'source': 'ACE Fitness'},
-                {'topic': 'Mental Health', 'url': 'https://www.nimh.nih.gov/health/topics', 'source': 'NIMH'}
-            ],
-            'travel': [
-                {'topic': 'Travel Destinations', 'url': 'https://www.lonelyplanet.com/best-in-travel', 'source': 'Lonely Planet'},
-                {'topic': 'Vacation Spots', 'url': 'https://www.tripadvisor.com/TravelersChoice', 'source': 'TripAdvisor'},
-                {'topic': 'Hotels', 'url': 'https://www.booking.com/index.html', 'source': 'Booking.com'},
-                {'topic': 'Flights', 'url': 'https://www.kayak.com/flights', 'source': 'Kayak'},
-                {'topic': 'Travel Guides', 'url': 'https://www.nationalgeographic.com/travel/', 'source': 'National Geographic'}
-            ]
-        }
-        
-        # Get trending topics for category or general
-        topics = real_sources.get(category.lower(), [])
-        if not topics:
-            # Mix of popular topics from all categories
-            all_topics = []
-            for cat_topics in real_sources.values():
-                all_topics.extend(cat_topics[:2])  # Take 2 from each category
-            topics = all_topics[:5]
+        # Topics for the category, or a mix of popular topics from all categories
+        topics = self.catalog.trending_topics(category)
         
         for i, topic_data in enumerate(topics[:5]):
             trending_items.append({
@@ -83,135 +40,19 @@ class RealTimeContentFetcher:
                 'timestamp': datetime.now().isoformat()
             })
         
-        return trending_items
+        return self.enrich(trending_items)
     
     def get_personalized_content(self, search_keywords, categories, limit=10):
         """Generate personalized content based on search history with real URLs"""
         personalized_items = []
         
-        # Real URL sources for different categories and keywords
-        url_sources = {
-            'technology': {
-                'python': 'https://docs.python.org/3/tutorial/',
-                'javascript': 'https://developer.mozilla.org/en-US/docs/Web/JavaScript/Guide',
-                'machine learning': 'https://scikit-learn.org/stable/tutorial/',
-                'web development': 'https://www.freecodecamp.org/learn/',
-                'artificial intelligence': 'https://ai.google/education/',
-                'programming': 'https://www.codecademy.com/',
-                'default': 'https://stackoverflow.com/questions/tagged/'
-            },
-            'entertainment': {
-                'movies': 'https://www.imdb.com/chart/top/',
-                'netflix': 'https://www.netflix.com/browse',
-                'tv shows': 'https://www.tvguide.com/',
-                'streaming': 'https://www.rottentomatoes.com/',
-                'sci fi': 'https://www.imdb.com/list/ls000634298/',
-                'default': 'https://entertainment.com/'
-            },
-            'shopping': {
-                'headphones': 'https://www.amazon.com/s?k=wireless+headphones',
-                'electronics': 'https://www.bestbuy.com/site/electronics/',
-                'deals': 'https://slickdeals.net/',
-                'reviews': 'https://www.consumerreports.org/',
-                'gadgets': 'https://www.theverge.com/tech',
-                'default': 'https://www.amazon.com/'
-            },
-            'education': {
-                'courses': 'https://www.coursera.org/',
-                'tutorials': 'https://www.khanacademy.org/',
-                'learning': 'https://www.edx.org/',
-                'certification': 'https://www.udemy.com/',
-                'programming': 'https://www.codecademy.com/',
-                'default': 'https://www.coursera.org/'
-            },
-            'health': {
-                'fitness': 'https://www.mayoclinic.org/healthy-lifestyle/fitness',
-                'nutrition': 'https://www.nutrition.gov/',
-                'exercise': 'https://www.acefitness.org/',
-                'wellness': 'https://www.webmd.com/',
-                'diet': 'https://www.eatright.org/',
-                'default': 'https://www.healthline.com/'
-            },
-            'travel': {
-                'destinations': 'https://www.lonelyplanet.com/',
-                'hotels': 'https://www.booking.com/',
-                'flights': 'https://www.kayak.com/',
-                'vacation': 'https://www.tripadvisor.com/',
-                'travel guide': 'https://www.nationalgeographic.com/travel/',
-                'default': 'https://www.expedia.com/'
-            }
-        }
-        
-        # Content templates with URL generation
-        content_templates = {
-            'technology': [
-                'Advanced {} Tutorial',
-                'Best {} Tools 2024',
-                '{} for Beginners',
-                'Latest {} Trends',
-                '{} Best Practices'
-            ],
-            'entertainment': [
-                'Top {} Movies',
-                'Best {} Shows',
-                '{} Recommendations',
-                'Latest {} Reviews',
-                'Popular {} Content'
-            ],
-            'shopping': [
-                'Best {} Deals',
-                '{} Product Reviews',
-                'Top {} Brands',
-                '{} Buying Guide',
-                'Cheap {} Options'
-            ],
-            'education': [
-                '{} Online Course',
-                'Learn {} Fast',
-                '{} Certification',
-                '{} Study Guide',
-                'Free {} Resources'
-            ],
-            'health': [
-                '{} Health Tips',
-                '{} Workout Plan',
-                '{} Diet Guide',
-                '{} Benefits',
-                '{} Exercise Routine'
-            ],
-            'travel': [
-                'Best {} Destinations',
-                '{} Travel Guide',
-                '{} Vacation Spots',
-                '{} Hotels',
-                '{} Travel Tips'
-            ]
-        }
-        
-        def get_url_for_keyword(category, keyword):
-            """Get appropriate URL for category and keyword"""
-            category_urls = url_sources.get(category, url_sources['technology'])
-            keyword_lower = keyword.lower()
-            
-            # Try exact match first
-            if keyword_lower in category_urls:
-                return category_urls[keyword_lower]
-            
-            # Try partial match
-            for key in category_urls:
-                if key in keyword_lower or keyword_lower in key:
-                    return category_urls[key]
-            
-            # Return default for category
-            return category_urls.get('default', 'https://www.google.com/search?q=' + keyword.replace(' ', '+'))
-        
         # Generate content for each category
         for category in categories[:3]:
-            templates = content_templates.get(category, content_templates['technology'])
+            templates = self.catalog.templates(category)
             
             for i, template in enumerate(templates[:3]):
                 keyword = search_keywords[i % len(search_keywords)] if search_keywords else category
-                url = get_url_for_keyword(category, keyword)
+                url = self.catalog.url_for_keyword(category, keyword)
                 
                 personalized_items.append({
                     'item_id': f'personalized_{category}_{i}',
@@ -228,13 +69,8 @@ class RealTimeContentFetcher:
         # Add keyword-based content with URLs
         for i, keyword in enumerate(search_keywords[:5]):
             # Determine best category for this keyword
-            best_category = 'technology'  # default
-            for cat, urls in url_sources.items():
-                if keyword.lower() in ' '.join(urls.keys()):
-                    best_category = cat
-                    break
-            
-            url = get_url_for_keyword(best_category, keyword)
+            best_category = self.catalog.category_for_keyword(keyword)
+            url = self.catalog.url_for_keyword(best_category, keyword)
             
             personalized_items.append({
                 'item_id': f'keyword_{i}',
@@ -248,7 +84,26 @@ class RealTimeContentFetcher:
                 'timestamp': datetime.now().isoformat()
             })
         
-        return personalized_items[:limit]
+        return self.enrich(personalized_items[:limit])
+    
+    def enrich(self, items):
+        """Attach fetched page titles and descriptions to items whose pages are available.
+        
+        Waits at most `deadline` seconds; pages not fetched yet are fetched in
+        the background and show up on later calls.
+        """
+        if self.fetcher is None:
+            return items
+        pages = self.fetcher.prefetch([item['url'] for item in items if item.get('url')], self.deadline)
+        for item in items:
+            page = pages.get(item.get('url'))
+            if page is None:
+                continue
+            if page.get('title'):
+                item['page_title'] = page['title']
+            if page.get('description'):
+                item['page_description'] = page['description']
+        return items
     
     def get_real_time_news(self, query, limit=5):
         """Fetch real-time news (simplified version)"""
@@ -275,3 +130,8 @@ class RealTimeContentFetcher:
             })
         
         return news_items
+
+@lru_cache(maxsize=None)
+def shared_content_fetcher():
+    """Process-wide RealTimeContentFetcher, so components share one catalog and page fetcher"""
+    return RealTimeContentFetcher()